@@ -1,9 +1,14 @@
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode
 from django.utils.encoding import force_bytes
-from django.core.mail import EmailMultiAlternatives
 from django.template.loader import render_to_string
-from django.conf import settings
+from django.utils.html import escape
+from functools import lru_cache
+import re
+from user_auth.tasks import queue_mail
+
+PLACEHOLDER = '\x00{}\x00'
+PLACEHOLDER_PATTERN = re.compile(r'\x00(\w+)\x00')
 
 def generate_activation_link(user):
     """
@@ -20,48 +25,64 @@ def generate_activation_link(user):
     activation_link = f"http://vid.daniel-lehmann.dev/api/auth/activate/{uid}/{token}/"
     return activation_link
 
+@lru_cache(maxsize=None)
+def prerender_template(template_name, keys):
+    """
+    Render an email template once with placeholders and split it into its parts.
+    
+    Returns a list alternating between static text and context keys. Only suitable
+    for templates that output their variables as they are, without tags or filters
+    that depend on the values.
+    """
+    html = render_to_string(template_name, {key: PLACEHOLDER.format(key) for key in keys})
+    return PLACEHOLDER_PATTERN.split(html)
+
+def render_mail_template(template_name, **context):
+    """
+    Render an email template by substituting the context into its pre-rendered parts.
+    
+    Produces the same HTML as render_to_string (values are escaped like Django's
+    autoescaping) while the template itself is only rendered once per process.
+    """
+    parts = prerender_template(template_name, tuple(sorted(context)))
+    return ''.join(escape(context[part]) if index % 2 else part for index, part in enumerate(parts))
+
 def send_confirm_mail(email, username, activation_link):
     """
     Send an account activation email to a newly registered user.
     
-    Creates and sends both HTML and plain text versions of the confirmation
-    email containing the activation link. The email is personalized with
-    the user's name (extracted from username).
+    Creates both HTML and plain text versions of the confirmation email
+    containing the activation link and queues it for the mail worker. The
+    email is personalized with the user's name (extracted from username).
     """
     subject = "Confirm your email"
-    from_email = settings.DEFAULT_FROM_EMAIL
 
-    html_content = render_to_string('emails/confirm_email.html', {
-        'username': username.split('@')[0],  # Extract name from email
-        'activation_link': activation_link,
-    })
+    html_content = render_mail_template(
+        'emails/confirm_email.html',
+        username=username.split('@')[0],  # Extract name from email
+        activation_link=activation_link,
+    )
   
     text_content = f"Hello {username.split('@')[0]}, please confirm your email with this link: {activation_link}"
   
-    email_msg = EmailMultiAlternatives(subject, text_content, from_email, [email])
-    email_msg.attach_alternative(html_content, "text/html")
-    
-    email_msg.send()
+    queue_mail(subject, text_content, [email], html_content)
 
 def send_reset_mail(email, username, reset_link):
     """
     Send a password reset email to a user.
     
-    Creates and sends both HTML and plain text versions of the password reset
-    email containing the reset link. The email is personalized with
-    the user's name (extracted from username).
+    Creates both HTML and plain text versions of the password reset email
+    containing the reset link and queues it for the mail worker. The email
+    is personalized with the user's name (extracted from username).
     """
     subject = "Reset your password"
-    from_email = settings.DEFAULT_FROM_EMAIL
 
-    html_content = render_to_string('emails/forgot_password.html', {
-        'username': username.split('@')[0],  # Extract name from email
-        'reset_link': reset_link,
-    })
+    html_content = render_mail_template(
+        'emails/forgot_password.html',
+        username=username.split('@')[0],  # Extract name from email
+        reset_link=reset_link,
+    )
     
     text_content = f"Hello {username.split('@')[0]}, please reset your password by clicking this link: {reset_link}"
   
-    email_msg = EmailMultiAlternatives(subject, text_content, from_email, [email])
-    email_msg.attach_alternative(html_content, "text/html")
-    
-    email_msg.send()
\ No newline at end of file
+    queue_mail(subject, text_content, [email], html_content)
\ No newline at end of file
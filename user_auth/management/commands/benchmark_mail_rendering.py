@@ -0,0 +1,43 @@
+import time
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from user_auth.api.utils import render_mail_template
+
+class Command(BaseCommand):
+    """
+    Measure how many activation and reset emails can be rendered per second.
+
+    Compares a full render_to_string per email with the pre-rendered templates
+    used by send_confirm_mail and send_reset_mail.
+    """
+    help = 'Benchmark rendering of the activation and password reset emails.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        templates = [
+            ('emails/confirm_email.html', 'activation_link'),
+            ('emails/forgot_password.html', 'reset_link'),
+        ]
+        for template_name, link_key in templates:
+            def context(index):
+                return {'username': f'user{index}', link_key: f'https://example.com/{index}/token/'}
+
+            render_to_string(template_name, context(0))
+            render_mail_template(template_name, **context(0))
+
+            full = self.measure(iterations, lambda index: render_to_string(template_name, context(index)))
+            cached = self.measure(iterations, lambda index: render_mail_template(template_name, **context(index)))
+            self.stdout.write(
+                f'{template_name}: render_to_string {full:,.0f} emails/s, '
+                f'pre-rendered {cached:,.0f} emails/s ({cached / full:.1f}x)'
+            )
+
+    def measure(self, iterations, render):
+        """Return how many renders per second render(index) achieves."""
+        start = time.perf_counter()
+        for index in range(iterations):
+            render(index)
+        return iterations / (time.perf_counter() - start)
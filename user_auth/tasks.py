@@ -0,0 +1,104 @@
+import json
+import time
+from smtplib import SMTPException, SMTPRecipientsRefused, SMTPResponseException
+import django_rq
+from rq import Retry
+from django.conf import settings
+from django.core.mail import EmailMultiAlternatives, get_connection
+
+PENDING_MAILS_KEY = 'user_auth:pending_mails'
+SENDING_MAILS_KEY = 'user_auth:sending_mails'
+FAILED_MAILS_KEY = 'user_auth:failed_mails'
+DELIVERY_LOCK_KEY = 'user_auth:mail_delivery'
+
+def queue_mail(subject, text_content, to, html_content=None, from_email=None):
+    """
+    Store a mail for delivery by the mail worker instead of sending it on the request path.
+
+    The mail is appended to a Redis list and a delivery job is added to the 'mail'
+    queue. Whichever delivery job runs first sends every pending mail, the
+    remaining jobs find the list empty.
+    """
+    payload = {
+        'subject': subject,
+        'body': text_content,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'to': to,
+        'html': html_content,
+    }
+    django_rq.get_connection('mail').rpush(PENDING_MAILS_KEY, json.dumps(payload))
+    queue_delivery()
+
+def queue_delivery():
+    """Add a delivery job to the 'mail' queue, retried while the mail server fails."""
+    queue = django_rq.get_queue('mail')
+    queue.enqueue(deliver_pending_mails, retry=Retry(max=3, interval=settings.MAIL_RETRY_INTERVALS))
+
+def delivery_timeout():
+    """Seconds a delivery job may run before RQ kills it, see settings.RQ_QUEUES."""
+    return settings.RQ_QUEUES['mail'].get('DEFAULT_TIMEOUT', 180)
+
+def requeue_unsent_mails(redis):
+    """Put mails a killed or crashed delivery job took but never sent back at the front of the list."""
+    for _ in range(redis.llen(SENDING_MAILS_KEY)):
+        redis.lmove(SENDING_MAILS_KEY, PENDING_MAILS_KEY, 'RIGHT', 'LEFT')
+
+def is_permanent_failure(error):
+    """Whether the mail server rejected a mail for good (5xx), so sending it again cannot succeed."""
+    if isinstance(error, SMTPRecipientsRefused):
+        return all(code >= 500 for code, message in error.recipients.values())
+    return isinstance(error, SMTPResponseException) and error.smtp_code >= 500
+
+def build_mail(payload, connection=None):
+    """Create the email message described by a queued payload."""
+    data = json.loads(payload)
+    email_msg = EmailMultiAlternatives(
+        data['subject'], data['body'], data['from_email'], data['to'], connection=connection
+    )
+    if data['html']:
+        email_msg.attach_alternative(data['html'], "text/html")
+    return email_msg
+
+def deliver_pending_mails():
+    """
+    Send pending mails over a single SMTP connection.
+
+    Each mail is moved to a sending list while it is sent and only removed
+    once the server accepted it, so a worker that dies mid-delivery loses
+    nothing: the next delivery puts its mails back. A lock lets one delivery
+    run at a time. Mails the server rejects permanently are moved to the
+    failed list, a transient failure puts the mail back at the front and is
+    re-raised so RQ retries the job. A job sends at most settings.MAIL_BATCH_SIZE
+    mails within half of the queue timeout and queues a follow-up delivery
+    for the rest. Returns the number of mails sent.
+    """
+    redis = django_rq.get_connection('mail')
+    if not redis.set(DELIVERY_LOCK_KEY, 1, nx=True, ex=delivery_timeout()):
+        return 0
+    sent = 0
+    try:
+        requeue_unsent_mails(redis)
+        deadline = time.monotonic() + delivery_timeout() / 2
+        with get_connection() as connection:
+            while sent < settings.MAIL_BATCH_SIZE and time.monotonic() < deadline:
+                payload = redis.lmove(PENDING_MAILS_KEY, SENDING_MAILS_KEY, 'LEFT', 'RIGHT')
+                if payload is None:
+                    break
+                try:
+                    connection.send_messages([build_mail(payload, connection)])
+                except SMTPException as error:
+                    if not is_permanent_failure(error):
+                        redis.lmove(SENDING_MAILS_KEY, PENDING_MAILS_KEY, 'RIGHT', 'LEFT')
+                        raise
+                    redis.rpush(FAILED_MAILS_KEY, payload)
+                except OSError:
+                    redis.lmove(SENDING_MAILS_KEY, PENDING_MAILS_KEY, 'RIGHT', 'LEFT')
+                    raise
+                else:
+                    sent += 1
+                redis.lrem(SENDING_MAILS_KEY, 1, payload)
+    finally:
+        redis.delete(DELIVERY_LOCK_KEY)
+    if redis.llen(PENDING_MAILS_KEY):
+        queue_delivery()
+    return sent
@@ -0,0 +1,138 @@
+import json
+from smtplib import SMTPRecipientsRefused, SMTPServerDisconnected
+from django.core import mail
+from django.test import TestCase
+from django.test.utils import override_settings
+from user_auth.api.utils import send_confirm_mail, send_reset_mail
+from user_auth.tasks import (
+    DELIVERY_LOCK_KEY, FAILED_MAILS_KEY, PENDING_MAILS_KEY, SENDING_MAILS_KEY, deliver_pending_mails, queue_mail,
+)
+from unittest.mock import call, patch
+
+def payload(to):
+    return json.dumps({
+        'subject': 'Confirm your email',
+        'body': 'Hello',
+        'from_email': 'noreply@example.com',
+        'to': [to],
+        'html': '<p>Hello</p>',
+    })
+
+@override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend', MAIL_BATCH_SIZE=2)
+class MailTasksTest(TestCase):
+    def setUp(self):
+        rq_patcher = patch('user_auth.tasks.django_rq')
+        self.mock_rq = rq_patcher.start()
+        self.addCleanup(rq_patcher.stop)
+        self.mock_redis = self.mock_rq.get_connection.return_value
+        self.mock_redis.llen.return_value = 0
+
+    def pending(self, *payloads):
+        """Let the mocked Redis hand out payloads from the pending list."""
+        remaining = iter(payloads)
+        self.mock_redis.lmove.side_effect = lambda source, *args: next(remaining, None) if source == PENDING_MAILS_KEY else None
+
+    def test_queue_mail_does_not_send(self):
+        """Test that queueing stores the mail and enqueues a retrying delivery job"""
+        queue_mail('Subject', 'Body', ['user@example.com'], '<p>Body</p>')
+
+        self.assertEqual(len(mail.outbox), 0)
+        key, stored = self.mock_redis.rpush.call_args[0]
+        self.assertEqual(key, PENDING_MAILS_KEY)
+        self.assertEqual(json.loads(stored)['to'], ['user@example.com'])
+        self.mock_rq.get_queue.assert_called_once_with('mail')
+        enqueue_call = self.mock_rq.get_queue.return_value.enqueue.call_args
+        self.assertEqual(enqueue_call[0][0], deliver_pending_mails)
+        self.assertEqual(enqueue_call[1]['retry'].max, 3)
+
+    def test_utils_queue_rendered_mails(self):
+        """Test that confirm and reset mails are rendered and queued instead of sent"""
+        send_confirm_mail('user@example.com', 'user@example.com', 'http://example.com/activate/')
+        send_reset_mail('user@example.com', 'user@example.com', 'http://example.com/reset/')
+
+        self.assertEqual(len(mail.outbox), 0)
+        stored = [json.loads(call[0][1]) for call in self.mock_redis.rpush.call_args_list]
+        self.assertEqual([data['subject'] for data in stored], ['Confirm your email', 'Reset your password'])
+        self.assertIn('http://example.com/activate/', stored[0]['html'])
+        self.assertIn('http://example.com/reset/', stored[1]['body'])
+
+    @patch('user_auth.tasks.get_connection')
+    def test_mails_share_one_connection(self, mock_get_connection):
+        """Test that pending mails are sent over a single connection and acknowledged once sent"""
+        mails = [payload('a@example.com'), payload('b@example.com')]
+        self.pending(*mails)
+        connection = mock_get_connection.return_value.__enter__.return_value
+
+        sent = deliver_pending_mails()
+
+        self.assertEqual(sent, 2)
+        mock_get_connection.assert_called_once()
+        recipients = [call[0][0][0].to for call in connection.send_messages.call_args_list]
+        self.assertEqual(recipients, [['a@example.com'], ['b@example.com']])
+        self.mock_redis.lmove.assert_any_call(PENDING_MAILS_KEY, SENDING_MAILS_KEY, 'LEFT', 'RIGHT')
+        self.assertEqual(self.mock_redis.lrem.call_args_list, [call(SENDING_MAILS_KEY, 1, mail) for mail in mails])
+        self.mock_redis.delete.assert_called_once_with(DELIVERY_LOCK_KEY)
+
+    @patch('user_auth.tasks.get_connection')
+    def test_batch_budget_queues_follow_up(self, mock_get_connection):
+        """Test that a delivery stops after MAIL_BATCH_SIZE mails and queues another job for the rest"""
+        self.pending(payload('a@example.com'), payload('b@example.com'), payload('c@example.com'))
+        self.mock_redis.llen.side_effect = lambda key: 1 if key == PENDING_MAILS_KEY else 0
+
+        self.assertEqual(deliver_pending_mails(), 2)
+
+        self.mock_rq.get_queue.return_value.enqueue.assert_called_once()
+
+    @patch('user_auth.tasks.get_connection')
+    def test_unsent_mail_requeued_on_failure(self, mock_get_connection):
+        """Test that a transient SMTP failure puts the mail back at the front and re-raises for retry"""
+        self.pending(payload('a@example.com'), payload('b@example.com'))
+        connection = mock_get_connection.return_value.__enter__.return_value
+        connection.send_messages.side_effect = [1, SMTPServerDisconnected('Connection unexpectedly closed')]
+
+        with self.assertRaises(SMTPServerDisconnected):
+            deliver_pending_mails()
+
+        self.mock_redis.lmove.assert_called_with(SENDING_MAILS_KEY, PENDING_MAILS_KEY, 'RIGHT', 'LEFT')
+        self.assertEqual(self.mock_redis.lrem.call_count, 1)
+        self.mock_redis.delete.assert_called_once_with(DELIVERY_LOCK_KEY)
+
+    @patch('user_auth.tasks.get_connection')
+    def test_rejected_mail_dead_lettered(self, mock_get_connection):
+        """Test that a permanently rejected mail is moved to the failed list and delivery goes on"""
+        rejected, accepted = payload('invalid@example.com'), payload('b@example.com')
+        self.pending(rejected, accepted)
+        connection = mock_get_connection.return_value.__enter__.return_value
+        connection.send_messages.side_effect = [SMTPRecipientsRefused({'invalid@example.com': (550, b'No such user')}), 1]
+
+        self.assertEqual(deliver_pending_mails(), 1)
+
+        self.mock_redis.rpush.assert_called_once_with(FAILED_MAILS_KEY, rejected)
+        self.assertEqual(self.mock_redis.lrem.call_args_list, [call(SENDING_MAILS_KEY, 1, rejected), call(SENDING_MAILS_KEY, 1, accepted)])
+
+    def test_mails_of_crashed_delivery_requeued(self):
+        """Test that mails a dead worker took but never sent go back to the front of the list"""
+        self.mock_redis.llen.side_effect = lambda key: 2 if key == SENDING_MAILS_KEY else 0
+        self.pending()
+
+        deliver_pending_mails()
+
+        self.assertEqual(self.mock_redis.lmove.call_args_list[:2], [call(SENDING_MAILS_KEY, PENDING_MAILS_KEY, 'RIGHT', 'LEFT')] * 2)
+
+    def test_concurrent_delivery_skipped(self):
+        """Test that a delivery job leaves the mails to the one holding the lock"""
+        self.mock_redis.set.return_value = False
+
+        self.assertEqual(deliver_pending_mails(), 0)
+
+        self.mock_redis.lmove.assert_not_called()
+
+    def test_delivery_sends_html_alternative(self):
+        """Test that delivered mails carry the plain text and the HTML version"""
+        self.pending(payload('a@example.com'))
+
+        deliver_pending_mails()
+
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].to, ['a@example.com'])
+        self.assertEqual(mail.outbox[0].alternatives[0][1], 'text/html')
@@ -0,0 +1,33 @@
+from django.template.loader import render_to_string
+from django.test import SimpleTestCase
+from user_auth.api.utils import prerender_template, render_mail_template
+
+class MailTemplateTest(SimpleTestCase):
+    def test_same_html_as_render_to_string(self):
+        """Test that pre-rendered templates produce exactly the output of a full render"""
+        contexts = [
+            ('emails/confirm_email.html', {'username': 'jane', 'activation_link': 'https://example.com/a/MQ/token/'}),
+            ('emails/forgot_password.html', {'username': 'john', 'reset_link': 'https://example.com/reset/MQ/token'}),
+        ]
+        for template_name, context in contexts:
+            self.assertEqual(render_mail_template(template_name, **context), render_to_string(template_name, context))
+
+    def test_values_are_escaped(self):
+        """Test that values are escaped like Django's autoescaping"""
+        context = {'username': '<b>"o\'neil"</b> & co', 'activation_link': 'https://example.com/?a=1&b=2'}
+
+        html = render_mail_template('emails/confirm_email.html', **context)
+
+        self.assertEqual(html, render_to_string('emails/confirm_email.html', context))
+        self.assertNotIn('<b>', html)
+
+    def test_template_rendered_once(self):
+        """Test that the template is only rendered on first use"""
+        prerender_template.cache_clear()
+        context = {'username': 'jane', 'reset_link': 'https://example.com/reset/'}
+
+        render_mail_template('emails/forgot_password.html', **context)
+        render_mail_template('emails/forgot_password.html', **context)
+
+        self.assertEqual(prerender_template.cache_info().misses, 1)
+        self.assertEqual(prerender_template.cache_info().hits, 1)
@@ -3,11 +3,16 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from user_auth.models import User
+from unittest.mock import patch
 
 class RegistrationViewTest(TestCase):
   def setUp(self):
     self.client = Client()
 
+    queue_mail_patcher = patch('user_auth.api.utils.queue_mail')
+    self.mock_queue_mail = queue_mail_patcher.start()
+    self.addCleanup(queue_mail_patcher.stop)
+
     self.registration_url = reverse('registration')
 
     self.valid_user_data = {
@@ -31,6 +36,11 @@ class RegistrationViewTest(TestCase):
     self.assertEqual(user.username, self.valid_user_data['email'])
     self.assertFalse(user.is_activated)
 
+    self.mock_queue_mail.assert_called_once()
+    subject, text_content, to, html_content = self.mock_queue_mail.call_args[0]
+    self.assertEqual(to, [self.valid_user_data['email']])
+    self.assertIn('/api/auth/activate/', html_content)
+
   def test_registration_password_mismatch(self):
         """Test registration fails when passwords don't match"""
         data = self.valid_user_data.copy()
@@ -46,6 +46,57 @@ CORS_ALLOWED_ORIGINS = os.getenv('CORS_ALLOWED_ORIGINS', '').split(',')
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 MEDIA_URL = '/media/'
 
+# Uploads and conversion outputs only go through Django's storage API. Setting
+# MEDIA_STORAGE_BACKEND to an object store, e.g. storages.backends.s3.S3Storage
+# from django-storages[s3] (S3, MinIO), lets web and worker nodes run without a
+# shared disk. Workers then stream their input from pre-signed URLs and upload
+# their outputs, AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY are read by boto3.
+STORAGES = {
+    'default': {
+        'BACKEND': os.getenv('MEDIA_STORAGE_BACKEND', 'videos.storage.SignedFileSystemStorage'),
+    },
+    'staticfiles': {
+        'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+    },
+}
+AWS_STORAGE_BUCKET_NAME = os.getenv('AWS_STORAGE_BUCKET_NAME', '')
+AWS_S3_ENDPOINT_URL = os.getenv('AWS_S3_ENDPOINT_URL') or None
+AWS_S3_REGION_NAME = os.getenv('AWS_S3_REGION_NAME') or None
+
+# Media files are streamed with byte range support by videos.views.stream_media.
+# Set MEDIA_SENDFILE to 'x-accel-redirect' (nginx) or 'x-sendfile' (Apache, lighttpd)
+# to let the front proxy transfer the bytes, nginx needs an internal location
+# MEDIA_ACCEL_REDIRECT_PREFIX aliased to MEDIA_ROOT.
+MEDIA_SENDFILE = os.getenv('MEDIA_SENDFILE', '')
+MEDIA_ACCEL_REDIRECT_PREFIX = os.getenv('MEDIA_ACCEL_REDIRECT_PREFIX', '/protected-media/')
+MEDIA_STREAM_CHUNK_SIZE = 64 * 1024
+
+# With MEDIA_URL_TTL set, media URLs are signed with SECRET_KEY and expire after
+# MEDIA_URL_TTL to twice as many seconds. The signature is part of the path, so the
+# relative segment and sprite URLs of HLS playlists and VTT files inherit it. It
+# is also part of every CDN cache key, so a CDN fetches each file again in every
+# TTL window and may only keep it until the URL expires. Signing and long CDN
+# caching do not go together: the default 0 serves media without signatures and
+# lets files below a content addressed video directory, which never change, be
+# cached for MEDIA_CACHE_MAX_AGE.
+MEDIA_URL_TTL = int(os.getenv('MEDIA_URL_TTL', 0))
+MEDIA_CACHE_MAX_AGE = 365 * 24 * 60 * 60
+
+# Files of deleted videos are removed by the 'default' RQ queue after the
+# deletion is committed, this many videos per batch. Failed cleanups are retried
+# after MEDIA_CLEANUP_RETRY_INTERVALS, which needs a worker started with
+# --with-scheduler. Files no video refers to
+# anymore are swept on the MEDIA_SWEEP_SCHEDULE once they are MEDIA_SWEEP_MIN_AGE
+# seconds old, the cron job is installed with `python manage.py crontab add`. The
+# sweep also removes conversion workspaces nothing was written to for as long and
+# uploads that received no chunk for VIDEO_UPLOAD_MAX_AGE seconds.
+MEDIA_CLEANUP_BATCH_SIZE = int(os.getenv('MEDIA_CLEANUP_BATCH_SIZE', 100))
+MEDIA_CLEANUP_RETRY_INTERVALS = [60, 300, 900]
+MEDIA_SWEEP_MIN_AGE = int(os.getenv('MEDIA_SWEEP_MIN_AGE', 24 * 60 * 60))
+CRONJOBS = [
+    (os.getenv('MEDIA_SWEEP_SCHEDULE', '30 3 * * *'), 'videos.cleanup.queue_orphan_sweep'),
+]
+
 
 # Application definition
 
@@ -56,6 +107,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',
     'rest_framework.authtoken',
     'user_auth',
@@ -63,6 +115,7 @@ INSTALLED_APPS = [
     'videos.apps.VideosConfig',
     'debug_toolbar',
     'django_rq',
+    'django_crontab',
     'import_export',
 ]
 
@@ -79,16 +132,131 @@ MIDDLEWARE = [
 ]
 
 
+RQ_CONNECTION = {
+    'HOST':     os.getenv('REDIS_HOST', 'localhost'),
+    'PORT':     int(os.getenv('REDIS_PORT', 6379)),
+    'DB':       int(os.getenv('REDIS_DB', 0)),
+    'PASSWORD': os.getenv('REDIS_PASSWORD', None),
+    'DEFAULT_TIMEOUT':   int(os.getenv('RQ_DEFAULT_TIMEOUT', 360)),
+    'DEFAULT_RESULT_TTL':int(os.getenv('RQ_DEFAULT_RESULT_TTL', 800)),
+}
+
+# Workers take jobs from their queues in the order given on the command line,
+# so short latency-sensitive jobs are listed first and hour-long encodes last:
+#   python manage.py rqworker preview mail thumbnails default transcode --with-scheduler
+# Dedicated encoding machines can be routed to the bulk queue only:
+#   python manage.py rqworker transcode
+RQ_QUEUE_PRIORITY = ['preview', 'mail', 'thumbnails', 'default', 'transcode']
+
 RQ_QUEUES = {
+    'preview':    {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': int(os.getenv('RQ_PREVIEW_TIMEOUT', 600))},
+    'mail':       {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': int(os.getenv('RQ_MAIL_TIMEOUT', 60))},
+    'thumbnails': {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': int(os.getenv('RQ_THUMBNAILS_TIMEOUT', 300))},
+    'default':    {**RQ_CONNECTION},
+    'transcode':  {**RQ_CONNECTION, 'DEFAULT_TIMEOUT': int(os.getenv('RQ_TRANSCODE_TIMEOUT', 1800))},
+}
+
+# Conversion jobs get at least their queue's DEFAULT_TIMEOUT, longer sources
+# get this many seconds of encoding time per second of video.
+VIDEO_TIMEOUT_FACTOR = float(os.getenv('VIDEO_TIMEOUT_FACTOR', 3))
+
+# Encoder profiles, selected per rendition. Keys left out fall back to
+# videos.profiles.DEFAULT_PROFILE. 'codec' may name any ffmpeg video encoder,
+# e.g. h264_nvenc or h264_qsv on workers with hardware encoders.
+VIDEO_ENCODER_PROFILES = {
     'default': {
-        'HOST':     os.getenv('REDIS_HOST', 'localhost'),
-        'PORT':     int(os.getenv('REDIS_PORT', 6379)),
-        'DB':       int(os.getenv('REDIS_DB', 0)),
-        'PASSWORD': os.getenv('REDIS_PASSWORD', None),
-        'DEFAULT_TIMEOUT':   int(os.getenv('RQ_DEFAULT_TIMEOUT', 360)),
-        'DEFAULT_RESULT_TTL':int(os.getenv('RQ_DEFAULT_RESULT_TTL', 800)),
-    }
+        'codec': os.getenv('VIDEO_CODEC', 'libx264'),
+        'preset': os.getenv('VIDEO_PRESET', 'medium'),
+        'crf': 23,
+    },
+    'fast': {
+        'codec': os.getenv('VIDEO_CODEC', 'libx264'),
+        'preset': 'ultrafast',
+        'crf': 28,
+        'audio_bitrate': '96k',
+    },
+    'hls_480p': {
+        'preset': 'veryfast',
+        'crf': None,
+        'bitrate': '1400k',
+        'maxrate': '1500k',
+    },
+    'hls_720p': {
+        'preset': 'veryfast',
+        'crf': None,
+        'bitrate': '2800k',
+        'maxrate': '3000k',
+    },
+}
+
+# MP4 renditions produced for every upload, keyed by file suffix.
+# Extra renditions can be added as comma separated heights, e.g. VIDEO_EXTRA_RENDITIONS=360,1080
+# A source that already matches a rendition is remuxed if its bitrate stays
+# within 'copy_maxrate', about 7 kbit/s per line of height.
+VIDEO_RENDITIONS = {
+    '480p': {'height': 480, 'profile': 'default', 'copy_maxrate': '3360k'},
+    '720p': {'height': 720, 'profile': 'default', 'copy_maxrate': '5040k'},
 }
+for height in filter(None, os.getenv('VIDEO_EXTRA_RENDITIONS', '').split(',')):
+    VIDEO_RENDITIONS[f'{height.strip()}p'] = {'height': int(height), 'profile': 'default', 'copy_maxrate': f'{int(height) * 7}k'}
+
+# Low resolution rendition published first so new uploads are playable
+# before the full ladder has been converted.
+VIDEO_PREVIEW_RENDITIONS = {
+    'preview': {'height': 360, 'profile': 'fast'},
+}
+
+# Variant streams of the HLS ladder, keyed by variant name.
+VIDEO_HLS_RENDITIONS = {
+    '480p': {'height': 480, 'profile': 'hls_480p'},
+    '720p': {'height': 720, 'profile': 'hls_720p'},
+}
+
+# The preview conversion also extracts a poster frame, used as thumbnail when
+# none was uploaded, and sprite sheets of small frames every 'interval' seconds
+# with a WebVTT index that players use for seek previews.
+VIDEO_POSTER_SECOND = int(os.getenv('VIDEO_POSTER_SECOND', 5))
+VIDEO_SPRITE = {
+    'interval': int(os.getenv('VIDEO_SPRITE_INTERVAL', 5)),
+    'width': 160,
+    'height': 90,
+    'columns': 10,
+    'rows': 10,
+}
+
+# Thumbnails are converted to every width (pixels, never upscaled) in every
+# format on the 'thumbnails' queue, the API returns them as srcset strings.
+VIDEO_THUMBNAIL_WIDTHS = [int(width) for width in os.getenv('VIDEO_THUMBNAIL_WIDTHS', '320,640,1280').split(',')]
+VIDEO_THUMBNAIL_FORMATS = {
+    'avif': {
+        'mime_type': 'image/avif',
+        'args': ['-c:v', 'libaom-av1', '-still-picture', '1', '-crf', '35', '-b:v', '0', '-cpu-used', '6'],
+    },
+    'webp': {
+        'mime_type': 'image/webp',
+        'args': ['-c:v', 'libwebp', '-quality', '75'],
+    },
+}
+
+# Sources are split at keyframes into chunks of roughly this length,
+# each chunk is transcoded as its own RQ job.
+VIDEO_CHUNK_SECONDS = int(os.getenv('VIDEO_CHUNK_SECONDS', 120))
+
+# Page size of the video catalog, clients may ask for up to VIDEO_MAX_PAGE_SIZE
+VIDEO_PAGE_SIZE = int(os.getenv('VIDEO_PAGE_SIZE', 24))
+VIDEO_MAX_PAGE_SIZE = int(os.getenv('VIDEO_MAX_PAGE_SIZE', 100))
+
+# Videos per genre on the genre grouped catalog, clients may ask for up to VIDEO_MAX_PAGE_SIZE
+VIDEO_GENRE_LIMIT = int(os.getenv('VIDEO_GENRE_LIMIT', 12))
+
+# Largest source video accepted by the resumable upload API, in bytes
+VIDEO_UPLOAD_MAX_SIZE = int(os.getenv('VIDEO_UPLOAD_MAX_SIZE', 50 * 1024 ** 3))
+
+# Seconds an upload is kept after its last chunk or its finish, so it can be resumed
+VIDEO_UPLOAD_MAX_AGE = int(os.getenv('VIDEO_UPLOAD_MAX_AGE', 7 * 24 * 60 * 60))
+
+# Postgres text search configuration used to index and query titles, genres and descriptions
+VIDEO_SEARCH_CONFIG = os.getenv('VIDEO_SEARCH_CONFIG', 'english')
 
 ROOT_URLCONF = 'videoflix.urls'
 
@@ -112,12 +280,22 @@ INTERNAL_IPS = [
 
 CACHE_TTL = 60 * 15
 
+# Cached video list and detail payloads are invalidated by a catalog version
+# whenever a video or its conversion changes. The timeout only expires
+# payloads of old versions.
+VIDEO_CACHE_TIMEOUT = int(os.getenv('VIDEO_CACHE_TIMEOUT', 60 * 60 * 24))
+
 TEMPLATES = [
     {
         'BACKEND': 'django.template.backends.django.DjangoTemplates',
         'DIRS': [os.path.join(BASE_DIR, 'templates')],
-        'APP_DIRS': True,
         'OPTIONS': {
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
             'context_processors': [
                 'django.template.context_processors.debug',
                 'django.template.context_processors.request',
@@ -154,6 +332,13 @@ EMAIL_HOST_USER     = os.getenv('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.getenv('EMAIL_HOST_PASSWORD')
 DEFAULT_FROM_EMAIL  = os.getenv('DEFAULT_FROM_EMAIL')
 
+# Activation and reset mails are sent by the 'mail' RQ queue over one SMTP
+# connection per batch of at most MAIL_BATCH_SIZE mails. Failed deliveries are
+# retried after these delays, which needs a worker started with --with-scheduler.
+# Mails the server rejects permanently are kept in the user_auth:failed_mails list.
+MAIL_BATCH_SIZE      = int(os.getenv('MAIL_BATCH_SIZE', 100))
+MAIL_RETRY_INTERVALS = [10, 60, 300]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -17,7 +17,7 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
+from videos.views import stream_media
 from debug_toolbar.toolbar import debug_toolbar_urls
 
 urlpatterns = [
@@ -25,4 +25,6 @@ urlpatterns = [
     path('api/auth/', include('user_auth.api.urls')),
     path('api/videos/', include('videos.api.urls')),
     path('api/django-rq/', include('django_rq.urls')),
-] + static(settings.MEDIA_URL, document_root = settings.MEDIA_ROOT) + debug_toolbar_urls()
+    path(f'{settings.MEDIA_URL.lstrip("/")}s/<int:expires>/<str:signature>/<path:path>', stream_media, name='signed_media'),
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:path>', stream_media, name='media'),
+] + debug_toolbar_urls()
@@ -1,5 +1,6 @@
 from django.contrib import admin
-from .models import Video
+from .models import Video, TranscodeJob, VideoUpload
+from .signals import queue_thumbnail_conversion
 from import_export.admin import ImportExportModelAdmin
 from import_export import resources
 
@@ -15,6 +16,18 @@ class VideoResources(resources.ModelResource):
     """
     class Meta:
         model = Video
+        exclude = ('search_vector',)
+
+
+class TranscodeJobInline(admin.TabularInline):
+    """
+    Read-only overview of the conversion jobs of a video on its admin page.
+    """
+    model = TranscodeJob
+    extra = 0
+    can_delete = False
+    fields = ['rendition', 'status', 'progress', 'worker', 'started_at', 'finished_at', 'error']
+    readonly_fields = fields
 
 
 @admin.register(Video)
@@ -31,4 +44,43 @@ class VideoAdmin(ImportExportModelAdmin):
     The resource_classes attribute specifies which resource class(es) should be used
     for import/export operations.
     """
-    resource_classes = [VideoResources]
\ No newline at end of file
+    resource_classes = [VideoResources]
+    inlines = [TranscodeJobInline]
+    readonly_fields = ['duration', 'width', 'height', 'bitrate', 'video_codec', 'audio_codec', 'pix_fmt', 'keyframe_interval']
+
+    def save_model(self, request, obj, form, change):
+        """
+        Saves the video and converts a replaced thumbnail to its responsive variants.
+        The variants of a replaced or cleared thumbnail are dropped right away.
+        """
+        thumbnail_changed = change and 'thumbnail' in form.changed_data
+        if thumbnail_changed:
+            obj.thumbnail_srcset = {}
+        super().save_model(request, obj, form, change)
+        if thumbnail_changed and obj.thumbnail:
+            queue_thumbnail_conversion(obj)
+
+
+@admin.register(TranscodeJob)
+class TranscodeJobAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the TranscodeJob model.
+
+    Lists every conversion with its status, progress, worker and timing. Filtering by
+    worker shows how many conversions each RQ worker has processed and how long they took.
+    """
+    list_display = ['video', 'rendition', 'status', 'progress', 'worker', 'started_at', 'finished_at', 'duration']
+    list_filter = ['status', 'rendition', 'worker']
+    search_fields = ['video__title']
+
+
+@admin.register(VideoUpload)
+class VideoUploadAdmin(admin.ModelAdmin):
+    """
+    Admin configuration for the VideoUpload model.
+
+    Shows resumable uploads that have not been finished yet and how far they got.
+    """
+    list_display = ['filename', 'title', 'created_by', 'offset', 'length', 'updated_at']
+    readonly_fields = ['received']
+
@@ -0,0 +1,165 @@
+from collections import defaultdict
+from itertools import groupby
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import BooleanField, Exists, ExpressionWrapper, F, OuterRef, Q, Window
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from django.utils.encoding import filepath_to_uri
+from videos.models import Video, TranscodeJob
+from videos.storage import SignedFileSystemStorage, signed_name, url_expiry
+from .serializers import VideoCatalogSerializer
+
+def file_url(field_name):
+    """
+    Return a function building the URL of a stored file from its name.
+
+    For files on the local file system the URL is the precomputed MEDIA_URL
+    prefix plus the quoted name, other storages build it themselves. Signed
+    URLs share one expiry, so only the HMAC is computed per file.
+    """
+    storage = Video._meta.get_field(field_name).storage
+    if isinstance(storage, SignedFileSystemStorage) and settings.MEDIA_URL_TTL:
+        prefix, expires = storage.base_url, url_expiry()
+        return lambda name: prefix + filepath_to_uri(signed_name(name, expires)).lstrip('/') if name else None
+    if isinstance(storage, FileSystemStorage):
+        prefix = storage.base_url
+        return lambda name: prefix + filepath_to_uri(name).lstrip('/') if name else None
+    return lambda name: storage.url(name) if name else None
+
+def datetime_representation(value):
+    """ISO 8601 in the current time zone with a Z suffix for UTC, like DRF's DateTimeField."""
+    value = timezone.localtime(value).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+def srcset_representation(url):
+    """Return a function building the SrcsetField representation of thumbnail_srcset values."""
+    def represent(value):
+        return {
+            mime_type: ', '.join(f'{url(name)} {width}w' for width, name in variants)
+            for mime_type, variants in value.get('variants', {}).items()
+        }
+    return represent
+
+def text_representation(value):
+    return str(value)
+
+def nullable(representation):
+    """None stays None, like DRF skips to_representation() for empty values."""
+    return lambda value: None if value is None else representation(value)
+
+FILE_FIELDS = ('file', 'thumbnail', 'seek_previews')
+
+REPRESENTATIONS = {
+    'id': int,
+    'title': text_representation,
+    'description': text_representation,
+    'genre': text_representation,
+    'uploaded_at': datetime_representation,
+    'updated_at': datetime_representation,
+    'playable': bool,
+    'ready': bool,
+    'duration': nullable(float),
+    'width': nullable(int),
+    'height': nullable(int),
+    'bitrate': nullable(int),
+    'video_codec': text_representation,
+    'audio_codec': text_representation,
+    'keyframe_interval': nullable(float),
+}
+
+def conversion_annotations():
+    """
+    playable and ready of VideoListSerializer as SQL expressions.
+
+    Videos without any job count as playable and ready, like in the serializer.
+    """
+    jobs = TranscodeJob.objects.filter(video=OuterRef('pk'))
+    done = jobs.filter(status=TranscodeJob.Status.DONE)
+    pending = jobs.exclude(status=TranscodeJob.Status.DONE)
+    return {
+        'playable': ExpressionWrapper(Q(Exists(done)) | ~Q(Exists(jobs)), output_field=BooleanField()),
+        'ready': ExpressionWrapper(~Q(Exists(pending)), output_field=BooleanField()),
+    }
+
+class VideoCatalogRows:
+    """
+    Read-only fast path for the catalog list built on Video.objects.values().
+
+    Produces the same representation as VideoCatalogSerializer, field for
+    field and in the same order, without creating model instances or running
+    DRF's per-field machinery for every video. playable and ready are computed
+    by the database in the same query, the renditions are loaded in one query
+    of (video, rendition, status, progress) tuples for the page.
+    """
+    def __init__(self, field_names):
+        self.field_names = list(VideoCatalogSerializer(fields=field_names).fields)
+        self.columns = [name for name in self.field_names if name != 'renditions']
+        self.with_jobs = 'renditions' in self.field_names
+        self.representations = {name: self.representation(name) for name in self.columns}
+
+    def representation(self, name):
+        """Function turning the value of a column into the serialized value of its field."""
+        if name in FILE_FIELDS:
+            return file_url(name)
+        if name == 'thumbnail_srcset':
+            return srcset_representation(file_url('thumbnail'))
+        return REPRESENTATIONS[name]
+
+    def queryset(self, *extra_columns):
+        """Video rows with the selected columns and the columns of the pagination cursor."""
+        annotations = {name: expression for name, expression in conversion_annotations().items() if name in self.columns}
+        return Video.objects.annotate(**annotations).values('id', 'uploaded_at', *self.columns, *extra_columns)
+
+    def grouped_by_genre(self, limit):
+        """
+        The newest limit videos of every genre as a list of genre and videos, genres sorted by name.
+
+        The per genre limit is applied by a ROW_NUMBER() window over the genre
+        index, so the whole result is read with a single query.
+        """
+        rank = Window(RowNumber(), partition_by=[F('genre')], order_by=[F('uploaded_at').desc(), F('id').desc()])
+        rows = list(
+            self.queryset('genre')
+            .annotate(genre_rank=rank)
+            .filter(genre_rank__lte=limit)
+            .order_by('genre', 'genre_rank')
+        )
+        videos = iter(self.represent(rows))
+        return [
+            {'genre': genre, 'videos': [next(videos) for _ in group]}
+            for genre, group in groupby(rows, key=lambda row: row['genre'])
+        ]
+
+    def represent(self, rows):
+        """Build the catalog representation of values() rows."""
+        jobs = self.jobs([row['id'] for row in rows]) if self.with_jobs else {}
+        representations = self.representations
+        results = []
+        for row in rows:
+            video = {}
+            for name in self.field_names:
+                if name in representations:
+                    video[name] = representations[name](row[name])
+                else:
+                    video[name] = self.renditions(jobs.get(row['id'], ()))
+            results.append(video)
+        return results
+
+    def jobs(self, video_ids):
+        """(rendition, status, progress) of the conversion jobs of each video, keyed by video id."""
+        jobs = defaultdict(list)
+        rows = (
+            TranscodeJob.objects.filter(video_id__in=video_ids)
+            .order_by('pk')
+            .values_list('video_id', 'rendition', 'status', 'progress')
+        )
+        for video_id, rendition, status, progress in rows:
+            jobs[video_id].append((rendition, status, progress))
+        return jobs
+
+    def renditions(self, jobs):
+        """Value of the renditions field, see VideoListSerializer."""
+        return {rendition: {'status': status, 'progress': progress} for rendition, status, progress in jobs}
@@ -0,0 +1,107 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+class VideoCursorPagination(BasePagination):
+    """
+    Keyset pagination for the video catalog, newest uploads first.
+
+    Pages are ordered on (uploaded_at, id) and the cursor encodes the position
+    of the last video of the previous page, so every page is a single index
+    range scan no matter how deep the client has scrolled. The cursor stays
+    valid when videos are added or removed in between requests.
+    """
+    ordering = ('-uploaded_at', '-id')
+    position_field = 'uploaded_at'
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """Return the page of videos following the cursor of the request."""
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        queryset = queryset.order_by(*self.ordering)
+
+        position = self.decode_cursor(request)
+        if position is not None:
+            value, pk = position
+            field = self.position_field
+            queryset = queryset.filter(Q(**{f'{field}__lt': value}) | Q(**{field: value, 'id__lt': pk}))
+
+        results = list(queryset[:self.page_size + 1])
+        self.has_next = len(results) > self.page_size
+        self.page = results[:self.page_size]
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        """Page size from the page_size query parameter, capped at VIDEO_MAX_PAGE_SIZE."""
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return settings.VIDEO_PAGE_SIZE
+        return min(max(page_size, 1), settings.VIDEO_MAX_PAGE_SIZE)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        value, pk = self.get_position(self.page[-1])
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(value, pk))
+
+    def get_position(self, item):
+        """Catalog position of a video instance or of a values() row."""
+        if isinstance(item, dict):
+            return item[self.position_field], item['id']
+        return getattr(item, self.position_field), item.pk
+
+    def encode_cursor(self, value, pk):
+        """Encode a catalog position as an opaque, URL safe token."""
+        return urlsafe_b64encode(f'{self.format_position(value)}|{pk}'.encode()).decode()
+
+    def format_position(self, value):
+        return value.isoformat()
+
+    def parse_position(self, value):
+        return datetime.fromisoformat(value)
+
+    def decode_cursor(self, request):
+        """Decode the cursor of the request, None on the first page."""
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            value, pk = urlsafe_b64decode(token.encode()).decode().split('|')
+            return self.parse_position(value), int(pk)
+        except (binascii.Error, UnicodeDecodeError, TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+
+class VideoSearchPagination(VideoCursorPagination):
+    """
+    Keyset pagination for search results, best matches first.
+
+    Works like VideoCursorPagination on the rank annotation of the search
+    query instead of the upload date. The rank is a float, repr() keeps it
+    exact in the cursor.
+    """
+    ordering = ('-rank', '-id')
+    position_field = 'rank'
+
+    def format_position(self, value):
+        return repr(value)
+
+    def parse_position(self, value):
+        return float(value)
+
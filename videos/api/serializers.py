@@ -1,5 +1,26 @@
+from django.conf import settings
+from django.db.models import Prefetch
 from rest_framework import serializers
-from videos.models import Video
+from videos.models import Video, TranscodeJob, VideoUpload
+
+class SrcsetField(serializers.Field):
+    """
+    Read-only representation of Video.thumbnail_srcset.
+
+    Returns one srcset string per image type, e.g.
+    {'image/avif': '/media/.../thumbnail_320.avif 320w, /media/.../thumbnail_640.avif 640w'},
+    ready for the srcset of a <source type="image/avif"> element.
+    """
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, value):
+        storage = Video._meta.get_field('thumbnail').storage
+        return {
+            mime_type: ', '.join(f'{storage.url(name)} {width}w' for width, name in variants)
+            for mime_type, variants in value.get('variants', {}).items()
+        }
 
 class VideoListSerializer(serializers.ModelSerializer):
     """
@@ -7,17 +28,126 @@ class VideoListSerializer(serializers.ModelSerializer):
     
     This serializer handles the conversion of Video model instances to JSON for API responses
     and the parsing of incoming JSON data for creating or updating Video instances. It includes
-    all fields from the Video model without any customization or additional validation.
+    all fields from the Video model plus the conversion state of its renditions, so clients
+    only request renditions that already exist.
     """
+    thumbnail_srcset = SrcsetField()
+    renditions = serializers.SerializerMethodField()
+    playable = serializers.SerializerMethodField()
+    ready = serializers.SerializerMethodField()
+
     class Meta:
         """
         Meta configuration for the VideoListSerializer.
         
         Specifies:
         - model: The model class to serialize (Video)
-        - fields: Which fields to include in the serialized output ('__all__' includes all model fields)
+        - exclude: Model fields left out of the serialized output, all others are included
           Including: id, title, description, file, thumbnail, genre, uploaded_at, updated_at
         """
         model = Video
-        fields = '__all__'  # Includes all fields from the Video model
- 
\ No newline at end of file
+        exclude = ('search_vector', 'source_sha256')  # Internal search index and deduplication key
+
+    def get_renditions(self, video):
+        """Status and progress of every rendition, keyed by rendition name."""
+        return {
+            job.rendition: {'status': job.status, 'progress': job.progress}
+            for job in video.transcode_jobs.all()
+        }
+
+    def get_playable(self, video):
+        """
+        Whether at least one rendition can be played, usually the quick preview.
+
+        Videos converted before conversions were tracked have no jobs and count as playable.
+        """
+        jobs = video.transcode_jobs.all()
+        return not jobs or any(job.status == TranscodeJob.Status.DONE for job in jobs)
+
+    def get_ready(self, video):
+        """
+        Whether every rendition has been converted.
+
+        Videos converted before conversions were tracked have no jobs and count as ready.
+        """
+        return all(job.status == TranscodeJob.Status.DONE for job in video.transcode_jobs.all())
+
+
+class VideoCatalogSerializer(VideoListSerializer):
+    """
+    Lightweight representation of a video for the catalog list.
+
+    By default only what a catalog tile needs is serialized, the full shape stays
+    with the detail view. Clients pick other fields with a comma separated
+    ?fields= query parameter, which also limits the columns loaded from the database.
+    """
+    default_fields = ('id', 'title', 'thumbnail', 'thumbnail_srcset', 'genre', 'uploaded_at', 'playable', 'ready')
+    conversion_fields = ('renditions', 'playable', 'ready')
+    fields_query_param = 'fields'
+
+    class Meta(VideoListSerializer.Meta):
+        pass
+
+    def __init__(self, *args, fields=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.field_names = fields or self.default_fields
+
+    def get_fields(self):
+        """Only the selected fields, in declaration order."""
+        return {name: field for name, field in super().get_fields().items() if name in self.field_names}
+
+    @classmethod
+    def requested_fields(cls, request):
+        """
+        Field names selected by the ?fields= query parameter, the default fields without one.
+
+        Raises a ValidationError for names the full video representation does not have.
+        """
+        value = request.query_params.get(cls.fields_query_param)
+        if not value:
+            return cls.default_fields
+
+        names = tuple(name.strip() for name in value.split(',') if name.strip())
+        available = [field.name for field in Video._meta.concrete_fields if field.name not in cls.Meta.exclude]
+        available += list(cls._declared_fields)
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise serializers.ValidationError({cls.fields_query_param: [f'Unknown field "{name}".' for name in unknown]})
+        return names
+
+    @classmethod
+    def select_columns(cls, queryset, field_names):
+        """
+        Limit a video queryset to the columns and relations the given fields need.
+
+        id and uploaded_at are always loaded, the pagination cursor is built from them.
+        """
+        columns = {field.name for field in Video._meta.concrete_fields} & set(field_names)
+        queryset = queryset.only('id', 'uploaded_at', *columns)
+        if set(field_names) & set(cls.conversion_fields):
+            jobs = TranscodeJob.objects.only('video_id', 'rendition', 'status', 'progress').order_by('pk')
+            queryset = queryset.prefetch_related(Prefetch('transcode_jobs', queryset=jobs))
+        return queryset
+
+
+class VideoUploadSerializer(serializers.ModelSerializer):
+    """
+    Serializer for resumable uploads.
+
+    Creating an upload takes the metadata of the future video, the name of the
+    source file and its size in bytes. The file itself is sent afterwards in chunks.
+    """
+    offset = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = VideoUpload
+        fields = ['id', 'filename', 'length', 'offset', 'title', 'description', 'genre', 'thumbnail', 'video', 'created_at']
+        read_only_fields = ['id', 'video', 'created_at']
+
+    def validate_length(self, length):
+        if length <= 0:
+            raise serializers.ValidationError('The upload must not be empty.')
+        if length > settings.VIDEO_UPLOAD_MAX_SIZE:
+            raise serializers.ValidationError(f'Uploads are limited to {settings.VIDEO_UPLOAD_MAX_SIZE} bytes.')
+        return length
+
@@ -1,7 +1,15 @@
 from django.urls import path
-from .views import VideoListView, VideoDetailView
+from .views import (
+    VideoListView, VideoGenreListView, VideoSearchView, VideoDetailView,
+    VideoUploadListView, VideoUploadView, VideoUploadFinishView,
+)
 
 urlpatterns = [
     path('video-page/', VideoListView.as_view(), name='video-list'),
+    path('video-page/genres/', VideoGenreListView.as_view(), name='video-genres'),
+    path('video-page/search/', VideoSearchView.as_view(), name='video-search'),
     path('video-page/<int:pk>/', VideoDetailView.as_view(), name='video-detail'),
+    path('uploads/', VideoUploadListView.as_view(), name='video-upload-list'),
+    path('uploads/<uuid:pk>/', VideoUploadView.as_view(), name='video-upload'),
+    path('uploads/<uuid:pk>/finish/', VideoUploadFinishView.as_view(), name='video-upload-finish'),
 ]
\ No newline at end of file
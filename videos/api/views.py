@@ -1,39 +1,261 @@
-from rest_framework import status
+from django.conf import settings
+from django.contrib.postgres.search import SearchQuery, SearchRank
+from rest_framework import serializers, status
+from rest_framework.authentication import SessionAuthentication, TokenAuthentication
+from rest_framework.permissions import IsAdminUser
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from django.conf import settings
-from django.core.cache.backends.base import DEFAULT_TIMEOUT
-from django.views.decorators.cache import cache_page
-from django.utils.decorators import method_decorator
+from django.db.models import F, FloatField, Max
+from django.db.models.functions import Cast
 from django.shortcuts import get_object_or_404
-from videos.models import Video
-from .serializers import VideoListSerializer
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+import django_rq
+from videos.models import Video, VideoUpload
+from videos.uploads import abort_upload, create_staging_file, finish_upload, write_chunk
+from videos.cache import cached_payload, catalog_cache_key, catalog_etag, catalog_last_modified
+from .serializers import VideoCatalogSerializer, VideoListSerializer, VideoUploadSerializer
+from .pagination import VideoCursorPagination, VideoSearchPagination
+from .catalog import VideoCatalogRows
+
+def video_list_etag(request):
+    """ETag of a video list page, changes whenever a video or its conversion changes."""
+    return catalog_etag('list', request.build_absolute_uri())
+
+def video_list_last_modified(request):
+    """Last-Modified of the video list, the newest updated_at of all videos or the last catalog change."""
+    updated_at = cached_payload(
+        catalog_cache_key('last_modified'),
+        lambda: Video.objects.aggregate(last_modified=Max('updated_at'))['last_modified'],
+    )
+    return catalog_last_modified(updated_at)
+
+def video_updated_at(pk):
+    """updated_at of a single video, None if it does not exist."""
+    return cached_payload(
+        catalog_cache_key('last_modified', pk),
+        lambda: Video.objects.filter(pk=pk).values_list('updated_at', flat=True).first(),
+    )
+
+def video_detail_last_modified(request, pk):
+    """Last-Modified of a single video, its updated_at or the last catalog change, None if it does not exist."""
+    updated_at = video_updated_at(pk)
+    return None if updated_at is None else catalog_last_modified(updated_at)
 
-CACHE_TTL = getattr(settings, 'CACHE_TTL', DEFAULT_TIMEOUT)
+def video_detail_etag(request, pk):
+    """ETag of a single video, changes whenever a video or its conversion changes."""
+    if video_updated_at(pk) is None:
+        return None
+    return catalog_etag('detail', pk)
 
 class VideoListView(APIView):
-    # @method_decorator(cache_page(CACHE_TTL))
+    @method_decorator(condition(etag_func=video_list_etag, last_modified_func=video_list_last_modified))
     def get(self, request):
         """
         Handle GET requests for the video list.
         
-        Retrieves all videos from the database, serializes them,
-        and returns them as a JSON response.
+        Returns one page of videos, newest first, in the lightweight catalog
+        representation as a JSON response with the link to the next page. Pages
+        are selected with the cursor and page_size query parameters, the fields
+        query parameter picks the serialized fields. Pages are served from the
+        catalog cache until a video changes.
+        Answers 304 Not Modified if the client already has the current page.
         """
-        videos = Video.objects.all()
-        serializer = VideoListSerializer(videos, many=True)
+        key = catalog_cache_key('list', request.build_absolute_uri())
+        return Response(cached_payload(key, lambda: self.build_page(request)))
 
-        return Response(serializer.data)
+    def build_page(self, request):
+        """
+        Retrieve one page of videos as values() rows with only the columns of the
+        requested fields and build its catalog representation without model instances.
+        """
+        catalog = VideoCatalogRows(VideoCatalogSerializer.requested_fields(request))
+        paginator = VideoCursorPagination()
+        rows = paginator.paginate_queryset(catalog.queryset(), request, view=self)
+
+        return paginator.get_paginated_response(catalog.represent(rows)).data
   
+def video_genres_etag(request):
+    """ETag of the genre grouped catalog, changes whenever a video or its conversion changes."""
+    return catalog_etag('genres', request.build_absolute_uri())
+
+class VideoGenreListView(APIView):
+    limit_query_param = 'limit'
+
+    @method_decorator(condition(etag_func=video_genres_etag, last_modified_func=video_list_last_modified))
+    def get(self, request):
+        """
+        Handle GET requests for the catalog grouped by genre.
+
+        Returns the newest videos of every genre, at most limit per genre, in the
+        lightweight catalog representation. The fields query parameter works like
+        on the video list. Served from the catalog cache until a video changes.
+        """
+        key = catalog_cache_key('genres', request.build_absolute_uri())
+        return Response(cached_payload(key, lambda: self.build_groups(request)))
+
+    def build_groups(self, request):
+        """
+        Retrieve the genre groups with a single windowed query over the genre index.
+        """
+        catalog = VideoCatalogRows(VideoCatalogSerializer.requested_fields(request))
+        return {'results': catalog.grouped_by_genre(self.get_limit(request))}
+
+    def get_limit(self, request):
+        """Videos per genre from the limit query parameter, capped at VIDEO_MAX_PAGE_SIZE."""
+        try:
+            limit = int(request.query_params[self.limit_query_param])
+        except (KeyError, ValueError):
+            return settings.VIDEO_GENRE_LIMIT
+        return min(max(limit, 1), settings.VIDEO_MAX_PAGE_SIZE)
+
+class VideoSearchView(APIView):
+    search_query_param = 'q'
+
+    def get(self, request):
+        """
+        Handle GET requests for the full-text search.
+
+        Searches titles, genres and descriptions for the q query parameter (web
+        search syntax: quoted phrases, OR and -excluded words) and returns the
+        matching videos, best match first, in the lightweight catalog
+        representation. Pages work like on the video list, the fields query
+        parameter picks the serialized fields.
+        """
+        text = request.query_params.get(self.search_query_param, '').strip()
+        if not text:
+            raise serializers.ValidationError({self.search_query_param: ['This query parameter is required.']})
+
+        query = SearchQuery(text, search_type='websearch', config=settings.VIDEO_SEARCH_CONFIG)
+        catalog = VideoCatalogRows(VideoCatalogSerializer.requested_fields(request))
+        # ts_rank() returns a real, as double precision it survives the round trip through the cursor exactly
+        rank = Cast(SearchRank(F('search_vector'), query), FloatField())
+        queryset = catalog.queryset().filter(search_vector=query).annotate(rank=rank)
+        paginator = VideoSearchPagination()
+        rows = paginator.paginate_queryset(queryset, request, view=self)
+
+        return paginator.get_paginated_response(catalog.represent(rows))
+
 class VideoDetailView(APIView):
+    @method_decorator(condition(etag_func=video_detail_etag, last_modified_func=video_detail_last_modified))
     def get(self, request, pk):
         """
         Handle GET requests for a specific video.
         
         Retrieves a single video by its primary key, serializes it,
         and returns it as a JSON response. Returns 404 if the video is not found.
+        The serialized video is served from the catalog cache until a video changes.
+        Answers 304 Not Modified if the client already has the current version.
         """
-        video = get_object_or_404(Video, pk=pk)
-        serializer = VideoListSerializer(video)
+        def build():
+            video = get_object_or_404(Video, pk=pk)
+            return VideoListSerializer(video).data
+
+        data = cached_payload(catalog_cache_key('detail', pk), build)
         
-        return Response(serializer.data, status=status.HTTP_200_OK)
\ No newline at end of file
+        return Response(data, status=status.HTTP_200_OK)
+
+
+class VideoUploadMixin:
+    """
+    Shared configuration of the resumable upload API.
+
+    Uploads are reserved for staff users, they authenticate with their token or
+    an admin session. Responses carry the tus style Upload-Offset and Upload-Length
+    headers, so clients can resume from the headers alone.
+    """
+    authentication_classes = [TokenAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(VideoUpload, pk=pk, created_by=request.user)
+
+    def upload_headers(self, upload):
+        return {'Upload-Offset': str(upload.offset), 'Upload-Length': str(upload.length), 'Cache-Control': 'no-store'}
+
+class VideoUploadListView(VideoUploadMixin, APIView):
+    def post(self, request):
+        """
+        Handle POST requests to start a resumable upload.
+
+        Validates the video metadata, filename and length, creates the upload
+        with an empty staging file of that length and returns it with its URL
+        in the Location header.
+        """
+        serializer = VideoUploadSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        upload = serializer.save(created_by=request.user)
+        create_staging_file(upload)
+
+        headers = self.upload_headers(upload)
+        headers['Location'] = request.build_absolute_uri(reverse('video-upload', kwargs={'pk': upload.pk}))
+        return Response(VideoUploadSerializer(upload).data, status=status.HTTP_201_CREATED, headers=headers)
+
+class VideoUploadView(VideoUploadMixin, APIView):
+    chunk_content_type = 'application/offset+octet-stream'
+
+    def get(self, request, pk):
+        """
+        Handle GET and HEAD requests for the state of an upload.
+
+        Upload-Offset tells how many bytes arrived without a gap, the received
+        ranges in the body show what is missing after parallel or broken transfers.
+        """
+        upload = self.get_upload(request, pk)
+        data = {**VideoUploadSerializer(upload).data, 'received': upload.received}
+        return Response(data, headers=self.upload_headers(upload))
+
+    def patch(self, request, pk):
+        """
+        Handle PATCH requests carrying one chunk of the file.
+
+        The body is the raw chunk (Content-Type application/offset+octet-stream),
+        the Upload-Offset header its position in the file. Chunks may arrive in any
+        order and in parallel, they are streamed straight into the staging file.
+        """
+        upload = self.get_upload(request, pk)
+        if request.content_type != self.chunk_content_type:
+            return Response(
+                {'detail': f'Chunks must be sent as {self.chunk_content_type}.'},
+                status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            )
+        try:
+            offset = int(request.headers['Upload-Offset'])
+            length = int(request.headers.get('Content-Length') or 0)
+        except (KeyError, ValueError):
+            raise serializers.ValidationError({'Upload-Offset': ['A numeric Upload-Offset header is required.']})
+        if offset < 0 or offset + length > upload.length:
+            raise serializers.ValidationError({'Upload-Offset': ['The chunk does not fit into the upload.']})
+
+        upload = write_chunk(upload, offset, request.stream, length) if length else upload
+        return Response(status=status.HTTP_204_NO_CONTENT, headers=self.upload_headers(upload))
+
+    def delete(self, request, pk):
+        """
+        Handle DELETE requests to abort an upload and remove what was received.
+        """
+        abort_upload(self.get_upload(request, pk))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class VideoUploadFinishView(VideoUploadMixin, APIView):
+    def post(self, request, pk):
+        """
+        Handle POST requests to finish a complete upload.
+
+        Queues the job that moves the file into MEDIA_ROOT/videos and creates the Video,
+        which queues its conversion. Returns 202 with the upload, its video is set once
+        the job is done. Returns 409 with the current offset while bytes are still missing.
+        """
+        upload = self.get_upload(request, pk)
+        if not upload.complete:
+            return Response(
+                {'detail': 'The upload is incomplete.', 'received': upload.received},
+                status=status.HTTP_409_CONFLICT,
+                headers=self.upload_headers(upload),
+            )
+
+        if not upload.video_id:
+            django_rq.get_queue('preview', autocommit=True).enqueue(finish_upload, upload.pk)
+        headers = {'Location': request.build_absolute_uri(reverse('video-upload', kwargs={'pk': upload.pk}))}
+        return Response(VideoUploadSerializer(upload).data, status=status.HTTP_202_ACCEPTED, headers=headers)
@@ -0,0 +1,88 @@
+import hashlib
+import time
+from datetime import datetime, timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from .storage import url_expiry
+
+CATALOG_VERSION_KEY = 'videos:catalog_version'
+CATALOG_CHANGED_KEY = 'videos:catalog_changed'
+
+def get_catalog_version():
+    """
+    Return the current version of the video catalog.
+
+    A missing version (first use or evicted by Redis) is initialised from the
+    clock, so it can never fall back to a version that already has entries.
+    """
+    version = cache.get(CATALOG_VERSION_KEY)
+    if version is None:
+        cache.add(CATALOG_VERSION_KEY, time.time_ns() // 1000, timeout=None)
+        version = cache.get(CATALOG_VERSION_KEY)
+    return version
+
+def bump_catalog_version():
+    """
+    Invalidate every cached catalog payload by moving to a new version.
+
+    Inside a transaction the version only moves once it is committed, so
+    no request can cache the uncommitted state under the new version.
+    """
+    transaction.on_commit(increment_catalog_version)
+
+def increment_catalog_version():
+    try:
+        cache.incr(CATALOG_VERSION_KEY)
+    except ValueError:
+        get_catalog_version()
+    cache.set(CATALOG_CHANGED_KEY, time.time(), timeout=None)
+
+def catalog_last_modified(*times):
+    """
+    Last-Modified of a catalog payload, the latest of the given datetimes and
+    the last change of the catalog.
+
+    Changes that leave updated_at alone, like deleted videos and conversions,
+    move the last change. A missing last change (evicted by Redis) counts as
+    now. With signed media URLs the start of the current URL window counts as
+    a change as well, so clients revalidate before their URLs expire.
+    """
+    cache.add(CATALOG_CHANGED_KEY, time.time(), timeout=None)
+    changes = [cache.get(CATALOG_CHANGED_KEY) or time.time()]
+    if settings.MEDIA_URL_TTL:
+        changes.append(url_expiry() - 2 * settings.MEDIA_URL_TTL)
+    changed_at = datetime.fromtimestamp(max(changes), tz=timezone.utc)
+    return max([changed_at, *(value for value in times if value is not None)])
+
+def catalog_cache_key(name, *parts):
+    """
+    Build a cache key for a catalog payload that is only valid for the current version.
+
+    With signed media URLs the key also changes with their expiry, so a cached
+    payload never hands out URLs that expire in less than MEDIA_URL_TTL.
+    """
+    expiry = [f'e{url_expiry()}'] if settings.MEDIA_URL_TTL else []
+    return ':'.join(['videos', name, f'v{get_catalog_version()}', *expiry, *map(str, parts)])
+
+def catalog_etag(name, *parts):
+    """
+    Return a strong ETag for a catalog payload.
+
+    It is derived from the versioned cache key, so it changes together with
+    the cached payload without the payload having to be serialized.
+    """
+    return hashlib.sha1(catalog_cache_key(name, *parts).encode()).hexdigest()
+
+def cached_payload(key, build):
+    """
+    Return the payload cached under key, building and caching it on a miss.
+
+    Entries are invalidated by bump_catalog_version(). The timeout only
+    removes entries of old versions that are no longer read.
+    """
+    payload = cache.get(key)
+    if payload is None:
+        payload = build()
+        cache.set(key, payload, settings.VIDEO_CACHE_TIMEOUT)
+    return payload
@@ -0,0 +1,223 @@
+import json
+import os
+import time
+from datetime import timedelta
+from functools import reduce
+from operator import or_
+import django_rq
+from rq import Retry
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Q
+from django.utils import timezone
+from .models import Video, VideoUpload
+from .storage import artifact_stem, delete_stale_workspaces, delete_tree, is_content_addressed, signature_scope, stored_files
+from .tasks import chunk_dir, hls_output_dir, previews_dir, rendition_path
+from .uploads import UPLOAD_DIR, abort_upload
+
+PENDING_CLEANUPS_KEY = 'videos:pending_cleanups'
+RUNNING_CLEANUPS_KEY = 'videos:running_cleanups'
+CLEANUP_LOCK_KEY = 'videos:cleanup'
+
+# Storage directories searched for orphaned files, staging files of resumable
+# uploads below UPLOAD_DIR are left to abort_upload
+SWEEP_DIRECTORIES = ('videos', 'thumbnails')
+SWEEP_TIMEOUT = 60 * 60
+
+def queue_file_cleanup(file, thumbnail):
+    """
+    Schedule the removal of the stored files of a deleted video.
+
+    The names are appended to a Redis list and a cleanup job is added to the
+    'default' queue. Whichever cleanup job runs first removes the files of
+    every pending video, the remaining jobs find the list empty.
+    """
+    payload = {'file': file, 'thumbnail': thumbnail}
+    django_rq.get_connection('default').rpush(PENDING_CLEANUPS_KEY, json.dumps(payload))
+    queue_cleanup()
+
+def queue_cleanup():
+    """Add a cleanup job to the 'default' queue, retried while the storage fails."""
+    queue = django_rq.get_queue('default')
+    queue.enqueue(delete_pending_files, retry=Retry(max=3, interval=settings.MEDIA_CLEANUP_RETRY_INTERVALS))
+
+def cleanup_timeout():
+    """Seconds a cleanup job may run before RQ kills it, see settings.RQ_QUEUES."""
+    return settings.RQ_QUEUES['default'].get('DEFAULT_TIMEOUT', 180)
+
+def take_pending_cleanups(redis, count):
+    """Move up to count pending cleanups from the front of the list to the running list."""
+    payloads = []
+    while len(payloads) < count:
+        payload = redis.lmove(PENDING_CLEANUPS_KEY, RUNNING_CLEANUPS_KEY, 'LEFT', 'RIGHT')
+        if payload is None:
+            break
+        payloads.append(payload)
+    return payloads
+
+def requeue_running_cleanups(redis, front=True):
+    """Put the cleanups of a failed, killed or crashed cleanup job back into the pending list."""
+    for _ in range(redis.llen(RUNNING_CLEANUPS_KEY)):
+        if front:
+            redis.lmove(RUNNING_CLEANUPS_KEY, PENDING_CLEANUPS_KEY, 'RIGHT', 'LEFT')
+        else:
+            redis.lmove(RUNNING_CLEANUPS_KEY, PENDING_CLEANUPS_KEY, 'LEFT', 'RIGHT')
+
+def shared_directories(sources):
+    """
+    Content addressed directories of the given sources that still hold the source of a video.
+
+    A re-upload of a deleted source that was stored before the cleanup ran
+    lands in the same directory under another name, like master_tB0Bzuw.mp4.
+    """
+    directories = {signature_scope(source) for source in sources if is_content_addressed(source)}
+    if not directories:
+        return set()
+    query = reduce(or_, (Q(file__startswith=f'{directory}/') for directory in directories))
+    return {signature_scope(name) for name in Video.objects.filter(query).values_list('file', flat=True)}
+
+def source_artifacts(source, shared=False):
+    """
+    Names and directories of a source and everything converted from it.
+
+    A content addressed source that no other video shares its directory
+    with takes the whole directory along, whatever renditions were
+    configured when it was converted. Otherwise only the files named after
+    the source go.
+    """
+    if is_content_addressed(source) and not shared:
+        return [], [signature_scope(source)]
+    suffixes = [*settings.VIDEO_PREVIEW_RENDITIONS, *settings.VIDEO_RENDITIONS]
+    names = [source, *(rendition_path(source, suffix) for suffix in suffixes)]
+    return names, [hls_output_dir(source), chunk_dir(source), previews_dir(source)]
+
+def delete_files(payloads):
+    """Delete the files of the deleted videos described by queued payloads."""
+    cleanups = [json.loads(payload) for payload in payloads]
+    sources = {cleanup['file'] for cleanup in cleanups if cleanup['file']}
+    thumbnails = {cleanup['thumbnail'] for cleanup in cleanups if cleanup['thumbnail']}
+    sources -= set(Video.objects.filter(file__in=sources).values_list('file', flat=True))
+    thumbnails -= set(Video.objects.filter(thumbnail__in=thumbnails).values_list('thumbnail', flat=True))
+
+    shared = shared_directories(sources)
+    names, directories = [*thumbnails], [previews_dir(thumbnail) for thumbnail in thumbnails]
+    for source in sources:
+        source_names, source_directories = source_artifacts(source, signature_scope(source) in shared)
+        names += source_names
+        directories += source_directories
+    for name in names:
+        default_storage.delete(name)
+    for directory in directories:
+        delete_tree(directory)
+
+def delete_pending_files():
+    """
+    Remove the files of all deleted videos.
+
+    Videos are moved from the pending list to a running list in batches of
+    settings.MEDIA_CLEANUP_BATCH_SIZE and only dropped once their files are
+    gone, so a job RQ kills loses nothing: the next cleanup puts them back. A
+    lock lets one cleanup run at a time. Sources and thumbnails that another
+    video still uses, like deduplicated uploads, are kept, which is checked
+    with one query per batch. When a batch fails, it is put back at the end
+    of the list, so it does not hold up the other videos, and the error is
+    re-raised. A job stops after half of the queue timeout and queues a
+    follow-up cleanup for the rest. Returns the number of videos cleaned up.
+    """
+    redis = django_rq.get_connection('default')
+    if not redis.set(CLEANUP_LOCK_KEY, 1, nx=True, ex=cleanup_timeout()):
+        return 0
+    cleaned = 0
+    try:
+        requeue_running_cleanups(redis)
+        deadline = time.monotonic() + cleanup_timeout() / 2
+        while time.monotonic() < deadline:
+            payloads = take_pending_cleanups(redis, settings.MEDIA_CLEANUP_BATCH_SIZE)
+            if not payloads:
+                break
+            try:
+                delete_files(payloads)
+            except Exception:
+                requeue_running_cleanups(redis, front=False)
+                raise
+            redis.delete(RUNNING_CLEANUPS_KEY)
+            cleaned += len(payloads)
+    finally:
+        redis.delete(CLEANUP_LOCK_KEY)
+    if redis.llen(PENDING_CLEANUPS_KEY):
+        queue_cleanup()
+    return cleaned
+
+def is_referenced(name, names, stems, directories):
+    """
+    Whether a stored file belongs to a referenced source or thumbnail.
+
+    Converted files are named after the artifact stem of their source
+    followed by an underscore, e.g. videos/a_mp4_480p.mp4 or
+    videos/a_mp4_hls/480p/segment_000.ts for videos/a.mp4.
+    """
+    if name in names or signature_scope(name) in directories:
+        return True
+    return any(name[:index] in stems for index, character in enumerate(name) if character == '_')
+
+def expire_uploads(cutoff):
+    """
+    Abort the uploads no chunk arrived for since cutoff and remove stray staging files.
+
+    Uploads are kept for settings.VIDEO_UPLOAD_MAX_AGE, so clients can resume
+    them or poll a finished upload for its video. Staging files without an
+    upload are left behind when an upload is deleted while a chunk is still
+    being written, they go once they are older than cutoff. Returns the number
+    of aborted uploads and removed staging files.
+    """
+    expired = 0
+    for upload in VideoUpload.objects.filter(updated_at__lt=timezone.now() - timedelta(seconds=settings.VIDEO_UPLOAD_MAX_AGE)):
+        abort_upload(upload)
+        expired += 1
+
+    directory = os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR)
+    if not os.path.isdir(directory):
+        return expired
+    uploads = {f'{pk}.part' for pk in VideoUpload.objects.values_list('pk', flat=True)}
+    for entry in os.scandir(directory):
+        if entry.name.endswith('.part') and entry.name not in uploads and entry.stat().st_mtime < cutoff.timestamp():
+            os.remove(entry.path)
+            expired += 1
+    return expired
+
+def sweep_orphan_files():
+    """
+    Delete stored files that no video or upload refers to anymore.
+
+    Catches files left behind by earlier versions, failed cleanups or
+    renditions that were removed from the settings. Files younger than
+    settings.MEDIA_SWEEP_MIN_AGE are kept, they may belong to an upload or a
+    conversion that is not committed yet. Abandoned uploads and the
+    workspaces of killed conversions are removed first. Returns the number of
+    deleted files, uploads and workspaces.
+    """
+    cutoff = timezone.now() - timedelta(seconds=settings.MEDIA_SWEEP_MIN_AGE)
+    deleted = expire_uploads(cutoff) + delete_stale_workspaces(cutoff.timestamp())
+
+    names = {
+        *Video.objects.values_list('file', flat=True),
+        *Video.objects.exclude(thumbnail='').values_list('thumbnail', flat=True),
+        *VideoUpload.objects.exclude(thumbnail='').values_list('thumbnail', flat=True),
+    }
+    stems = {artifact_stem(name) for name in names}
+    directories = {signature_scope(name) for name in names if is_content_addressed(name)}
+
+    for directory in SWEEP_DIRECTORIES:
+        for name in stored_files(directory):
+            if name.startswith(f'{UPLOAD_DIR}/') or is_referenced(name, names, stems, directories):
+                continue
+            if default_storage.get_modified_time(name) > cutoff:
+                continue
+            default_storage.delete(name)
+            deleted += 1
+    return deleted
+
+def queue_orphan_sweep():
+    """Cron job adding sweep_orphan_files to the 'default' queue, see settings.CRONJOBS."""
+    queue = django_rq.get_queue('default')
+    queue.enqueue(sweep_orphan_files, job_timeout=SWEEP_TIMEOUT)
@@ -0,0 +1,73 @@
+import time
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+from videos.api.catalog import VideoCatalogRows
+from videos.api.serializers import VideoCatalogSerializer
+from videos.models import Video, TranscodeJob
+
+class Rollback(Exception):
+    pass
+
+class Command(BaseCommand):
+    """
+    Measure how fast the catalog list is built for growing catalogs.
+
+    Compares VideoCatalogSerializer on model instances with the values() based
+    VideoCatalogRows used by VideoListView. The videos are inserted inside a
+    transaction that is rolled back afterwards, so the database is left unchanged.
+    """
+    help = 'Benchmark serialization of the video catalog with the serializer and the values() fast path.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+        parser.add_argument('--fields', default=','.join(VideoCatalogSerializer.default_fields))
+
+    def handle(self, *args, **options):
+        fields = tuple(options['fields'].split(','))
+        try:
+            with transaction.atomic():
+                for size in sorted(options['sizes']):
+                    self.fill_catalog(size)
+                    serializer, fast = self.measure_serializer(fields), self.measure_fast_path(fields)
+                    self.stdout.write(
+                        f'{size:>7,} videos: serializer {serializer * 1000:,.0f} ms, '
+                        f'values() {fast * 1000:,.0f} ms ({serializer / fast:.1f}x)'
+                    )
+                raise Rollback
+        except Rollback:
+            pass
+
+    def fill_catalog(self, size):
+        """Insert videos with a preview and a 720p job until the catalog has size videos."""
+        missing = size - Video.objects.count()
+        videos = Video.objects.bulk_create(
+            [
+                Video(title=f'Video {index}', description='Benchmark video ' * 20, genre='Benchmark',
+                      file=f'videos/benchmark_{index}.mp4', thumbnail=f'thumbnails/benchmark_{index}.jpg')
+                for index in range(missing)
+            ],
+            batch_size=5000,
+        )
+        TranscodeJob.objects.bulk_create(
+            [
+                TranscodeJob(video=video, rendition=rendition, status=status)
+                for video in videos
+                for rendition, status in (('preview', TranscodeJob.Status.DONE), ('720p', TranscodeJob.Status.QUEUED))
+            ],
+            batch_size=5000,
+        )
+
+    def measure_serializer(self, fields):
+        """Seconds to load and render the whole catalog with VideoCatalogSerializer."""
+        start = time.perf_counter()
+        videos = VideoCatalogSerializer.select_columns(Video.objects.all(), fields)
+        JSONRenderer().render(VideoCatalogSerializer(videos, many=True, fields=fields).data)
+        return time.perf_counter() - start
+
+    def measure_fast_path(self, fields):
+        """Seconds to load and render the whole catalog with VideoCatalogRows."""
+        start = time.perf_counter()
+        catalog = VideoCatalogRows(fields)
+        JSONRenderer().render(catalog.represent(list(catalog.queryset())))
+        return time.perf_counter() - start
@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 19:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0003_transcodejob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['-uploaded_at', '-id'], name='video_catalog_order_idx'),
+        ),
+    ]
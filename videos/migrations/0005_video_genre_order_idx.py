@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-18 19:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0004_video_catalog_order_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='video',
+            index=models.Index(fields=['genre', '-uploaded_at', '-id'], name='video_genre_order_idx'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2 on 2026-10-18 19:25
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.conf import settings
+from django.db import migrations
+
+
+def index_existing_videos(apps, schema_editor):
+    Video = apps.get_model('videos', 'Video')
+    SearchVector = django.contrib.postgres.search.SearchVector
+    config = settings.VIDEO_SEARCH_CONFIG
+    Video.objects.update(search_vector=(
+        SearchVector('title', weight='A', config=config)
+        + SearchVector('genre', weight='B', config=config)
+        + SearchVector('description', weight='C', config=config)
+    ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0005_video_genre_order_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='video',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='video_search_idx'),
+        ),
+        migrations.RunPython(index_existing_videos, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2 on 2026-10-18 19:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0007_videoupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='seek_previews',
+            field=models.FileField(blank=True, editable=False, upload_to='videos'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='thumbnail',
+            field=models.FileField(blank=True, upload_to='thumbnails'),
+        ),
+    ]
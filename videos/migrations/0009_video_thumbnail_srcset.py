@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 19:35
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0008_video_seek_previews'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='thumbnail_srcset',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 20:03
+
+import videos.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0011_video_source_sha256'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='video',
+            name='file',
+            field=models.FileField(max_length=255, upload_to=videos.models.source_upload_to),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='seek_previews',
+            field=models.FileField(blank=True, editable=False, max_length=255, upload_to='videos'),
+        ),
+        migrations.AlterField(
+            model_name='video',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to='thumbnails'),
+        ),
+        migrations.AlterField(
+            model_name='videoupload',
+            name='thumbnail',
+            field=models.FileField(blank=True, max_length=255, upload_to='thumbnails'),
+        ),
+    ]
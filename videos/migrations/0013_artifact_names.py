@@ -0,0 +1,90 @@
+import os
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import migrations
+from videos.storage import delete_tree, move_stored, move_tree
+
+
+def old_stem(name):
+    """Prefix of converted files before the extension was part of it, cut at the first dot."""
+    return name.split('.')[0]
+
+
+def artifact_stem(name):
+    """videos.storage.artifact_stem at the time of this migration."""
+    root, extension = os.path.splitext(name)
+    return f'{root}_{extension[1:]}' if extension else root
+
+
+def rename_artifacts(apps, schema_editor):
+    """
+    Move the renditions, HLS ladders and previews of existing videos to the
+    names that keep the extension of their source or thumbnail.
+
+    Files that shared a name before, like the previews of poster.jpg and
+    poster.png, stay with the first video, the thumbnail variants of the
+    other one are dropped and converted again when the thumbnail is saved.
+    """
+    Video = apps.get_model('videos', 'Video')
+    renditions = [*settings.VIDEO_PREVIEW_RENDITIONS, *settings.VIDEO_RENDITIONS]
+    claimed = set()
+    moves = []
+
+    def renamed(name):
+        for old, new in moves:
+            if name.startswith(old):
+                return new + name[len(old):]
+        return name
+
+    for source in dict.fromkeys(Video.objects.order_by('pk').values_list('file', flat=True)):
+        old, new = old_stem(source), artifact_stem(source)
+        if old in claimed:
+            continue
+        claimed.add(old)
+        for rendition in renditions:
+            if default_storage.exists(f'{old}_{rendition}.mp4'):
+                move_stored(f'{old}_{rendition}.mp4', f'{new}_{rendition}.mp4')
+        for kind in ('hls', 'previews'):
+            move_tree(f'{old}_{kind}', f'{new}_{kind}')
+            moves.append((f'{old}_{kind}/', f'{new}_{kind}/'))
+        delete_tree(f'{old}_chunks')
+
+    thumbnails = {}
+    for video in Video.objects.order_by('pk'):
+        thumbnail = renamed(video.thumbnail.name)
+        srcset = video.thumbnail_srcset
+        variants = {
+            mime_type: [[width, renamed(name)] for width, name in names]
+            for mime_type, names in srcset.get('variants', {}).items()
+        }
+        if srcset and thumbnail and renamed(srcset.get('source', '')) == thumbnail:
+            old, new = old_stem(thumbnail), artifact_stem(thumbnail)
+            if thumbnail not in thumbnails and old not in claimed:
+                claimed.add(old)
+                move_tree(f'{old}_previews', f'{new}_previews')
+                thumbnails[thumbnail] = (f'{old}_previews/', f'{new}_previews/')
+            if thumbnail in thumbnails:
+                old, new = thumbnails[thumbnail]
+                variants = {
+                    mime_type: [[width, new + name[len(old):] if name.startswith(old) else name] for width, name in names]
+                    for mime_type, names in variants.items()
+                }
+                srcset = {'source': thumbnail, 'variants': variants}
+            else:
+                srcset = {}
+        else:
+            srcset = {}
+        Video.objects.filter(pk=video.pk).update(
+            thumbnail=thumbnail, seek_previews=renamed(video.seek_previews.name), thumbnail_srcset=srcset,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0012_video_content_addressed_file'),
+    ]
+
+    operations = [
+        migrations.RunPython(rename_artifacts, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2 on 2026-10-18 21:01
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0013_artifact_names'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='video',
+            name='pix_fmt',
+            field=models.CharField(blank=True, editable=False, max_length=50),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2 on 2026-10-18 21:03
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('videos', '0014_video_pix_fmt'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='videoupload',
+            name='video',
+            field=models.OneToOneField(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='videos.video'),
+        ),
+    ]
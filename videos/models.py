@@ -1,15 +1,135 @@
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
 from django.db import models
+from .storage import content_addressed_name
+import os
+import uuid
 
 # Create your models here.
 
+def source_upload_to(video, filename):
+  """Store sources under their SHA-256, set by the deduplicate_source signal before the file is saved."""
+  if not video.source_sha256:
+    return os.path.join('videos', filename)
+  return content_addressed_name(video.source_sha256, filename)
+
 class Video(models.Model):
   uploaded_at = models.DateTimeField(auto_now_add=True)
   updated_at = models.DateTimeField(auto_now=True)
   title = models.CharField(max_length=150)
   description = models.TextField(max_length=1000, blank=True)
-  file = models.FileField(upload_to='videos')
-  thumbnail = models.FileField(upload_to='thumbnails')
+  file = models.FileField(upload_to=source_upload_to, max_length=255)
+  source_sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+  thumbnail = models.FileField(upload_to='thumbnails', blank=True, max_length=255)
+  thumbnail_srcset = models.JSONField(default=dict, blank=True, editable=False)
   genre = models.CharField(max_length=150, blank=True)
+  seek_previews = models.FileField(upload_to='videos', blank=True, editable=False, max_length=255)
+  duration = models.FloatField(null=True, blank=True, editable=False)
+  width = models.PositiveIntegerField(null=True, blank=True, editable=False)
+  height = models.PositiveIntegerField(null=True, blank=True, editable=False)
+  bitrate = models.PositiveIntegerField(null=True, blank=True, editable=False)
+  video_codec = models.CharField(max_length=50, blank=True, editable=False)
+  audio_codec = models.CharField(max_length=50, blank=True, editable=False)
+  pix_fmt = models.CharField(max_length=50, blank=True, editable=False)
+  keyframe_interval = models.FloatField(null=True, blank=True, editable=False)
+  search_vector = SearchVectorField(null=True, editable=False)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['-uploaded_at', '-id'], name='video_catalog_order_idx'),
+      models.Index(fields=['genre', '-uploaded_at', '-id'], name='video_genre_order_idx'),
+      GinIndex(fields=['search_vector'], name='video_search_idx'),
+    ]
 
   def __str__(self):
-    return self.title
\ No newline at end of file
+    return self.title
+
+  @staticmethod
+  def search_document():
+    """Weighted search document of a video, title matches rank above genre and description matches"""
+    config = settings.VIDEO_SEARCH_CONFIG
+    return (
+      SearchVector('title', weight='A', config=config)
+      + SearchVector('genre', weight='B', config=config)
+      + SearchVector('description', weight='C', config=config)
+    )
+
+class TranscodeJob(models.Model):
+  """
+  Conversion state of a single rendition of a video.
+
+  One row is created per video and rendition when the upload is queued for
+  conversion. The RQ tasks move it through the status values, store the
+  ffmpeg progress and record which worker ran it and how long it took.
+  """
+  class Status(models.TextChoices):
+    QUEUED = 'queued', 'Queued'
+    RUNNING = 'running', 'Running'
+    FAILED = 'failed', 'Failed'
+    DONE = 'done', 'Done'
+
+  video = models.ForeignKey(Video, on_delete=models.CASCADE, related_name='transcode_jobs')
+  rendition = models.CharField(max_length=50)
+  status = models.CharField(max_length=10, choices=Status.choices, default=Status.QUEUED)
+  progress = models.PositiveSmallIntegerField(default=0)
+  chunks_total = models.PositiveIntegerField(default=0)
+  chunks_done = models.PositiveIntegerField(default=0)
+  worker = models.CharField(max_length=255, blank=True)
+  error = models.TextField(blank=True)
+  queued_at = models.DateTimeField(auto_now_add=True)
+  started_at = models.DateTimeField(null=True, blank=True)
+  finished_at = models.DateTimeField(null=True, blank=True)
+
+  class Meta:
+    constraints = [
+      models.UniqueConstraint(fields=['video', 'rendition'], name='unique_video_rendition'),
+    ]
+
+  def __str__(self):
+    return f'{self.video} {self.rendition} ({self.status})'
+
+  @property
+  def duration(self):
+    """Wall time of the conversion, None until it has started and finished"""
+    if self.started_at and self.finished_at:
+      return self.finished_at - self.started_at
+    return None
+
+class VideoUpload(models.Model):
+  """
+  A resumable upload of a source video.
+
+  The file is written chunk by chunk to a staging file below MEDIA_ROOT/videos.
+  received holds the merged [start, end) byte ranges that have arrived, so chunks
+  can be sent in parallel and a broken upload resumes with the missing ranges.
+  When every byte is there the upload is finished into a Video in the background,
+  video is set once that is done.
+  """
+  id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+  created_by = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='video_uploads')
+  filename = models.CharField(max_length=255)
+  length = models.BigIntegerField()
+  received = models.JSONField(default=list)
+  title = models.CharField(max_length=150)
+  description = models.TextField(max_length=1000, blank=True)
+  genre = models.CharField(max_length=150, blank=True)
+  thumbnail = models.FileField(upload_to='thumbnails', blank=True, max_length=255)
+  video = models.OneToOneField(Video, null=True, blank=True, editable=False, on_delete=models.SET_NULL, related_name='+')
+  created_at = models.DateTimeField(auto_now_add=True)
+  updated_at = models.DateTimeField(auto_now=True)
+
+  def __str__(self):
+    return f'{self.filename} ({self.offset}/{self.length} bytes)'
+
+  @property
+  def offset(self):
+    """Number of bytes received without a gap from the start of the file"""
+    if self.received and self.received[0][0] == 0:
+      return self.received[0][1]
+    return 0
+
+  @property
+  def complete(self):
+    return self.offset == self.length
+
@@ -0,0 +1,97 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_PROFILE = {
+  'codec': 'libx264',
+  'preset': 'medium',
+  'crf': 23,
+  'bitrate': None,
+  'maxrate': None,
+  'bufsize': None,
+  'keyframe_interval': 2,
+  'pix_fmt': 'yuv420p',
+  'audio_codec': 'aac',
+  'audio_bitrate': '128k',
+  'extra_args': [],
+}
+
+# Constant quality option of encoders that do not understand -crf
+QUALITY_OPTIONS = {
+  'h264_nvenc': '-cq',
+  'hevc_nvenc': '-cq',
+  'h264_qsv': '-global_quality',
+  'hevc_qsv': '-global_quality',
+  'h264_vaapi': '-qp',
+  'hevc_vaapi': '-qp',
+}
+
+# Codec written by encoders whose name does not start with it, as reported by ffprobe
+ENCODER_CODECS = {
+  'libx264': 'h264',
+  'libx265': 'hevc',
+  'libvpx': 'vp8',
+  'libvpx-vp9': 'vp9',
+  'libaom-av1': 'av1',
+  'libsvtav1': 'av1',
+  'libopus': 'opus',
+  'libmp3lame': 'mp3',
+}
+
+def get_profile(name):
+  """
+  Return the encoder profile registered under name in settings.VIDEO_ENCODER_PROFILES.
+
+  Missing keys are filled in from DEFAULT_PROFILE.
+  """
+  profiles = getattr(settings, 'VIDEO_ENCODER_PROFILES', {})
+  if name not in profiles:
+    raise ImproperlyConfigured(f'Unknown video encoder profile "{name}".')
+  return {**DEFAULT_PROFILE, **profiles[name]}
+
+def rendition_profile(options):
+  """Return the encoder profile selected by a rendition, 'default' if it names none"""
+  return get_profile(options.get('profile', 'default'))
+
+def video_args(profile, stream=':v', keyframe_interval=None):
+  """
+  Build the ffmpeg video encoder options of a profile.
+
+  stream is the stream specifier the options apply to, ':v:1' selects the
+  second video stream of a muxer with several variants. keyframe_interval
+  (seconds) overrides the profile, e.g. to align keyframes with HLS segments.
+  """
+  codec = profile['codec']
+  args = [f'-c{stream}', codec]
+  if profile['preset']:
+    args += [f'-preset{stream}', profile['preset']]
+  if profile['crf'] is not None:
+    args += [f'{QUALITY_OPTIONS.get(codec, "-crf")}{stream}', str(profile['crf'])]
+  if profile['bitrate']:
+    args += [f'-b{stream}', profile['bitrate']]
+  if profile['maxrate']:
+    args += [f'-maxrate{stream}', profile['maxrate'], f'-bufsize{stream}', profile['bufsize'] or profile['maxrate']]
+  interval = keyframe_interval or profile['keyframe_interval']
+  if interval:
+    args += [f'-force_key_frames{stream}', f'expr:gte(t,n_forced*{interval})']
+  if profile['pix_fmt']:
+    args += [f'-pix_fmt{stream}', profile['pix_fmt']]
+  return args + list(profile['extra_args'])
+
+def audio_args(profile, stream=':a'):
+  """Build the ffmpeg audio encoder options of a profile"""
+  args = [f'-c{stream}', profile['audio_codec']]
+  if profile['audio_bitrate']:
+    args += [f'-b{stream}', profile['audio_bitrate']]
+  return args
+
+def parse_bitrate(value):
+  """Return an ffmpeg bitrate like '1500k' or '5M' in bits per second, None for None"""
+  if value is None:
+    return None
+  value = str(value)
+  factor = {'k': 1000, 'm': 1000 ** 2, 'g': 1000 ** 3}.get(value[-1:].lower())
+  return int(float(value[:-1]) * factor) if factor else int(value)
+
+def encoder_codec(encoder):
+  """Return the codec name ffprobe reports for streams written by an ffmpeg encoder, e.g. h264 for h264_nvenc"""
+  return ENCODER_CODECS.get(encoder, encoder.split('_')[0])
@@ -1,40 +1,156 @@
-from .models import Video
+from .models import Video, TranscodeJob
 from django.dispatch import receiver
-from django.db.models.signals import post_delete, post_save
-from .tasks import convert_video, convert_video_hls
-import os
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.conf import settings
+from django.db import transaction
+from .cache import bump_catalog_version
+from .cleanup import queue_file_cleanup
+from .tasks import convert_thumbnail, schedule_conversion, HLS_RENDITION
+from .uploads import file_sha256
 import django_rq
 
+# Fields a deduplicated video takes over from the first video with its source
+SHARED_FIELDS = [
+    'seek_previews', 'duration', 'width', 'height', 'bitrate', 'video_codec', 'audio_codec', 'pix_fmt',
+    'keyframe_interval',
+]
+
+
+
+@receiver(pre_save, sender=Video)
+def deduplicate_source(instance, **kwargs):
+    """
+    Stores the SHA-256 of the source of a new video, which also names the
+    content addressed directory a new file is saved to. If the same source was
+    uploaded before, the video uses the stored file of the first upload instead,
+    the new copy is never written (admin) or removed again (resumable upload).
+    """
+    if not instance._state.adding or not instance.file:
+        return
+    if not instance.source_sha256:
+        if instance.file._committed:
+            if not instance.file.storage.exists(instance.file.name):
+                return
+            with instance.file.open('rb'):
+                instance.source_sha256 = file_sha256(instance.file)
+        else:
+            instance.source_sha256 = file_sha256(instance.file)
+
+    original = Video.objects.filter(source_sha256=instance.source_sha256).order_by('pk').first()
+    if original is None or original.file.name == instance.file.name:
+        return
+    if instance.file._committed:
+        instance.file.delete(save=False)
+    instance.file = original.file.name
+
 
 
 @receiver(post_save, sender=Video)
 def video_post_save(instance, created, **kwargs):
     """
     Signal handler that triggers video conversion when a new Video instance is created.
-    Adds conversion tasks to the Redis Queue to process asynchronously.
+    Creates a queued TranscodeJob per rendition and adds the conversion tasks
+    to the Redis Queue to process asynchronously.
+
+    Conversion runs in two phases: a quick low resolution preview on the
+    high priority 'preview' queue makes the video playable within minutes,
+    the full quality ladder follows on the bulk 'transcode' queue. Both are
+    queued by schedule_conversion, which sizes their timeouts to the duration
+    of the source. An uploaded thumbnail is converted on the 'thumbnails' queue.
+    The jobs are only queued once the video is committed, a worker picking
+    them up earlier would find neither the video nor its TranscodeJob rows.
+
+    A duplicate of an earlier upload is not converted again, it shares the
+    renditions and previews of the first video with that source, unless
+    their conversion failed.
+    """
+    if created and share_conversion(instance):
+        if instance.thumbnail:
+            queue_thumbnail_conversion(instance)
+    elif created:
+        renditions = [*settings.VIDEO_PREVIEW_RENDITIONS, *settings.VIDEO_RENDITIONS, HLS_RENDITION]
+        TranscodeJob.objects.bulk_create(
+            [TranscodeJob(video=instance, rendition=rendition) for rendition in renditions]
+        )
+        source, video_id = instance.file.name, instance.pk
+        transaction.on_commit(lambda: django_rq.get_queue('preview', autocommit=True).enqueue(
+            schedule_conversion, source, video_id=video_id,
+        ))
+        if instance.thumbnail:
+            queue_thumbnail_conversion(instance)
+
+
+
+def share_conversion(video):
+    """
+    Copies the conversion state of the first video with the same source file
+    to a new video: its TranscodeJob rows, probed metadata and seek previews,
+    and its thumbnail if the new video has none. Returns False if the source
+    is not shared or a conversion of the first video failed, the new video is
+    then converted again. The conversion tasks keep the rows of all videos
+    sharing a source up to date, see videos.tasks.source_videos, so a retry
+    also repairs the rows of the earlier videos.
+    """
+    original = Video.objects.filter(file=video.file.name).exclude(pk=video.pk).order_by('pk').first()
+    if original is None or original.transcode_jobs.filter(status=TranscodeJob.Status.FAILED).exists():
+        return False
+    TranscodeJob.objects.bulk_create([
+        TranscodeJob(
+            video=video, rendition=job.rendition, status=job.status, progress=job.progress,
+            chunks_total=job.chunks_total, chunks_done=job.chunks_done, worker=job.worker,
+            error=job.error, started_at=job.started_at, finished_at=job.finished_at,
+        )
+        for job in original.transcode_jobs.all()
+    ])
+    fields = {name: getattr(original, name) for name in SHARED_FIELDS}
+    if not video.thumbnail:
+        fields.update(thumbnail=original.thumbnail.name, thumbnail_srcset=original.thumbnail_srcset)
+    Video.objects.filter(pk=video.pk).update(**fields)
+    return True
+
+
+
+def queue_thumbnail_conversion(video):
+    """
+    Queues the conversion of the thumbnail of a video to its responsive
+    variants on the 'thumbnails' queue once the transaction is committed,
+    so the worker reads the new thumbnail.
     """
-    if created:
-        queue = django_rq.get_queue('default', autocommit=True)
-        queue.enqueue(convert_video, instance.file.path, 'hd480', '480p')
-        queue.enqueue(convert_video, instance.file.path, 'hd720', '720p')
+    video_id = video.pk
+    transaction.on_commit(lambda: django_rq.get_queue('thumbnails', autocommit=True).enqueue(
+        convert_thumbnail, video_id=video_id,
+    ))
 
 
 
 @receiver(post_delete, sender=Video)
-def auto_delete_file_on_delete(sender, instance, **kwargs):
-    """
-    Deletes file from filesystem
-    when corresponding `MediaFile` object is deleted.
-    """
-    if instance.file:
-        if os.path.isfile(instance.file.path):
-            os.remove(instance.file.path)
-
-    base, ext = os.path.splitext(instance.file.path)
-    converted_files = [base + '_480p.mp4', base + '_720p.mp4']
-    for file_path in converted_files:
-        if os.path.isfile(file_path):
-            os.remove(file_path)
-  
-    if instance.thumbnail:
-        instance.thumbnail.delete(save=False)
\ No newline at end of file
+def queue_file_cleanup_on_delete(instance, **kwargs):
+    """
+    Queues the removal of the files of a deleted video once the deletion is
+    committed: its source, renditions, HLS segments, previews and thumbnail.
+    Deleting many videos at once never waits for the storage, and a rolled
+    back deletion keeps its files. See videos.cleanup.delete_pending_files.
+    """
+    file, thumbnail = instance.file.name, instance.thumbnail.name
+    transaction.on_commit(lambda: queue_file_cleanup(file, thumbnail))
+
+
+
+@receiver(post_save, sender=Video)
+def update_search_vector(instance, **kwargs):
+    """
+    Stores the search document of a video after it was saved,
+    so the search index always matches its title, genre and description.
+    """
+    Video.objects.filter(pk=instance.pk).update(search_vector=Video.search_document())
+
+
+
+@receiver(post_save, sender=Video)
+@receiver(post_delete, sender=Video)
+def invalidate_catalog_cache(**kwargs):
+    """
+    Invalidates the cached video list and detail payloads
+    whenever a video is created, changed or deleted.
+    """
+    bump_catalog_version()
@@ -0,0 +1,298 @@
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import time
+from contextlib import contextmanager
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.utils.crypto import constant_time_compare, salted_hmac
+
+COPY_BUFFER_SIZE = 1024 * 1024
+
+# Directory of a source stored under its SHA-256 together with everything converted from it
+CONTENT_ADDRESSED_PATTERN = re.compile(r'^videos/[0-9a-f]{2}/[0-9a-f]{64}(?=/)')
+
+SIGNED_URL_PREFIX = 's'
+
+# Directory below a local storage that conversions write their outputs to, see Workspace
+WORKSPACE_DIR = 'workspaces'
+WORKSPACE_PREFIX = 'videoflix-'
+
+def content_addressed_name(sha256, filename):
+    """
+    Storage name of a source with the given SHA-256.
+
+    Renditions, HLS segments and previews are written next to the source, so
+    every file below videos/<first two digits>/<sha256>/ is derived from the
+    same bytes and its content never changes.
+    """
+    return f'videos/{sha256[:2]}/{sha256}/{filename}'
+
+def is_content_addressed(name):
+    return CONTENT_ADDRESSED_PATTERN.match(posixpath.normpath(name)) is not None
+
+def artifact_stem(name):
+    """
+    Prefix of the files converted from a stored file or path.
+
+    The extension is kept behind an underscore, videos/a.mp4 gives videos/a_mp4,
+    so a.mp4, a.v2.mp4 and a.mov never share their renditions or previews.
+    """
+    root, extension = os.path.splitext(name)
+    return f'{root}_{extension[1:]}' if extension else root
+
+def signature_scope(name):
+    """
+    What a media URL signature grants access to.
+
+    For content addressed files it is their whole directory, so players can
+    derive the URLs of renditions, HLS segments and seek preview sprites from
+    the signed source URL. Other files, like videos uploaded before the content
+    addressed layout and thumbnails, are signed with their artifact stem, which
+    covers the files converted from them in the same way.
+    """
+    name = posixpath.normpath(name)
+    match = CONTENT_ADDRESSED_PATTERN.match(name)
+    return match.group(0) if match else artifact_stem(name)
+
+def signature_scopes(name):
+    """
+    Scopes whose signature grants access to name.
+
+    Besides its own scope, a file outside a content addressed directory may
+    be converted from another one, videos/a_mp4_hls/480p/index.m3u8 from
+    videos/a.mp4, so every prefix of its name up to an underscore is tried.
+    """
+    name = posixpath.normpath(name)
+    if is_content_addressed(name):
+        return [signature_scope(name)]
+    return [signature_scope(name), *(name[:index] for index, character in enumerate(name) if character == '_')]
+
+def url_expiry(now=None):
+    """
+    Expiry timestamp of media URLs signed now.
+
+    It is rounded up to whole MEDIA_URL_TTL windows, so all URLs signed within
+    a window are identical and stay valid for MEDIA_URL_TTL to twice as long.
+    """
+    ttl = settings.MEDIA_URL_TTL
+    return (int(now or time.time()) // ttl + 2) * ttl
+
+def scope_signature(scope, expires):
+    """HMAC of a signature scope and the expiry, keyed with SECRET_KEY."""
+    return salted_hmac('videos.media_url', f'{scope}:{expires}', algorithm='sha256').hexdigest()[:32]
+
+def media_signature(name, expires):
+    """Signature of a media URL for name, it covers the signature scope of name."""
+    return scope_signature(signature_scope(name), expires)
+
+def signed_name(name, expires):
+    """Path of a media URL below MEDIA_URL carrying the expiry and signature of name."""
+    return f'{SIGNED_URL_PREFIX}/{expires}/{media_signature(name, expires)}/{name}'
+
+def valid_signature(name, expires, signature):
+    """Whether a media URL for name is signed and has not expired."""
+    if expires is None or signature is None or expires < time.time():
+        return False
+    return any(constant_time_compare(signature, scope_signature(scope, expires)) for scope in signature_scopes(name))
+
+class SignedFileSystemStorage(FileSystemStorage):
+    """
+    FileSystemStorage handing out signed, expiring URLs.
+
+    The signature is part of the path, so relative URLs in HLS playlists and
+    seek preview indexes inherit it. URLs are unsigned if MEDIA_URL_TTL is 0.
+    """
+    def url(self, name):
+        if not settings.MEDIA_URL_TTL or name is None:
+            return super().url(name)
+        return super().url(signed_name(name, url_expiry()))
+
+def local_path(name):
+    """Path of a stored file on the local file system, None for storages without one like object stores."""
+    try:
+        return default_storage.path(name)
+    except NotImplementedError:
+        return None
+
+def is_local():
+    """Whether media files are stored on the local file system."""
+    return local_path('') is not None
+
+@contextmanager
+def readable(name):
+    """
+    Yield a path or URL that ffmpeg can read a stored file from.
+
+    Local files are read in place. Object stores are streamed from their
+    (pre-signed) HTTP URL, so ffmpeg only fetches the byte ranges it needs.
+    Files of other storages are copied to a temporary file first.
+    """
+    path = local_path(name)
+    url = default_storage.url(name) if path is None else ''
+    if path is not None or url.startswith(('http://', 'https://')):
+        yield path or url
+        return
+    with tempfile.NamedTemporaryFile(suffix=os.path.splitext(name)[1]) as copy:
+        with default_storage.open(name, 'rb') as file:
+            shutil.copyfileobj(file, copy, COPY_BUFFER_SIZE)
+        copy.flush()
+        yield copy.name
+
+def store_file(path, name):
+    """
+    Store a local file under name, replacing a stored file of that name.
+
+    On a local storage the file is moved without copying it, otherwise it is
+    uploaded and removed.
+    """
+    target = local_path(name)
+    if target is not None:
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        return
+    default_storage.delete(name)
+    with open(path, 'rb') as file:
+        default_storage.save(name, File(file, name=name))
+    os.remove(path)
+
+def delete_tree(prefix):
+    """Delete a directory of stored files with everything below it."""
+    path = local_path(prefix)
+    if path is not None:
+        shutil.rmtree(path, ignore_errors=True)
+        return
+    try:
+        directories, files = default_storage.listdir(prefix)
+    except FileNotFoundError:
+        return
+    for file_name in files:
+        default_storage.delete(f'{prefix}/{file_name}')
+    for directory in directories:
+        delete_tree(f'{prefix}/{directory}')
+
+def move_stored(name, new_name):
+    """Move a stored file to another name, on a local storage it is renamed in place."""
+    path = local_path(name)
+    if path is not None:
+        target = local_path(new_name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        os.replace(path, target)
+        return
+    default_storage.delete(new_name)
+    with default_storage.open(name, 'rb') as file:
+        default_storage.save(new_name, File(file, name=new_name))
+    default_storage.delete(name)
+
+def move_tree(prefix, new_prefix):
+    """Move a directory of stored files with everything below it to another name."""
+    for name in list(stored_files(prefix)):
+        move_stored(name, new_prefix + name[len(prefix):])
+    delete_tree(prefix)
+
+def stored_files(prefix):
+    """Yield the names of all stored files below a directory."""
+    path = local_path(prefix)
+    if path is not None:
+        for root, directories, files in os.walk(path):
+            directory = os.path.relpath(root, local_path('')).replace(os.sep, '/')
+            for file_name in files:
+                yield f'{directory}/{file_name}'
+        return
+    try:
+        directories, files = default_storage.listdir(prefix)
+    except FileNotFoundError:
+        return
+    for file_name in files:
+        yield f'{prefix}/{file_name}'
+    for directory in directories:
+        yield from stored_files(f'{prefix}/{directory}')
+
+class Workspace:
+    """
+    Temporary local directory that conversion outputs are written to under their storage names.
+
+    Nothing appears under a storage name before publish(), so a file ffmpeg is
+    still writing is never served, let alone cached as immutable. On a local
+    storage the workspace lies in WORKSPACE_DIR next to the stored files and
+    publish() renames every output into place atomically. For other storages
+    it is a system temporary directory and the outputs are uploaded.
+    """
+    def __init__(self):
+        root = local_path(WORKSPACE_DIR)
+        if root is not None:
+            os.makedirs(root, exist_ok=True)
+        self.location = tempfile.mkdtemp(prefix=WORKSPACE_PREFIX, dir=root)
+
+    def path(self, name):
+        """Local path of the output stored as name, its directory is created."""
+        path = os.path.join(self.location, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        return path
+
+    def directory(self, name):
+        """Local path of the output directory stored as name, it is created."""
+        path = os.path.join(self.location, name)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def publish(self):
+        """Store every file written to the workspace under its name."""
+        for root, directories, files in os.walk(self.location):
+            for file_name in files:
+                path = os.path.join(root, file_name)
+                store_file(path, os.path.relpath(path, self.location).replace(os.sep, '/'))
+
+    def close(self):
+        shutil.rmtree(self.location, ignore_errors=True)
+
+def last_modified(path):
+    """Newest modification time of a directory and everything below it."""
+    newest = os.path.getmtime(path)
+    for root, directories, files in os.walk(path):
+        for name in [*directories, *files]:
+            try:
+                newest = max(newest, os.path.getmtime(os.path.join(root, name)))
+            except FileNotFoundError:
+                pass
+    return newest
+
+def delete_stale_workspaces(cutoff):
+    """
+    Remove the workspaces nothing was written to since cutoff, a timestamp.
+
+    Workspaces of workers that were killed, e.g. when RQ stops a job at its
+    timeout or the kernel runs out of memory, are never closed. A running
+    conversion keeps writing to its workspace. Other storages put workspaces
+    into the system temporary directory, only those of this machine are found.
+    Returns the number of removed workspaces.
+    """
+    root = local_path(WORKSPACE_DIR) or tempfile.gettempdir()
+    if not os.path.isdir(root):
+        return 0
+    deleted = 0
+    for entry in os.scandir(root):
+        if not entry.name.startswith(WORKSPACE_PREFIX) or not entry.is_dir(follow_symlinks=False):
+            continue
+        if last_modified(entry.path) < cutoff:
+            shutil.rmtree(entry.path, ignore_errors=True)
+            deleted += 1
+    return deleted
+
+@contextmanager
+def workspace():
+    """
+    Yield a Workspace for the outputs of a conversion.
+
+    The outputs are published when the block exits without an error, a
+    temporary workspace is removed in any case.
+    """
+    work = Workspace()
+    try:
+        yield work
+        work.publish()
+    finally:
+        work.close()
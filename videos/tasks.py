@@ -1,9 +1,631 @@
 import subprocess
+import json
+import math
 import os
+import glob
+import tempfile
+from contextlib import ExitStack, contextmanager
+import django_rq
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from rq import get_current_job
+from .models import TranscodeJob, Video
+from .cache import bump_catalog_version
+from .profiles import audio_args, encoder_codec, parse_bitrate, rendition_profile, video_args
+from .storage import artifact_stem, delete_tree, readable, workspace
 
-def convert_video(source, resolution, suffix):
-  """Convert video to a specific resolution"""
-  split_target = source.split('.')[0]
-  target = f'{split_target}_{suffix}.mp4'
-  cmd = f'ffmpeg -i "{source}" -s {resolution} -c:v libx264 -crf 23 -c:a aac -strict -2 "{target}"'
-  subprocess.run(cmd, shell=True)
+HLS_RENDITION = 'hls'
+
+HLS_SEGMENT_SECONDS = 6
+
+# Seconds from the start of a source whose keyframes are read to find its keyframe interval
+KEYFRAME_PROBE_SECONDS = 60
+
+def probe_width(source):
+  """Return the width of the first video stream or image in pixels, None if it cannot be probed"""
+  cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'stream=width', '-of', 'csv=p=0', source]
+  try:
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return int(output.strip())
+  except (OSError, subprocess.CalledProcessError, ValueError):
+    return None
+
+def probe_duration(source):
+  """Return the duration of a media file in seconds, None if it cannot be probed"""
+  cmd = ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'csv=p=0', source]
+  try:
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    return float(output.strip())
+  except (OSError, subprocess.CalledProcessError, ValueError):
+    return None
+
+def probe_keyframe_interval(source):
+  """
+  Return the mean distance in seconds between the keyframes of the first video stream.
+
+  Only the packet headers of the first KEYFRAME_PROBE_SECONDS are read, nothing
+  is decoded. None if the source has less than two keyframes in that range.
+  """
+  cmd = [
+    'ffprobe', '-v', 'error', '-select_streams', 'v:0', '-read_intervals', f'%+{KEYFRAME_PROBE_SECONDS}',
+    '-show_entries', 'packet=pts_time,flags', '-of', 'csv=p=0', source,
+  ]
+  try:
+    output = subprocess.run(cmd, capture_output=True, text=True, check=True).stdout
+    keyframes = [float(line.split(',')[0]) for line in output.splitlines() if 'K' in line.partition(',')[2]]
+  except (OSError, subprocess.CalledProcessError, ValueError):
+    return None
+  if len(keyframes) < 2:
+    return None
+  return (keyframes[-1] - keyframes[0]) / (len(keyframes) - 1)
+
+def probe_media(source):
+  """
+  Return the metadata of a media file as values of the Video fields of the same name.
+
+  duration, width, height, bitrate, video_codec, audio_codec, pix_fmt and
+  keyframe_interval, an empty dict if the file cannot be probed.
+  """
+  cmd = [
+    'ffprobe', '-v', 'error',
+    '-show_entries', 'format=duration,bit_rate:stream=codec_type,codec_name,width,height,pix_fmt',
+    '-of', 'json', source,
+  ]
+  try:
+    output = json.loads(subprocess.run(cmd, capture_output=True, text=True, check=True).stdout)
+  except (OSError, subprocess.CalledProcessError, ValueError):
+    return {}
+  streams = output.get('streams', [])
+  video = next((stream for stream in streams if stream.get('codec_type') == 'video'), {})
+  audio = next((stream for stream in streams if stream.get('codec_type') == 'audio'), {})
+  media_format = output.get('format', {})
+  return {
+    'duration': float(media_format['duration']) if 'duration' in media_format else None,
+    'width': video.get('width'),
+    'height': video.get('height'),
+    'bitrate': int(media_format['bit_rate']) if 'bit_rate' in media_format else None,
+    'video_codec': video.get('codec_name', ''),
+    'audio_codec': audio.get('codec_name', ''),
+    'pix_fmt': video.get('pix_fmt', ''),
+    'keyframe_interval': probe_keyframe_interval(source) if video else None,
+  }
+
+def run_ffmpeg(cmd, duration=None, on_progress=None):
+  """
+  Run an ffmpeg command and report its progress.
+
+  ffmpeg writes key=value progress blocks to stdout (-progress pipe:1).
+  The out_time_us of every block is turned into a percentage of duration
+  and passed to on_progress. Raises CalledProcessError carrying the tail of
+  the ffmpeg log when ffmpeg exits with a non-zero code. ffmpeg is killed
+  if the job is interrupted, like by an RQ timeout or a worker shutdown.
+  """
+  cmd = [cmd[0], '-progress', 'pipe:1', '-nostats', *cmd[1:]]
+  with tempfile.TemporaryFile() as log:
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=log, text=True)
+    try:
+      for line in process.stdout:
+        key, _, value = line.strip().partition('=')
+        if key == 'out_time_us' and value.isdigit() and duration and on_progress:
+          on_progress(min(int(value) / 1_000_000 / duration * 100, 100))
+    except BaseException:
+      process.kill()
+      process.wait()
+      raise
+    returncode = process.wait()
+    if returncode:
+      log.seek(0)
+      stderr = log.read()[-2000:].decode(errors='replace')
+      raise subprocess.CalledProcessError(returncode, cmd, stderr=stderr)
+
+def job_timeout(queue_name, duration=None):
+  """
+  Return the RQ timeout in seconds for converting duration seconds of video on a queue.
+
+  Never less than the queue's DEFAULT_TIMEOUT, longer sources get
+  settings.VIDEO_TIMEOUT_FACTOR seconds per second of video.
+  """
+  timeout = settings.RQ_QUEUES[queue_name].get('DEFAULT_TIMEOUT', settings.RQ_CONNECTION['DEFAULT_TIMEOUT'])
+  if duration:
+    timeout = max(timeout, int(duration * settings.VIDEO_TIMEOUT_FACTOR))
+  return timeout
+
+def source_videos(video_id):
+  """Return the video and every deduplicated video sharing its source file"""
+  return Video.objects.filter(file=Video.objects.filter(pk=video_id).values('file')[:1])
+
+def transcode_jobs(video_id, renditions):
+  """Return the TranscodeJob rows for the given renditions of a video and the videos sharing its source"""
+  return TranscodeJob.objects.filter(video__in=source_videos(video_id), rendition__in=list(renditions))
+
+def update_transcode_jobs(jobs, **fields):
+  """
+  Update TranscodeJob rows and invalidate the cached catalog when their status changes.
+
+  Progress ticks alone keep the cache, the cached progress is the one of the
+  last status change.
+  """
+  jobs.update(**fields)
+  if 'status' in fields:
+    bump_catalog_version()
+
+@contextmanager
+def track_transcode(video_id, renditions, finish=True):
+  """
+  Record a conversion on the TranscodeJob rows of a video.
+
+  Marks the rows as running on the current RQ worker and yields a progress
+  callback for run_ffmpeg. Afterwards the rows are marked done (unless
+  finish is False, as for single chunks) or failed with the error message.
+  A failure recorded by one chunk is kept while the other chunks run.
+  Without a video_id nothing is recorded and the callback is None.
+  """
+  if video_id is None:
+    yield None
+    return
+
+  jobs = transcode_jobs(video_id, renditions)
+  rq_job = get_current_job()
+  jobs.filter(started_at__isnull=True).update(started_at=timezone.now())
+  running = jobs if finish else jobs.exclude(status=TranscodeJob.Status.FAILED)
+  update_transcode_jobs(
+    running,
+    status=TranscodeJob.Status.RUNNING,
+    worker=(rq_job.worker_name if rq_job else None) or '',
+  )
+
+  last_progress = 0
+  def on_progress(percent):
+    nonlocal last_progress
+    if int(percent) > last_progress:
+      last_progress = int(percent)
+      update_transcode_jobs(jobs, progress=last_progress)
+
+  try:
+    yield on_progress
+  except Exception as error:
+    update_transcode_jobs(
+      jobs,
+      status=TranscodeJob.Status.FAILED,
+      error=getattr(error, 'stderr', None) or repr(error),
+      finished_at=timezone.now(),
+    )
+    raise
+
+  if finish:
+    update_transcode_jobs(jobs, status=TranscodeJob.Status.DONE, progress=100, error='', finished_at=timezone.now())
+
+def rendition_path(source, suffix):
+  """Return the path or storage name of the MP4 rendition of a source video"""
+  return f'{artifact_stem(source)}_{suffix}.mp4'
+
+def build_split_filter(heights, extra_outputs=0):
+  """
+  Build a filter graph that decodes the source once and scales it to every height.
+
+  The scaled streams are labelled [v0out], [v1out], ... in the order of heights.
+  extra_outputs unscaled copies follow as [vN], [vN+1], ... for further filters.
+  """
+  count = len(heights) + extra_outputs
+  splits = ''.join(f'[v{index}]' for index in range(count))
+  filters = [f'[0:v]split={count}{splits}']
+  for index, height in enumerate(heights):
+    filters.append(f'[v{index}]scale=-2:{height}[v{index}out]')
+  return ';'.join(filters)
+
+def previews_dir(source):
+  """Return the directory that holds the poster, sprite sheets and seek preview index of a source video"""
+  return f'{artifact_stem(source)}_previews'
+
+def build_preview_filter(index, poster_second):
+  """
+  Build the filters turning split outputs [v<index>] and [v<index+1>] into the preview images.
+
+  [poster] is the first frame from poster_second on, [sprite] tiles one frame
+  every settings.VIDEO_SPRITE['interval'] seconds into sprite sheets.
+  """
+  sprite = settings.VIDEO_SPRITE
+  size = f"{sprite['width']}:{sprite['height']}"
+  return ';'.join([
+    f"[v{index}]select='gte(t\\,{poster_second})'[poster]",
+    f"[v{index + 1}]fps=1/{sprite['interval']},"
+    f"scale={size}:force_original_aspect_ratio=decrease,pad={size}:(ow-iw)/2:(oh-ih)/2,"
+    f"tile={sprite['columns']}x{sprite['rows']}[sprite]",
+  ])
+
+def build_renditions_command(source, renditions, preview_dir=None, poster_second=0, output=None):
+  """
+  Build one ffmpeg command that writes every MP4 rendition from a single decode.
+
+  The rendition paths are derived from output, which defaults to source.
+  Renditions marked 'copy' by plan_renditions are remuxed from the source
+  streams without re-encoding. With preview_dir the same decode also writes
+  poster.jpg and the sprite sheets sprite_001.jpg, sprite_002.jpg, ... into
+  that directory.
+  """
+  output = output or source
+  encoded = {suffix: options for suffix, options in renditions.items() if not options.get('copy')}
+  heights = [options['height'] for options in encoded.values()]
+  cmd = ['ffmpeg', '-y', '-i', source]
+  if heights or preview_dir:
+    filter_graph = build_split_filter(heights, extra_outputs=2 if preview_dir else 0)
+    if preview_dir:
+      filter_graph += ';' + build_preview_filter(len(heights), poster_second)
+    cmd += ['-filter_complex', filter_graph]
+  for index, (suffix, options) in enumerate(encoded.items()):
+    profile = rendition_profile(options)
+    cmd += [
+      '-map', f'[v{index}out]',
+      '-map', '0:a?',
+      *video_args(profile),
+      *audio_args(profile),
+      '-movflags', '+faststart',
+      rendition_path(output, suffix),
+    ]
+  for suffix, options in renditions.items():
+    if options.get('copy'):
+      cmd += ['-map', '0:v:0', '-map', '0:a?', '-c', 'copy', '-movflags', '+faststart', rendition_path(output, suffix)]
+  if preview_dir:
+    cmd += [
+      '-map', '[poster]', '-frames:v', '1', '-update', '1', os.path.join(preview_dir, 'poster.jpg'),
+      '-map', '[sprite]', '-q:v', '5', os.path.join(preview_dir, 'sprite_%03d.jpg'),
+    ]
+  return cmd
+
+def vtt_timestamp(seconds):
+  """Format seconds as a WebVTT timestamp, hh:mm:ss.ttt"""
+  minutes, seconds = divmod(seconds, 60)
+  hours, minutes = divmod(int(minutes), 60)
+  return f'{hours:02d}:{minutes:02d}:{seconds:06.3f}'
+
+def build_sprite_vtt(duration):
+  """
+  Build the WebVTT index of the sprite sheets of a video of duration seconds.
+
+  Every cue covers one sprite interval and points to its tile with a media
+  fragment, e.g. sprite_001.jpg#xywh=160,0,160,90, relative to the index.
+  """
+  sprite = settings.VIDEO_SPRITE
+  interval, width, height = sprite['interval'], sprite['width'], sprite['height']
+  tiles_per_sheet = sprite['columns'] * sprite['rows']
+  lines = ['WEBVTT', '']
+  for index in range(math.ceil(duration / interval)):
+    start, end = index * interval, min((index + 1) * interval, duration)
+    sheet, position = divmod(index, tiles_per_sheet)
+    x, y = position % sprite['columns'] * width, position // sprite['columns'] * height
+    lines += [
+      f'{vtt_timestamp(start)} --> {vtt_timestamp(end)}',
+      f'sprite_{sheet + 1:03d}.jpg#xywh={x},{y},{width},{height}',
+      '',
+    ]
+  return '\n'.join(lines)
+
+def publish_previews(source, video_id):
+  """
+  Attach the stored preview images and seek preview index of a source to its videos.
+
+  The poster becomes the thumbnail of videos that were uploaded without one.
+  """
+  output_dir = previews_dir(source)
+  videos = source_videos(video_id)
+  videos.update(seek_previews=os.path.join(output_dir, 'thumbnails.vtt'), updated_at=timezone.now())
+  without_thumbnail = list(videos.filter(thumbnail='').values_list('pk', flat=True))
+  Video.objects.filter(pk__in=without_thumbnail).update(thumbnail=os.path.join(output_dir, 'poster.jpg'))
+  for pk in without_thumbnail:
+    django_rq.get_queue('thumbnails').enqueue(convert_thumbnail, video_id=pk)
+  bump_catalog_version()
+
+def thumbnail_variant_path(output_dir, width, extension):
+  """Return the path of one width and format of a thumbnail"""
+  return os.path.join(output_dir, f'thumbnail_{width}.{extension}')
+
+def build_thumbnail_command(source, output_dir, widths):
+  """
+  Build one ffmpeg command that writes a thumbnail in every width and format.
+
+  The image is decoded once, scaled once per width and every scaled copy is
+  encoded in each of settings.VIDEO_THUMBNAIL_FORMATS.
+  """
+  formats = settings.VIDEO_THUMBNAIL_FORMATS
+  filters = [f'[0:v]split={len(widths)}' + ''.join(f'[t{index}]' for index in range(len(widths)))]
+  for index, width in enumerate(widths):
+    outputs = ''.join(f'[t{index}{extension}]' for extension in formats)
+    filters.append(f'[t{index}]scale={width}:-2,split={len(formats)}{outputs}')
+  cmd = ['ffmpeg', '-y', '-i', source, '-filter_complex', ';'.join(filters)]
+  for index, width in enumerate(widths):
+    for extension, options in formats.items():
+      cmd += ['-map', f'[t{index}{extension}]', *options['args'], thumbnail_variant_path(output_dir, width, extension)]
+  return cmd
+
+def convert_thumbnail(video_id):
+  """
+  Convert the thumbnail of a video to the responsive widths and modern formats.
+
+  Widths above the width of the thumbnail are left out, a thumbnail smaller
+  than every width is converted at its own width. The variants are written
+  next to the thumbnail, so videos sharing a source keep their own. The result
+  is stored as Video.thumbnail_srcset, it is only saved if the thumbnail has
+  not been replaced in the meantime.
+  """
+  video = Video.objects.filter(pk=video_id).first()
+  if video is None or not video.thumbnail:
+    return
+  output_dir = previews_dir(video.thumbnail.name)
+  with readable(video.thumbnail.name) as source, workspace() as work:
+    source_width = probe_width(source)
+    widths = [width for width in settings.VIDEO_THUMBNAIL_WIDTHS if not source_width or width <= source_width]
+    widths = widths or [source_width]
+    run_ffmpeg(build_thumbnail_command(source, work.directory(output_dir), widths))
+
+  srcset = {
+    'source': video.thumbnail.name,
+    'variants': {
+      options['mime_type']: [[width, thumbnail_variant_path(output_dir, width, extension)] for width in widths]
+      for extension, options in settings.VIDEO_THUMBNAIL_FORMATS.items()
+    },
+  }
+  Video.objects.filter(pk=video_id, thumbnail=video.thumbnail.name).update(thumbnail_srcset=srcset, updated_at=timezone.now())
+  bump_catalog_version()
+
+def convert_video_renditions(source, renditions=None, video_id=None, previews=False):
+  """
+  Convert a stored video to all configured resolutions in a single ffmpeg run.
+
+  Defaults to settings.VIDEO_RENDITIONS. The source is decoded only once
+  and fanned out to every rendition through one filter graph. With previews
+  the same decode produces the poster and the seek preview sprite sheets.
+  The outputs are stored next to the source, the jobs are done once they are.
+  """
+  renditions = renditions or settings.VIDEO_RENDITIONS
+  with track_transcode(video_id, renditions) as on_progress, readable(source) as source_input, workspace() as work:
+    duration = probe_duration(source_input) if on_progress or previews else None
+    output = work.path(source)
+    if previews and duration:
+      output_dir = work.directory(previews_dir(source))
+      poster_second = min(settings.VIDEO_POSTER_SECOND, duration / 2)
+      cmd = build_renditions_command(source_input, renditions, output_dir, poster_second, output=output)
+      with open(os.path.join(output_dir, 'thumbnails.vtt'), 'w') as file:
+        file.write(build_sprite_vtt(duration))
+    else:
+      cmd = build_renditions_command(source_input, renditions, output=output)
+    run_ffmpeg(cmd, duration, on_progress)
+  if previews and duration and video_id is not None:
+    publish_previews(source, video_id)
+
+def chunk_dir(source):
+  """Return the working directory for the chunks of a source video"""
+  return f'{artifact_stem(source)}_chunks'
+
+def split_video(source, chunk_seconds):
+  """
+  Split a stored video into chunks of roughly chunk_seconds without re-encoding.
+
+  Streams are copied, so the segment muxer can only cut on keyframes and
+  every chunk starts with one. The chunks are stored, so any worker can
+  transcode them. Returns their names in playback order.
+  """
+  with readable(source) as source_input, workspace() as work:
+    output_dir = work.directory(chunk_dir(source))
+    cmd = [
+      'ffmpeg', '-y', '-i', source_input,
+      '-map', '0:v:0', '-map', '0:a:0?',
+      '-c', 'copy',
+      '-f', 'segment',
+      '-segment_time', str(chunk_seconds),
+      '-reset_timestamps', '1',
+      os.path.join(output_dir, 'chunk_%04d.mp4'),
+    ]
+    run_ffmpeg(cmd)
+    chunks = sorted(glob.glob(os.path.join(output_dir, 'chunk_[0-9][0-9][0-9][0-9].mp4')))
+  return [os.path.join(chunk_dir(source), os.path.basename(chunk)) for chunk in chunks]
+
+def transcode_chunk(chunk, renditions, video_id=None):
+  """
+  Convert one chunk of a video to all renditions.
+
+  Progress of a chunked conversion is the share of finished chunks, the
+  TranscodeJob rows stay running until stitch_renditions has joined them.
+  """
+  with track_transcode(video_id, renditions, finish=False), readable(chunk) as chunk_input, workspace() as work:
+    run_ffmpeg(build_renditions_command(chunk_input, renditions, output=work.path(chunk)))
+  if video_id is not None:
+    update_transcode_jobs(
+      transcode_jobs(video_id, renditions),
+      chunks_done=F('chunks_done') + 1,
+      progress=(F('chunks_done') + 1) * 100 / F('chunks_total'),
+    )
+
+def stitch_renditions(source, chunks, renditions=None, video_id=None):
+  """
+  Concatenate the transcoded chunks of every rendition without re-encoding.
+
+  Runs after all chunk jobs have finished and removes the stored chunks.
+  Chunks on an object store are concatenated straight from their URLs.
+  """
+  renditions = renditions or settings.VIDEO_RENDITIONS
+  with track_transcode(video_id, renditions), tempfile.TemporaryDirectory() as list_dir, workspace() as work:
+    for suffix in renditions:
+      concat_list = os.path.join(list_dir, f'{suffix}.txt')
+      with ExitStack() as inputs:
+        with open(concat_list, 'w') as file:
+          for chunk in chunks:
+            file.write(f"file '{inputs.enter_context(readable(rendition_path(chunk, suffix)))}'\n")
+        cmd = [
+          'ffmpeg', '-y', '-f', 'concat', '-safe', '0',
+          '-protocol_whitelist', 'file,http,https,tcp,tls,crypto', '-i', concat_list,
+          '-c', 'copy', '-movflags', '+faststart',
+          rendition_path(work.path(source), suffix),
+        ]
+        run_ffmpeg(cmd)
+  delete_tree(chunk_dir(source))
+
+def convert_video_chunked(source, renditions=None, video_id=None):
+  """
+  Transcode a video in parallel across the RQ worker pool.
+
+  The source is split at keyframes, each chunk is enqueued as a separate
+  transcode_chunk job and a stitch job that depends on all of them joins
+  the chunks per rendition. Short sources that fit into a single chunk are
+  converted directly.
+  """
+  renditions = renditions or settings.VIDEO_RENDITIONS
+  with track_transcode(video_id, renditions, finish=False):
+    chunks = split_video(source, settings.VIDEO_CHUNK_SECONDS)
+  if len(chunks) <= 1:
+    delete_tree(chunk_dir(source))
+    convert_video_renditions(source, renditions, video_id)
+    return
+
+  if video_id is not None:
+    transcode_jobs(video_id, renditions).update(chunks_total=len(chunks), chunks_done=0)
+  queue = django_rq.get_queue('transcode')
+  timeout = job_timeout('transcode', settings.VIDEO_CHUNK_SECONDS)
+  chunk_jobs = [
+    queue.enqueue(transcode_chunk, chunk, renditions, video_id, job_timeout=timeout)
+    for chunk in chunks
+  ]
+  queue.enqueue(stitch_renditions, source, chunks, renditions, video_id, depends_on=chunk_jobs)
+
+def hls_output_dir(source):
+  """Return the directory that holds the HLS ladder of a source video"""
+  return f'{artifact_stem(source)}_hls'
+
+def build_hls_command(source, output_dir, renditions=None, segment_seconds=HLS_SEGMENT_SECONDS, audio=True):
+  """
+  Build the ffmpeg command that packages a source video as an HLS ladder.
+
+  The source is decoded once and split into one scaled stream per rendition,
+  encoded with the profile of that rendition. Keyframes are forced on segment
+  boundaries so every rendition cuts its segments at the same timestamps,
+  which lets players switch between them. Sources without an audio track
+  (audio=False) get video only variants.
+  """
+  renditions = renditions or settings.VIDEO_HLS_RENDITIONS
+  heights = [options['height'] for options in renditions.values()]
+  cmd = ['ffmpeg', '-y', '-i', source, '-filter_complex', build_split_filter(heights)]
+  stream_map = []
+  for index, (name, options) in enumerate(renditions.items()):
+    profile = rendition_profile(options)
+    cmd += [
+      '-map', f'[v{index}out]',
+      *video_args(profile, f':v:{index}', keyframe_interval=segment_seconds),
+    ]
+    if audio:
+      cmd += ['-map', '0:a:0?', *audio_args(profile, f':a:{index}')]
+      stream_map.append(f'v:{index},a:{index},name:{name}')
+    else:
+      stream_map.append(f'v:{index},name:{name}')
+
+  cmd += [
+    '-sc_threshold', '0',
+    '-f', 'hls',
+    '-hls_time', str(segment_seconds),
+    '-hls_playlist_type', 'vod',
+    '-hls_flags', 'independent_segments',
+    '-hls_segment_filename', os.path.join(output_dir, '%v', 'segment_%03d.ts'),
+    '-master_pl_name', 'master.m3u8',
+    '-var_stream_map', ' '.join(stream_map),
+    os.path.join(output_dir, '%v', 'index.m3u8'),
+  ]
+  return cmd
+
+def convert_video_hls(source, video_id=None, renditions=None, audio=True):
+  """
+  Package a video as adaptive-bitrate HLS in a single ffmpeg pass.
+
+  Writes one segmented rendition per entry in renditions (defaults to
+  settings.VIDEO_HLS_RENDITIONS) plus a master.m3u8 playlist into the
+  directory returned by hls_output_dir(). Pass audio=False for sources
+  without an audio track.
+  """
+  renditions = renditions or settings.VIDEO_HLS_RENDITIONS
+  with track_transcode(video_id, [HLS_RENDITION]) as on_progress, readable(source) as source_input, workspace() as work:
+    output_dir = work.directory(hls_output_dir(source))
+    for name in renditions:
+      work.directory(os.path.join(hls_output_dir(source), name))
+    duration = probe_duration(source_input) if on_progress else None
+    run_ffmpeg(build_hls_command(source_input, output_dir, renditions, audio=audio), duration, on_progress)
+
+def fit_renditions(renditions, height):
+  """
+  Leave out the renditions that would upscale a source of the given height.
+
+  If the source is smaller than every rendition, the smallest one is kept at
+  the height of the source (rounded down to an even number for the encoder),
+  so every video stays playable. Without a height the renditions are kept.
+  """
+  if not height:
+    return renditions
+  fitting = {name: options for name, options in renditions.items() if options['height'] <= height}
+  if fitting:
+    return fitting
+  name, options = min(renditions.items(), key=lambda item: item[1]['height'])
+  return {name: {**options, 'height': height - height % 2}}
+
+def source_matches(options, metadata):
+  """
+  Return whether a source can be remuxed into a rendition instead of being re-encoded.
+
+  It has to have the height of the rendition, the codecs and 8 bit 4:2:0
+  pixel format its profile encodes to, keyframes at least as often as the
+  profile forces them and a bitrate within the cap of the rendition
+  ('copy_maxrate', else the maxrate of its profile). Without a cap or a
+  probed bitrate the source is re-encoded, so the ladder keeps its bitrates.
+  """
+  profile = rendition_profile(options)
+  interval = metadata.get('keyframe_interval')
+  bitrate_cap = parse_bitrate(options.get('copy_maxrate') or profile['maxrate'])
+  return (
+    metadata.get('height') == options['height']
+    and metadata.get('video_codec') == encoder_codec(profile['codec'])
+    and metadata.get('audio_codec') in ('', encoder_codec(profile['audio_codec']))
+    and metadata.get('pix_fmt') == (profile['pix_fmt'] or 'yuv420p')
+    and bitrate_cap is not None and metadata.get('bitrate') is not None and metadata['bitrate'] <= bitrate_cap
+    and (not profile['keyframe_interval'] or (interval is not None and interval <= profile['keyframe_interval']))
+  )
+
+def plan_renditions(renditions, metadata):
+  """Fit renditions to the probed source and mark those it already matches as 'copy'"""
+  renditions = fit_renditions(renditions, metadata.get('height'))
+  return {
+    name: {**options, 'copy': True} if source_matches(options, metadata) else options
+    for name, options in renditions.items()
+  }
+
+def schedule_conversion(source, video_id=None):
+  """
+  Probe an upload and queue every conversion with timeouts sized to its duration.
+
+  The probed metadata is stored on the Video and decides the renditions:
+  none above the source resolution and a remux for those the source already
+  matches. The TranscodeJob rows of renditions left out are deleted. The
+  preview rendition, together with the poster and the seek previews, goes
+  to the high priority 'preview' queue, the MP4 ladder and the HLS packaging
+  to the bulk 'transcode' queue.
+  """
+  with readable(source) as source_input:
+    metadata = probe_media(source_input)
+  preview_renditions = plan_renditions(settings.VIDEO_PREVIEW_RENDITIONS, metadata)
+  renditions = plan_renditions(settings.VIDEO_RENDITIONS, metadata)
+  hls_renditions = fit_renditions(settings.VIDEO_HLS_RENDITIONS, metadata.get('height'))
+  if video_id is not None:
+    source_videos(video_id).update(**metadata)
+    skipped = TranscodeJob.objects.filter(video__in=source_videos(video_id)).exclude(
+      rendition__in=[*preview_renditions, *renditions, HLS_RENDITION],
+    )
+    skipped.delete()
+    bump_catalog_version()
+
+  duration = metadata.get('duration')
+  preview_queue = django_rq.get_queue('preview')
+  preview_queue.enqueue(
+    convert_video_renditions, source, preview_renditions, video_id, previews=True,
+    job_timeout=job_timeout('preview', duration),
+  )
+  queue = django_rq.get_queue('transcode')
+  queue.enqueue(convert_video_chunked, source, renditions, video_id, job_timeout=job_timeout('transcode', duration))
+  queue.enqueue(
+    convert_video_hls, source, video_id, hls_renditions, audio=metadata.get('audio_codec') != '',
+    job_timeout=job_timeout('transcode', duration),
+  )
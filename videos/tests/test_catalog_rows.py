@@ -0,0 +1,93 @@
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from rest_framework.renderers import JSONRenderer
+from videos.models import Video, TranscodeJob
+from videos.api.catalog import VideoCatalogRows
+from videos.api.serializers import VideoCatalogSerializer
+from django.core.files.uploadedfile import SimpleUploadedFile
+import mock
+
+class VideoCatalogRowsTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        mock_get_queue.return_value = mock.MagicMock()
+
+        self.first = Video.objects.create(
+            title="Test Video",
+            description="This is a test video",
+            file=SimpleUploadedFile('test video ä.mp4', b'file_content', content_type='video/mp4'),
+            thumbnail=SimpleUploadedFile('test_thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg'),
+            genre="Action"
+        )
+        self.second = Video.objects.create(
+            title="Ünïcode \"Video\"",
+            file=SimpleUploadedFile('second.mp4', b'file_content', content_type='video/mp4'),
+            thumbnail=SimpleUploadedFile('second.jpg', b'thumbnail_content', content_type='image/jpeg'),
+        )
+        self.second.transcode_jobs.all().delete()
+        self.first.transcode_jobs.filter(rendition='preview').update(status=TranscodeJob.Status.DONE, progress=100)
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    def render_both(self, fields):
+        queryset = VideoCatalogSerializer.select_columns(Video.objects.order_by('-id'), fields)
+        serialized = VideoCatalogSerializer(queryset, many=True, fields=fields).data
+
+        catalog = VideoCatalogRows(fields)
+        rows = list(catalog.queryset().order_by('-id'))
+        return JSONRenderer().render(serialized), JSONRenderer().render(catalog.represent(rows))
+
+    def test_default_fields_byte_identical(self):
+        """Test that the fast path renders the same JSON as the serializer for the default fields"""
+        serialized, fast = self.render_both(VideoCatalogSerializer.default_fields)
+
+        self.assertEqual(fast, serialized)
+
+    def test_all_fields_byte_identical(self):
+        """Test that the fast path renders the same JSON as the serializer for every field"""
+        fields = ('id', 'renditions', 'playable', 'ready', 'uploaded_at', 'updated_at',
+                  'title', 'description', 'file', 'thumbnail', 'thumbnail_srcset', 'genre',
+                  'duration', 'width', 'height', 'bitrate', 'video_codec', 'audio_codec', 'keyframe_interval')
+        Video.objects.filter(pk=self.second.pk).update(duration=14, height=720, video_codec='h264', keyframe_interval=2.5)
+        Video.objects.filter(pk=self.first.pk).update(thumbnail_srcset={
+            'source': self.first.thumbnail.name,
+            'variants': {'image/webp': [[320, 'videos/a b_previews/thumbnail_320.webp']]},
+        })
+        serialized, fast = self.render_both(fields)
+
+        self.assertEqual(fast, serialized)
+        self.assertIn(b'"playable":true', fast)
+        url = default_storage.url('videos/a b_previews/thumbnail_320.webp')
+        self.assertIn(f'"image/webp":"{url} 320w"'.encode(), fast)
+        self.assertIn('/videos/a%20b_previews/thumbnail_320.webp', url)
+
+    def test_requested_order_does_not_change_output(self):
+        """Test that fields keep the serializer order whatever order the client asked for"""
+        serialized, fast = self.render_both(('genre', 'ready', 'id'))
+
+        self.assertEqual(fast, serialized)
+        self.assertTrue(fast.startswith(b'[{"id"'))
+
+    def test_jobs_loaded_only_for_renditions(self):
+        """Test that playable and ready come with the videos and only renditions need a second query"""
+        catalog = VideoCatalogRows(('id', 'playable', 'ready'))
+        with self.assertNumQueries(1):
+            catalog.represent(list(catalog.queryset()))
+
+        catalog = VideoCatalogRows(('id', 'renditions'))
+        with self.assertNumQueries(2):
+            catalog.represent(list(catalog.queryset()))
+
+    def test_grouped_by_genre(self):
+        """Test that the genre groups hold the newest videos of each genre up to the limit"""
+        with mock.patch('django_rq.get_queue'):
+            newest = Video.objects.create(title="Newest Action", file='videos/a.mp4', thumbnail='thumbnails/a.jpg', genre="Action")
+
+        with self.assertNumQueries(1):
+            groups = VideoCatalogRows(('id', 'playable')).grouped_by_genre(limit=1)
+
+        self.assertEqual(groups, [
+            {'genre': '', 'videos': [{'id': self.second.id, 'playable': True}]},
+            {'genre': 'Action', 'videos': [{'id': newest.id, 'playable': False}]},
+        ])
@@ -0,0 +1,126 @@
+from django.test import TestCase
+from django.urls import reverse
+from django.core.cache import cache
+from django.utils import timezone
+from django.utils.http import parse_http_date
+from rest_framework.test import APIClient
+from rest_framework import status
+from videos.cache import CATALOG_CHANGED_KEY
+from videos.models import Video
+from videos.tasks import track_transcode
+from django.core.files.uploadedfile import SimpleUploadedFile
+from datetime import timedelta
+import mock
+import time
+
+class ConditionalGetTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        mock_get_queue.return_value = mock.MagicMock()
+
+        self.client = APIClient()
+        self.video = self.create_video("Test Video")
+        self.video_list_url = reverse('video-list')
+        self.video_detail_url = reverse('video-detail', kwargs={'pk': self.video.pk})
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    @mock.patch('django_rq.get_queue')
+    def create_video(self, title, mock_get_queue):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Video.objects.create(
+                title=title,
+                description="This is a test video",
+                file=SimpleUploadedFile('test_video.mp4', b'file_content', content_type='video/mp4'),
+                thumbnail=SimpleUploadedFile('test_thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg'),
+                genre="Action"
+            )
+
+    def test_validators_sent_with_full_response(self):
+        """Test that list and detail responses carry a strong ETag and Last-Modified"""
+        for url in (self.video_list_url, self.video_detail_url):
+            response = self.client.get(url)
+
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertTrue(response['ETag'].startswith('"'))
+            self.assertGreaterEqual(parse_http_date(response['Last-Modified']), int(self.video.updated_at.timestamp()))
+
+    def test_matching_etag_returns_not_modified(self):
+        """Test that an unchanged list is answered with an empty 304"""
+        etag = self.client.get(self.video_list_url)['ETag']
+
+        response = self.client.get(self.video_list_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response.content, b'')
+
+    def test_not_modified_since_returns_not_modified(self):
+        """Test that If-Modified-Since is honoured for a single video"""
+        last_modified = self.client.get(self.video_detail_url)['Last-Modified']
+
+        response = self.client.get(self.video_detail_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_not_modified_answered_from_cache(self):
+        """Test that revalidating an unchanged video does not hit the database"""
+        etag = self.client.get(self.video_detail_url)['ETag']
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.video_detail_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_new_video_changes_list_etag(self):
+        """Test that a stale ETag gets the full list once a video was added"""
+        etag = self.client.get(self.video_list_url)['ETag']
+
+        self.create_video("Second Video")
+        response = self.client.get(self.video_list_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 2)
+
+    def test_deleted_video_changes_list_last_modified(self):
+        """Test that a client revalidating with If-Modified-Since only gets the list without a deleted video"""
+        newer = self.create_video("Second Video")
+        Video.objects.update(updated_at=timezone.now() - timedelta(minutes=1))
+        cache.set(CATALOG_CHANGED_KEY, time.time() - 60, timeout=None)
+        last_modified = self.client.get(self.video_list_url)['Last-Modified']
+
+        with mock.patch('videos.cleanup.django_rq'), self.captureOnCommitCallbacks(execute=True):
+            newer.delete()
+        response = self.client.get(self.video_list_url, HTTP_IF_MODIFIED_SINCE=last_modified)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data['results']), 1)
+
+    def test_pages_have_different_etags(self):
+        """Test that every page of the list is validated on its own"""
+        self.create_video("Second Video")
+
+        first_page = self.client.get(self.video_list_url, {'page_size': 1})
+        full_page = self.client.get(self.video_list_url)
+
+        self.assertNotEqual(first_page['ETag'], full_page['ETag'])
+
+    def test_conversion_progress_changes_detail_etag(self):
+        """Test that conversion state changes are not hidden behind a 304"""
+        etag = self.client.get(self.video_detail_url)['ETag']
+        renditions = list(self.video.transcode_jobs.values_list('rendition', flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True), track_transcode(self.video.id, renditions):
+            pass
+        response = self.client.get(self.video_detail_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.data['ready'])
+
+    def test_missing_video_still_not_found(self):
+        """Test that conditional headers do not turn a missing video into a 304"""
+        url = reverse('video-detail', kwargs={'pk': self.video.pk + 1})
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,230 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.test.utils import override_settings
+from user_auth.models import User
+from videos.cleanup import (
+    CLEANUP_LOCK_KEY, PENDING_CLEANUPS_KEY, RUNNING_CLEANUPS_KEY, delete_files, delete_pending_files, sweep_orphan_files,
+)
+from videos.models import Video, VideoUpload
+from videos.storage import WORKSPACE_DIR, WORKSPACE_PREFIX
+from videos.tasks import hls_output_dir, previews_dir, rendition_path
+from datetime import timedelta
+import json
+import mock
+import os
+import shutil
+import tempfile
+import time
+
+def delete_videos(test_case, videos):
+    """Delete videos and run the file cleanup they queue on commit right away."""
+    with mock.patch('videos.signals.queue_file_cleanup') as mock_cleanup, test_case.captureOnCommitCallbacks(execute=True):
+        videos.delete()
+    delete_files([json.dumps({'file': file, 'thumbnail': thumbnail}) for (file, thumbnail), _ in mock_cleanup.call_args_list])
+
+def pending_cleanups(mock_rq, *payloads):
+    """Let the mocked Redis of the cleanup hand out payloads from the pending list."""
+    redis = mock_rq.get_connection.return_value
+    redis.llen.return_value = 0
+    remaining = iter(payloads)
+    redis.lmove.side_effect = lambda source, *args: next(remaining, None) if source == PENDING_CLEANUPS_KEY else None
+    return redis
+
+class FileCleanupTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.video = Video.objects.create(
+            title="Test Video",
+            file=SimpleUploadedFile('source.mp4', b'source_content', content_type='video/mp4'),
+            thumbnail=SimpleUploadedFile('cover.jpg', b'thumbnail_content', content_type='image/jpeg'),
+        )
+        self.source = self.video.file.name
+
+    def save(self, name, age=0):
+        name = default_storage.save(name, ContentFile(b'content'))
+        modified = time.time() - age
+        os.utime(default_storage.path(name), (modified, modified))
+        return name
+
+    @mock.patch('videos.cleanup.django_rq')
+    def test_cleanup_queued_after_commit(self, mock_rq):
+        """Test that the files of a deleted video are only queued for removal once the deletion is committed"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.video.delete()
+        mock_rq.get_connection.return_value.rpush.assert_not_called()
+
+        callbacks[0]()
+
+        payload = json.dumps({'file': self.source, 'thumbnail': self.video.thumbnail.name})
+        mock_rq.get_connection.return_value.rpush.assert_called_once_with(PENDING_CLEANUPS_KEY, payload)
+        enqueue_call = mock_rq.get_queue.return_value.enqueue.call_args
+        self.assertEqual(enqueue_call[0], (delete_pending_files,))
+        self.assertEqual(enqueue_call[1]['retry'].max, 3)
+        self.assertTrue(default_storage.exists(self.source))
+
+    def test_every_artifact_removed(self):
+        """Test that renditions, HLS segments, previews and thumbnail variants are removed with the video"""
+        artifacts = [
+            self.save(rendition_path(self.source, '1080p')),
+            self.save(f'{hls_output_dir(self.source)}/480p/segment_000.ts'),
+            self.save(f'{previews_dir(self.source)}/thumbnails.vtt'),
+            self.save(f'{previews_dir(self.video.thumbnail.name)}/thumbnail_320.webp'),
+        ]
+
+        delete_videos(self, self.video)
+
+        for name in [self.source, self.video.thumbnail.name, *artifacts]:
+            self.assertFalse(default_storage.exists(name), name)
+        self.assertFalse(os.path.exists(os.path.dirname(self.video.file.path)))
+
+    @mock.patch('django_rq.get_queue')
+    def test_reupload_before_cleanup_kept(self, mock_get_queue):
+        """Test that a source re-uploaded before the cleanup of the deleted video ran keeps its files in the shared directory"""
+        rendition = self.save(rendition_path(self.source, '480p'))
+        with mock.patch('videos.signals.queue_file_cleanup') as mock_cleanup, self.captureOnCommitCallbacks(execute=True):
+            self.video.delete()
+        reupload = Video.objects.create(
+            title="Re-upload", file=SimpleUploadedFile('source.mp4', b'source_content', content_type='video/mp4'),
+        )
+        reupload_rendition = self.save(rendition_path(reupload.file.name, '480p'))
+
+        delete_files([json.dumps({'file': file, 'thumbnail': thumbnail}) for (file, thumbnail), _ in mock_cleanup.call_args_list])
+
+        self.assertNotEqual(reupload.file.name, self.source)
+        for name in [self.source, rendition]:
+            self.assertFalse(default_storage.exists(name), name)
+        for name in [reupload.file.name, reupload_rendition]:
+            self.assertTrue(default_storage.exists(name), name)
+
+    @mock.patch('django_rq.get_queue')
+    def test_configured_renditions_of_flat_source_removed(self, mock_get_queue):
+        """Test that a source stored before the content addressed layout takes its renditions along, but no other files"""
+        video = Video.objects.create(title="Flat", file=self.save('videos/flat.mp4'))
+        renditions = [self.save(rendition_path('videos/flat.mp4', '480p')), self.save('videos/flat_mp4_hls/master.m3u8')]
+        other = self.save('videos/flatter.mp4')
+
+        delete_videos(self, video)
+
+        for name in ['videos/flat.mp4', *renditions]:
+            self.assertFalse(default_storage.exists(name), name)
+        self.assertTrue(default_storage.exists(other))
+
+    @mock.patch('videos.cleanup.delete_files', side_effect=ValueError)
+    @mock.patch('videos.cleanup.django_rq')
+    def test_failed_batch_requeued_at_end(self, mock_rq, mock_delete):
+        """Test that a batch that could not be removed goes back to the end of the list and the lock is released"""
+        redis = pending_cleanups(mock_rq, 'first', 'second')
+        redis.llen.side_effect = lambda key: 2 if key == RUNNING_CLEANUPS_KEY and mock_delete.called else 0
+
+        with self.assertRaises(ValueError):
+            delete_pending_files()
+
+        redis.lmove.assert_any_call(PENDING_CLEANUPS_KEY, RUNNING_CLEANUPS_KEY, 'LEFT', 'RIGHT')
+        self.assertEqual(redis.lmove.call_args_list[-2:], [mock.call(RUNNING_CLEANUPS_KEY, PENDING_CLEANUPS_KEY, 'LEFT', 'RIGHT')] * 2)
+        redis.delete.assert_called_once_with(CLEANUP_LOCK_KEY)
+
+    @override_settings(MEDIA_CLEANUP_BATCH_SIZE=1)
+    @mock.patch('videos.cleanup.time.monotonic', side_effect=[0, 0, 1000])
+    @mock.patch('videos.cleanup.delete_files')
+    @mock.patch('videos.cleanup.django_rq')
+    def test_time_budget_queues_follow_up(self, mock_rq, mock_delete, mock_monotonic):
+        """Test that a cleanup stops after half of the queue timeout and queues another job for the rest"""
+        redis = pending_cleanups(mock_rq, 'first', 'second')
+        redis.llen.side_effect = lambda key: 1 if key == PENDING_CLEANUPS_KEY else 0
+
+        self.assertEqual(delete_pending_files(), 1)
+
+        mock_delete.assert_called_once_with(['first'])
+        redis.delete.assert_any_call(RUNNING_CLEANUPS_KEY)
+        self.assertEqual(mock_rq.get_queue.return_value.enqueue.call_args[0][0], delete_pending_files)
+
+    @mock.patch('videos.cleanup.delete_files')
+    @mock.patch('videos.cleanup.django_rq')
+    def test_cleanups_of_killed_job_requeued(self, mock_rq, mock_delete):
+        """Test that cleanups a killed job left in the running list are put back at the front of the list"""
+        redis = pending_cleanups(mock_rq)
+        redis.llen.side_effect = lambda key: 1 if key == RUNNING_CLEANUPS_KEY and not redis.lmove.called else 0
+
+        delete_pending_files()
+
+        self.assertEqual(redis.lmove.call_args_list[0], mock.call(RUNNING_CLEANUPS_KEY, PENDING_CLEANUPS_KEY, 'RIGHT', 'LEFT'))
+
+    @mock.patch('videos.cleanup.delete_files')
+    @mock.patch('videos.cleanup.django_rq')
+    def test_concurrent_cleanup_skipped(self, mock_rq, mock_delete):
+        """Test that a cleanup finding another one running leaves the list to it"""
+        redis = pending_cleanups(mock_rq, 'first')
+        redis.set.return_value = False
+
+        self.assertEqual(delete_pending_files(), 0)
+
+        redis.lmove.assert_not_called()
+        mock_delete.assert_not_called()
+
+    @override_settings(MEDIA_SWEEP_MIN_AGE=3600)
+    def test_sweep_removes_old_orphans_only(self):
+        """Test that the sweeper removes old unreferenced files and keeps referenced, recent and staging files"""
+        user = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        upload = VideoUpload.objects.create(
+            created_by=user, title="Upload", filename='upload.mp4', length=10, thumbnail=self.save('thumbnails/upload.jpg', age=7200),
+        )
+        kept = [
+            self.save(rendition_path(self.source, '480p'), age=7200),
+            self.save(f'{previews_dir(self.video.thumbnail.name)}/thumbnail_320.webp', age=7200),
+            self.save('videos/recent_orphan.mp4'),
+            self.save(f'videos/uploads/{upload.pk}.part', age=7200),
+            upload.thumbnail.name,
+        ]
+        orphans = [
+            self.save('videos/orphan.mp4', age=7200),
+            self.save('videos/orphan_mp4_hls/master.m3u8', age=7200),
+            self.save('videos/ab/' + 'ab' * 32 + '/deleted.mp4', age=7200),
+            self.save('thumbnails/orphan_jpg_previews/thumbnail_320.webp', age=7200),
+        ]
+
+        self.assertEqual(sweep_orphan_files(), len(orphans))
+
+        for name in [self.source, self.video.thumbnail.name, *kept]:
+            self.assertTrue(default_storage.exists(name), name)
+        for name in orphans:
+            self.assertFalse(default_storage.exists(name), name)
+
+    @override_settings(MEDIA_SWEEP_MIN_AGE=3600, VIDEO_UPLOAD_MAX_AGE=86400)
+    def test_sweep_expires_abandoned_uploads_and_workspaces(self):
+        """Test that the sweeper removes old uploads, stray staging files and workspaces nothing is written to"""
+        user = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        abandoned, active = [
+            VideoUpload.objects.create(created_by=user, title=title, filename=f'{title}.mp4', length=10)
+            for title in ('abandoned', 'active')
+        ]
+        VideoUpload.objects.filter(pk=abandoned.pk).update(updated_at=abandoned.updated_at - timedelta(days=2))
+        kept = [
+            self.save(f'videos/uploads/{active.pk}.part', age=2 * 86400),
+            self.save('videos/uploads/recent.part'),
+            self.save(f'{WORKSPACE_DIR}/{WORKSPACE_PREFIX}running/{self.source}', age=7200),
+            self.save(f'{WORKSPACE_DIR}/{WORKSPACE_PREFIX}running/{rendition_path(self.source, "480p")}'),
+        ]
+        removed = [
+            self.save(f'videos/uploads/{abandoned.pk}.part'),
+            self.save('videos/uploads/deleted.part', age=7200),
+            self.save(f'{WORKSPACE_DIR}/{WORKSPACE_PREFIX}killed/{rendition_path(self.source, "480p")}', age=7200),
+        ]
+        for root, directories, files in os.walk(default_storage.path(f'{WORKSPACE_DIR}/{WORKSPACE_PREFIX}killed')):
+            os.utime(root, (time.time() - 7200,) * 2)
+
+        self.assertEqual(sweep_orphan_files(), len(removed))
+
+        self.assertEqual(list(VideoUpload.objects.all()), [active])
+        for name in kept:
+            self.assertTrue(default_storage.exists(name), name)
+        for name in removed:
+            self.assertFalse(default_storage.exists(name), name)
+        self.assertFalse(os.path.exists(default_storage.path(f'{WORKSPACE_DIR}/{WORKSPACE_PREFIX}killed')))
@@ -0,0 +1,189 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import InMemoryStorage, default_storage
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import override_settings
+from videos.models import Video
+from videos.storage import readable, signed_name, url_expiry, workspace
+from videos.tasks import convert_video_renditions, previews_dir, rendition_path
+from videos.tests.test_file_cleanup import delete_videos
+from django.apps import apps
+from importlib import import_module
+import mock
+import os
+import shutil
+import tempfile
+
+class ObjectStorage(InMemoryStorage):
+    """Object store stand-in, its files have no local path."""
+    def _relative_path(self, name):
+        return os.path.relpath(super().path(name), self.location)
+
+    def path(self, name):
+        raise NotImplementedError("This backend doesn't support absolute paths.")
+
+class RemoteStorage(ObjectStorage):
+    """Object store stand-in serving its files from pre-signed HTTPS URLs."""
+    def url(self, name):
+        return f'https://bucket.example.com/{name}?signature=abc'
+
+OBJECT_STORAGE = {
+    'default': {'BACKEND': 'videos.tests.test_media_storage.ObjectStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+REMOTE_STORAGE = {
+    'default': {'BACKEND': 'videos.tests.test_media_storage.RemoteStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+
+RENDITIONS = {'480p': {'height': 480}}
+
+def write_outputs(cmd, *args):
+    """Stand-in for run_ffmpeg writing every output file of a renditions command."""
+    for argument in cmd:
+        if argument.endswith(('.mp4', '.jpg')) and argument != cmd[cmd.index('-i') + 1]:
+            with open(argument.replace('%03d', '001'), 'wb') as file:
+                file.write(b'output')
+
+@override_settings(STORAGES=OBJECT_STORAGE)
+class ObjectStorageConversionTest(SimpleTestCase):
+    def setUp(self):
+        default_storage.save('videos/source.mp4', ContentFile(b'source_content'))
+
+    @mock.patch('videos.tasks.run_ffmpeg', side_effect=write_outputs)
+    def test_renditions_uploaded_to_storage(self, mock_run):
+        """Test that ffmpeg reads a local copy and the renditions end up in the storage"""
+        def read_input(cmd, *args):
+            with open(cmd[cmd.index('-i') + 1], 'rb') as file:
+                self.assertEqual(file.read(), b'source_content')
+            write_outputs(cmd)
+        mock_run.side_effect = read_input
+
+        convert_video_renditions('videos/source.mp4', RENDITIONS)
+
+        with default_storage.open(rendition_path('videos/source.mp4', '480p')) as file:
+            self.assertEqual(file.read(), b'output')
+        output = mock_run.call_args[0][0][-1]
+        self.assertFalse(os.path.exists(output))
+
+    @mock.patch('videos.tasks.probe_duration', return_value=10)
+    @mock.patch('videos.tasks.run_ffmpeg', side_effect=write_outputs)
+    def test_previews_uploaded_to_storage(self, mock_run, mock_probe):
+        """Test that poster, sprite sheets and seek preview index are stored next to the source"""
+        convert_video_renditions('videos/source.mp4', RENDITIONS, previews=True)
+
+        directories, files = default_storage.listdir('videos/source_mp4_previews')
+        self.assertEqual(sorted(files), ['poster.jpg', 'sprite_001.jpg', 'thumbnails.vtt'])
+
+    def test_failed_conversion_not_uploaded(self):
+        """Test that nothing is stored and the workspace is removed when the conversion fails"""
+        with self.assertRaises(ValueError):
+            with workspace() as work:
+                location = work.location
+                with open(work.path('videos/source_480p.mp4'), 'wb') as file:
+                    file.write(b'partial')
+                raise ValueError
+
+        self.assertFalse(default_storage.exists('videos/source_480p.mp4'))
+        self.assertFalse(os.path.exists(location))
+
+class LocalWorkspaceTest(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_outputs_stored_once_complete(self):
+        """Test that an output written to a local storage only appears under its name once the conversion finished"""
+        with workspace() as work:
+            with open(work.path('videos/source_480p.mp4'), 'wb') as file:
+                file.write(b'partial')
+            self.assertFalse(default_storage.exists('videos/source_480p.mp4'))
+            self.assertTrue(work.location.startswith(self.media_root))
+
+        with default_storage.open('videos/source_480p.mp4') as file:
+            self.assertEqual(file.read(), b'partial')
+        self.assertFalse(os.path.exists(work.location))
+
+@override_settings(STORAGES=REMOTE_STORAGE)
+class RemoteStorageTest(TestCase):
+    def test_input_streamed_from_url(self):
+        """Test that ffmpeg gets the pre-signed URL instead of a downloaded copy"""
+        with readable('videos/source.mp4') as source:
+            self.assertEqual(source, 'https://bucket.example.com/videos/source.mp4?signature=abc')
+
+    @override_settings(MEDIA_URL_TTL=3600)
+    def test_media_request_redirected(self):
+        """Test that media requests are redirected to the object store"""
+        response = self.client.get(f'/media/{signed_name("videos/source.mp4", url_expiry())}')
+
+        self.assertRedirects(response, 'https://bucket.example.com/videos/source.mp4?signature=abc', fetch_redirect_response=False)
+
+    @mock.patch('django_rq.get_queue')
+    def test_delete_removes_stored_artifacts(self, mock_get_queue):
+        """Test that deleting a video removes its source, renditions and previews from the storage"""
+        video = Video.objects.create(title="Stored", file=ContentFile(b'stored_content', name='stored.mp4'))
+        source = video.file.name
+        default_storage.save(rendition_path(source, '480p'), ContentFile(b'rendition'))
+        default_storage.save(f'{previews_dir(source)}/thumbnails.vtt', ContentFile(b'WEBVTT'))
+
+        delete_videos(self, video)
+
+        self.assertEqual(default_storage.listdir('videos')[1], [])
+        self.assertEqual(default_storage.listdir(previews_dir(source))[1], [])
+
+
+class ArtifactNamesMigrationTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, VIDEO_RENDITIONS={'480p': {'height': 480}})
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def save(self, name):
+        default_storage.save(name, ContentFile(name.encode()))
+        return name
+
+    @mock.patch('django_rq.get_queue')
+    def create_video(self, name, mock_get_queue, **fields):
+        video = Video.objects.create(title=name, file=self.save(name))
+        Video.objects.filter(pk=video.pk).update(**fields)
+        return video
+
+    def test_artifacts_moved_to_names_with_extension(self):
+        """Test that existing renditions, HLS ladders, previews and thumbnail variants move to the names keeping the extension"""
+        variant = self.save('videos/a_previews/poster_previews/thumbnail_320.webp')
+        video = self.create_video(
+            'videos/a.mp4', thumbnail=self.save('videos/a_previews/poster.jpg'),
+            seek_previews=self.save('videos/a_previews/thumbnails.vtt'),
+            thumbnail_srcset={'source': 'videos/a_previews/poster.jpg', 'variants': {'image/webp': [[320, variant]]}},
+        )
+        self.save('videos/a_480p.mp4')
+        self.save('videos/a_hls/480p/segment_000.ts')
+        shared = self.save('thumbnails/poster_previews/thumbnail_320.webp')
+        first = self.create_video('videos/b.mp4', thumbnail=self.save('thumbnails/poster.jpg'), thumbnail_srcset={
+            'source': 'thumbnails/poster.jpg', 'variants': {'image/webp': [[320, shared]]},
+        })
+        second = self.create_video('videos/c.mp4', thumbnail=self.save('thumbnails/poster.png'), thumbnail_srcset={
+            'source': 'thumbnails/poster.jpg', 'variants': {'image/webp': [[320, shared]]},
+        })
+
+        import_module('videos.migrations.0013_artifact_names').rename_artifacts(apps, None)
+
+        for name in ['videos/a_mp4_480p.mp4', 'videos/a_mp4_hls/480p/segment_000.ts', 'videos/a_mp4_previews/thumbnails.vtt']:
+            self.assertTrue(default_storage.exists(name), name)
+        directories, files = default_storage.listdir('videos')
+        self.assertEqual(sorted(directories), ['a_mp4_hls', 'a_mp4_previews'])
+        self.assertEqual(sorted(files), ['a.mp4', 'a_mp4_480p.mp4', 'b.mp4', 'c.mp4'])
+        video.refresh_from_db()
+        self.assertEqual(video.thumbnail.name, 'videos/a_mp4_previews/poster.jpg')
+        self.assertEqual(video.seek_previews.name, 'videos/a_mp4_previews/thumbnails.vtt')
+        self.assertEqual(video.thumbnail_srcset['variants']['image/webp'], [[320, 'videos/a_mp4_previews/poster_jpg_previews/thumbnail_320.webp']])
+        self.assertTrue(default_storage.exists('videos/a_mp4_previews/poster_jpg_previews/thumbnail_320.webp'))
+        first.refresh_from_db()
+        second.refresh_from_db()
+        self.assertEqual(first.thumbnail_srcset['variants']['image/webp'], [[320, 'thumbnails/poster_jpg_previews/thumbnail_320.webp']])
+        self.assertEqual(second.thumbnail_srcset, {})
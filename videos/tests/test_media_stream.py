@@ -0,0 +1,163 @@
+from django.core.files.storage import default_storage
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from videos.storage import signed_name, url_expiry
+import mock
+import os
+import shutil
+import tempfile
+import time
+
+SOURCE_DIR = 'videos/9f/' + '9f' * 32
+
+def signed_url(name, expires=None):
+    return '/media/' + signed_name(name, expires or url_expiry())
+
+class StreamMediaTest(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        os.makedirs(os.path.join(self.media_root, 'videos'))
+        self.content = bytes(range(256)) * 40
+        with open(os.path.join(self.media_root, 'videos', 'test_video.mp4'), 'wb') as file:
+            file.write(self.content)
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE='', MEDIA_URL_TTL=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.url = signed_url('videos/test_video.mp4')
+
+    def test_full_file_advertises_ranges(self):
+        """Test that a plain request returns the whole file and announces range support"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(b''.join(response.streaming_content), self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Type'], 'video/mp4')
+
+    def test_range_returns_partial_content(self):
+        """Test that a byte range is answered with 206 and only the requested bytes"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=1000-1999')
+
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), self.content[1000:2000])
+        self.assertEqual(response['Content-Range'], f'bytes 1000-1999/{len(self.content)}')
+        self.assertEqual(response['Content-Length'], '1000')
+
+    def test_open_and_suffix_ranges(self):
+        """Test that ranges without end and ranges counted from the end are supported"""
+        open_range = self.client.get(self.url, HTTP_RANGE='bytes=10000-')
+        suffix_range = self.client.get(self.url, HTTP_RANGE='bytes=-100')
+
+        self.assertEqual(b''.join(open_range.streaming_content), self.content[10000:])
+        self.assertEqual(b''.join(suffix_range.streaming_content), self.content[-100:])
+        self.assertEqual(suffix_range['Content-Range'], f'bytes {len(self.content) - 100}-{len(self.content) - 1}/{len(self.content)}')
+
+    def test_unsatisfiable_range(self):
+        """Test that a range behind the end of the file returns 416"""
+        response = self.client.get(self.url, HTTP_RANGE=f'bytes={len(self.content)}-')
+
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response['Content-Range'], f'bytes */{len(self.content)}')
+
+    def test_outside_media_root_not_found(self):
+        """Test that paths leaving MEDIA_ROOT and directories are not served"""
+        self.assertEqual(self.client.get(signed_url('../manage.py')).status_code, 404)
+        self.assertEqual(self.client.get(signed_url('videos/')).status_code, 404)
+        self.assertEqual(self.client.get(signed_url('videos/missing.mp4')).status_code, 404)
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_offload(self):
+        """Test that nginx gets the internal location instead of the file content"""
+        response = self.client.get(self.url, HTTP_RANGE='bytes=0-99')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/test_video.mp4')
+        self.assertEqual(response.content, b'')
+
+    @override_settings(MEDIA_SENDFILE='x-accel-redirect', MEDIA_ACCEL_REDIRECT_PREFIX='/protected-media/')
+    def test_accel_redirect_quotes_name(self):
+        """Test that nginx gets a URL quoted location for names with spaces and non-ASCII characters"""
+        with open(os.path.join(self.media_root, 'videos', 'test video ä.mp4'), 'wb') as file:
+            file.write(self.content)
+
+        response = self.client.get(signed_url('videos/test video ä.mp4'))
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['X-Accel-Redirect'], '/protected-media/videos/test%20video%20%C3%A4.mp4')
+
+    @override_settings(MEDIA_SENDFILE='x-sendfile')
+    def test_x_sendfile_offload(self):
+        """Test that Apache gets the absolute path of the file"""
+        response = self.client.get(self.url)
+
+        self.assertEqual(response['X-Sendfile'], os.path.join(self.media_root, 'videos', 'test_video.mp4'))
+
+class SignedMediaUrlTest(SimpleTestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        for name in ('videos/test_video.mp4', 'videos/test_video_mp4_hls/480p/segment_000.ts', f'{SOURCE_DIR}/source.mp4', f'{SOURCE_DIR}/source_mp4_hls/480p/segment_000.ts'):
+            os.makedirs(os.path.dirname(os.path.join(self.media_root, name)), exist_ok=True)
+            with open(os.path.join(self.media_root, name), 'wb') as file:
+                file.write(b'content')
+
+        settings_override = override_settings(MEDIA_ROOT=self.media_root, MEDIA_SENDFILE='', MEDIA_URL_TTL=3600)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def test_unsigned_and_tampered_urls_forbidden(self):
+        """Test that media is only served with a valid signature for the requested file"""
+        url = signed_url('videos/test_video.mp4')
+
+        self.assertEqual(self.client.get('/media/videos/test_video.mp4').status_code, 403)
+        self.assertEqual(self.client.get(url.replace('test_video', 'other_video')).status_code, 403)
+        self.assertEqual(self.client.get(url).status_code, 200)
+
+    def test_expired_url_forbidden(self):
+        """Test that a signed URL stops working after its expiry"""
+        expires = int(time.time()) - 1
+
+        self.assertEqual(self.client.get(signed_url('videos/test_video.mp4', expires)).status_code, 403)
+
+    def test_signature_covers_content_addressed_directory(self):
+        """Test that files derived from a content addressed source share the signature of its URL"""
+        source_url = signed_url(f'{SOURCE_DIR}/source.mp4')
+        segment_url = source_url.replace('source.mp4', 'source_mp4_hls/480p/segment_000.ts')
+        escaped_url = source_url.replace('source.mp4', '../../../videos/test_video.mp4')
+
+        self.assertEqual(self.client.get(segment_url).status_code, 200)
+        self.assertEqual(self.client.get(escaped_url).status_code, 403)
+
+    def test_signature_covers_files_converted_from_legacy_source(self):
+        """Test that files converted from a source outside a content addressed directory share the signature of its URL"""
+        source_url = signed_url('videos/test_video.mp4')
+        segment_url = source_url.replace('test_video.mp4', 'test_video_mp4_hls/480p/segment_000.ts')
+        escaped_url = source_url.replace('test_video.mp4', 'test_video_mp4_hls/../../' + SOURCE_DIR + '/source.mp4')
+
+        self.assertEqual(self.client.get(segment_url).status_code, 200)
+        self.assertEqual(self.client.get(escaped_url).status_code, 403)
+        self.assertEqual(self.client.get(signed_url('videos/test_video_mp4_hls/480p/segment_000.ts')).status_code, 200)
+
+    def test_content_addressed_files_cached_until_expiry(self):
+        """Test that only files below a content addressed directory are cached, and only until their URL expires"""
+        with mock.patch('time.time', return_value=1_000_000):
+            response = self.client.get(signed_url(f'{SOURCE_DIR}/source.mp4', 1_000_600))
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=600, immutable')
+        self.assertNotIn('Cache-Control', self.client.get(signed_url('videos/test_video.mp4')))
+
+    @override_settings(MEDIA_URL_TTL=0)
+    def test_unsigned_content_addressed_files_cached_for_a_year(self):
+        """Test that files below a content addressed directory are cached for a year without signed URLs"""
+        response = self.client.get(f'/media/{SOURCE_DIR}/source.mp4')
+
+        self.assertEqual(response['Cache-Control'], 'public, max-age=31536000, immutable')
+
+    @override_settings(MEDIA_URL_TTL=0)
+    def test_unsigned_urls_without_ttl(self):
+        """Test that media URLs are neither signed nor checked if MEDIA_URL_TTL is 0"""
+        self.assertEqual(default_storage.url('videos/test_video.mp4'), '/media/videos/test_video.mp4')
+        self.assertEqual(self.client.get('/media/videos/test_video.mp4').status_code, 200)
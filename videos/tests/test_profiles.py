@@ -0,0 +1,55 @@
+from django.core.exceptions import ImproperlyConfigured
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from videos.profiles import audio_args, get_profile, video_args
+
+PROFILES = {
+    'default': {},
+    'capped': {'preset': 'veryfast', 'crf': None, 'bitrate': '1000k', 'maxrate': '1200k', 'keyframe_interval': 4},
+    'nvenc': {'codec': 'h264_nvenc', 'preset': 'p4', 'crf': 25},
+    'film': {'audio_codec': 'libopus', 'audio_bitrate': '64k', 'extra_args': ['-tune', 'film']},
+}
+
+@override_settings(VIDEO_ENCODER_PROFILES=PROFILES)
+class EncoderProfileTest(SimpleTestCase):
+    def test_missing_keys_use_defaults(self):
+        """Test that a profile only has to declare what differs from the defaults"""
+        args = video_args(get_profile('default'))
+
+        self.assertEqual(args[:6], ['-c:v', 'libx264', '-preset:v', 'medium', '-crf:v', '23'])
+        self.assertIn('expr:gte(t,n_forced*2)', args)
+
+    def test_unknown_profile(self):
+        """Test that selecting an unregistered profile is a configuration error"""
+        with self.assertRaises(ImproperlyConfigured):
+            get_profile('missing')
+
+    def test_bitrate_cap(self):
+        """Test that bitrate, maxrate and bufsize are set for capped profiles"""
+        args = video_args(get_profile('capped'), ':v:1')
+
+        self.assertNotIn('-crf:v:1', args)
+        self.assertEqual(args[args.index('-b:v:1') + 1], '1000k')
+        self.assertEqual(args[args.index('-maxrate:v:1') + 1], '1200k')
+        self.assertEqual(args[args.index('-bufsize:v:1') + 1], '1200k')
+        self.assertIn('expr:gte(t,n_forced*4)', args)
+
+    def test_keyframe_interval_override(self):
+        """Test that callers can align keyframes regardless of the profile"""
+        args = video_args(get_profile('capped'), keyframe_interval=6)
+
+        self.assertIn('expr:gte(t,n_forced*6)', args)
+
+    def test_hardware_encoder_quality_option(self):
+        """Test that constant quality maps to the option the encoder understands"""
+        args = video_args(get_profile('nvenc'))
+
+        self.assertEqual(args[args.index('-cq:v') + 1], '25')
+        self.assertNotIn('-crf:v', args)
+
+    def test_audio_and_extra_args(self):
+        """Test audio settings and extra encoder arguments"""
+        profile = get_profile('film')
+
+        self.assertEqual(audio_args(profile), ['-c:a', 'libopus', '-b:a', '64k'])
+        self.assertEqual(video_args(profile)[-2:], ['-tune', 'film'])
@@ -0,0 +1,109 @@
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase
+from videos.models import Video, TranscodeJob
+from videos.tests.test_file_cleanup import delete_videos
+from videos.tasks import schedule_conversion, update_transcode_jobs, transcode_jobs
+from django.core.files.uploadedfile import SimpleUploadedFile
+import glob
+import hashlib
+import mock
+import os
+
+class SourceDeduplicationTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        mock_get_queue.return_value = mock.MagicMock()
+
+        self.original = self.create_video("Original", b'master_content')
+        self.original.transcode_jobs.filter(rendition='preview').update(status=TranscodeJob.Status.DONE, progress=100)
+        Video.objects.filter(pk=self.original.pk).update(duration=14, height=720, seek_previews='videos/master_previews/thumbnails.vtt')
+
+    def tearDown(self):
+        delete_videos(self, Video.objects.all())
+
+    def create_video(self, title, content, thumbnail=True):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Video.objects.create(
+                title=title,
+                file=SimpleUploadedFile('master.mp4', content, content_type='video/mp4'),
+                thumbnail=SimpleUploadedFile('thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg') if thumbnail else '',
+            )
+
+    def test_hash_stored_on_upload(self):
+        """Test that the SHA-256 of the uploaded source is stored on the video"""
+        self.assertEqual(self.original.source_sha256, hashlib.sha256(b'master_content').hexdigest())
+
+    def test_source_stored_under_hash(self):
+        """Test that the source is saved to the content addressed directory of its SHA-256"""
+        sha256 = self.original.source_sha256
+        self.assertEqual(self.original.file.name, f'videos/{sha256[:2]}/{sha256}/master.mp4')
+
+    @mock.patch('django_rq.get_queue')
+    def test_duplicate_reuses_file_and_conversion(self, mock_get_queue):
+        """Test that a re-upload points at the stored file and takes over the conversion state"""
+        duplicate = self.create_video("Re-upload", b'master_content', thumbnail=False)
+
+        duplicate.refresh_from_db()
+        self.assertEqual(duplicate.file.name, self.original.file.name)
+        self.assertEqual(glob.glob(os.path.join(os.path.dirname(self.original.file.path), 'master*.mp4')), [self.original.file.path])
+        self.assertEqual(duplicate.transcode_jobs.get(rendition='preview').status, TranscodeJob.Status.DONE)
+        self.assertEqual(duplicate.transcode_jobs.count(), self.original.transcode_jobs.count())
+        self.assertEqual(duplicate.duration, 14)
+        self.assertEqual(duplicate.seek_previews.name, 'videos/master_previews/thumbnails.vtt')
+        self.assertEqual(duplicate.thumbnail.name, self.original.thumbnail.name)
+        queued = [call[0][0] for call in mock_get_queue.return_value.enqueue.call_args_list]
+        self.assertNotIn(schedule_conversion, queued)
+
+    @mock.patch('django_rq.get_queue')
+    def test_failed_conversion_retried_for_duplicate(self, mock_get_queue):
+        """Test that a re-upload of a source whose conversion failed is converted again instead of sharing the failure"""
+        self.original.transcode_jobs.filter(rendition='720p').update(status=TranscodeJob.Status.FAILED, error='ffmpeg failed')
+
+        duplicate = self.create_video("Re-upload", b'master_content')
+
+        self.assertEqual(duplicate.file.name, self.original.file.name)
+        self.assertFalse(duplicate.transcode_jobs.exclude(status=TranscodeJob.Status.QUEUED).exists())
+        mock_get_queue.return_value.enqueue.assert_any_call(schedule_conversion, duplicate.file.name, video_id=duplicate.pk)
+
+        update_transcode_jobs(transcode_jobs(duplicate.pk, ['720p']), status=TranscodeJob.Status.DONE)
+        self.assertEqual(self.original.transcode_jobs.get(rendition='720p').status, TranscodeJob.Status.DONE)
+
+    @mock.patch('django_rq.get_queue')
+    def test_different_source_converted(self, mock_get_queue):
+        """Test that a different source is stored and converted as usual"""
+        other = self.create_video("Other", b'other_content')
+
+        self.assertNotEqual(other.file.name, self.original.file.name)
+        mock_get_queue.return_value.enqueue.assert_any_call(schedule_conversion, other.file.name, video_id=other.pk)
+
+    @mock.patch('django_rq.get_queue')
+    def test_moved_upload_removed_for_duplicate(self, mock_get_queue):
+        """Test that a source already stored below MEDIA_ROOT is removed when it is a duplicate"""
+        name = default_storage.save('videos/finished_upload.mp4', ContentFile(b'master_content'))
+
+        duplicate = Video.objects.create(title="Finished upload", file=name)
+
+        self.assertEqual(duplicate.file.name, self.original.file.name)
+        self.assertFalse(default_storage.exists(name))
+
+    @mock.patch('django_rq.get_queue')
+    def test_progress_shared_by_duplicates(self, mock_get_queue):
+        """Test that the conversion of the original also updates the jobs of its duplicates"""
+        duplicate = self.create_video("Re-upload", b'master_content')
+
+        update_transcode_jobs(transcode_jobs(self.original.pk, ['720p']), status=TranscodeJob.Status.DONE)
+
+        self.assertEqual(duplicate.transcode_jobs.get(rendition='720p').status, TranscodeJob.Status.DONE)
+
+    @mock.patch('django_rq.get_queue')
+    def test_shared_file_kept_until_last_video_deleted(self, mock_get_queue):
+        """Test that deleting a duplicate keeps the source the other video still plays"""
+        duplicate = self.create_video("Re-upload", b'master_content')
+        path = self.original.file.path
+
+        delete_videos(self, self.original)
+        self.assertTrue(os.path.isfile(path))
+
+        delete_videos(self, duplicate)
+        self.assertFalse(os.path.isfile(path))
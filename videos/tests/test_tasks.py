@@ -0,0 +1,379 @@
+from django.conf import settings
+from django.test import SimpleTestCase
+from django.test.utils import override_settings
+from videos.storage import WORKSPACE_DIR
+from videos.tasks import (
+    build_hls_command, build_renditions_command, build_sprite_vtt, build_thumbnail_command, chunk_dir, convert_video_chunked, convert_video_hls,
+    convert_video_renditions, fit_renditions, hls_output_dir, job_timeout, previews_dir, probe_media, rendition_path,
+    run_ffmpeg, source_matches, split_video, stitch_renditions, transcode_chunk,
+)
+import glob
+import json
+import mock
+import os
+import subprocess
+
+def workspace_name(path):
+    """Storage name of an output written to a conversion workspace of the local storage."""
+    return os.path.relpath(path, os.path.join(settings.MEDIA_ROOT, WORKSPACE_DIR)).split(os.sep, 1)[1]
+
+RENDITIONS = {
+    '480p': {'height': 480},
+    '720p': {'height': 720},
+    '1080p': {'height': 1080},
+}
+
+HLS_RENDITIONS = {
+    '360p': {'height': 360, 'profile': 'low'},
+    '720p': {'height': 720, 'profile': 'high'},
+}
+
+PROFILES = {
+    'default': {},
+    'low': {'crf': None, 'bitrate': '800k', 'maxrate': '900k'},
+    'high': {'crf': None, 'bitrate': '2000k', 'maxrate': '2200k'},
+}
+
+class ConvertVideoRenditionsTest(SimpleTestCase):
+    def setUp(self):
+        self.source = '/media/videos/test_video.mp4'
+
+    def test_rendition_path(self):
+        """Test that renditions are named <name>_<extension>_<suffix>.mp4"""
+        self.assertEqual(rendition_path(self.source, '480p'), '/media/videos/test_video_mp4_480p.mp4')
+
+    def test_artifacts_of_similar_names_apart(self):
+        """Test that names sharing the part before their first dot or differing in the extension get their own artifacts"""
+        names = [
+            'thumbnails/Screenshot_2024-05-01_at_10.22.33.png', 'thumbnails/Screenshot_2024-05-01_at_10.47.02.png',
+            'thumbnails/poster.jpg', 'thumbnails/poster.v2.jpg', 'thumbnails/poster.png',
+        ]
+        self.assertEqual(len({previews_dir(name) for name in names}), len(names))
+        self.assertEqual(previews_dir('thumbnails/poster.v2.jpg'), 'thumbnails/poster.v2_jpg_previews')
+
+    @override_settings(VIDEO_ENCODER_PROFILES={'default': {}, 'fast': {'preset': 'ultrafast', 'crf': 30}})
+    def test_encoder_options_follow_rendition_profile(self):
+        """Test that each output is encoded with the profile of its rendition"""
+        renditions = {'360p': {'height': 360, 'profile': 'fast'}, '720p': {'height': 720}}
+        cmd = build_renditions_command(self.source, renditions)
+
+        fast_output = cmd[:cmd.index(rendition_path(self.source, '360p'))]
+        default_output = cmd[len(fast_output):]
+        self.assertEqual(fast_output[fast_output.index('-preset:v') + 1], 'ultrafast')
+        self.assertEqual(fast_output[fast_output.index('-crf:v') + 1], '30')
+        self.assertEqual(default_output[default_output.index('-preset:v') + 1], 'medium')
+        self.assertEqual(default_output[default_output.index('-crf:v') + 1], '23')
+
+    def test_one_decode_one_output_per_rendition(self):
+        """Test that all renditions are written by one command from one input"""
+        cmd = build_renditions_command(self.source, RENDITIONS)
+
+        self.assertEqual(cmd.count('-i'), 1)
+        filter_graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith('[0:v]split=3[v0][v1][v2]'))
+        self.assertIn('[v2]scale=-2:1080[v2out]', filter_graph)
+        for suffix in RENDITIONS:
+            self.assertIn(rendition_path(self.source, suffix), cmd)
+
+    @override_settings(VIDEO_RENDITIONS=RENDITIONS)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_defaults_to_configured_renditions(self, mock_run):
+        """Test that settings.VIDEO_RENDITIONS is used when no renditions are given"""
+        convert_video_renditions('videos/test_video.mp4')
+
+        mock_run.assert_called_once()
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(workspace_name(cmd[-1]), 'videos/test_video_mp4_1080p.mp4')
+
+SPRITE = {'interval': 5, 'width': 160, 'height': 90, 'columns': 2, 'rows': 2}
+
+class ProbeMediaTest(SimpleTestCase):
+    @mock.patch('videos.tasks.subprocess.run')
+    def test_metadata_from_ffprobe(self, mock_run):
+        """Test that format, streams and keyframe interval are read into Video field values"""
+        streams = {
+            'streams': [{'codec_type': 'video', 'codec_name': 'h264', 'width': 1280, 'height': 720, 'pix_fmt': 'yuv420p'},
+                        {'codec_type': 'audio', 'codec_name': 'aac'}],
+            'format': {'duration': '14.000000', 'bit_rate': '157328'},
+        }
+        packets = '0.000000,K__\n0.040000,___\n2.000000,K__\n4.000000,K__\n'
+        mock_run.side_effect = [mock.Mock(stdout=json.dumps(streams)), mock.Mock(stdout=packets)]
+
+        self.assertEqual(probe_media('/media/videos/a.mp4'), {
+            'duration': 14.0, 'width': 1280, 'height': 720, 'bitrate': 157328,
+            'video_codec': 'h264', 'audio_codec': 'aac', 'pix_fmt': 'yuv420p', 'keyframe_interval': 2.0,
+        })
+        self.assertIn('%+60', mock_run.call_args[0][0])
+
+    def test_only_sources_fitting_the_ladder_remuxed(self):
+        """Test that a source is only remuxed within the bitrate cap of the rendition and in 8 bit 4:2:0"""
+        options = {'height': 480, 'copy_maxrate': '2000k'}
+        metadata = {
+            'height': 480, 'bitrate': 1_500_000, 'video_codec': 'h264', 'audio_codec': 'aac',
+            'pix_fmt': 'yuv420p', 'keyframe_interval': 2.0,
+        }
+        self.assertTrue(source_matches(options, metadata))
+        self.assertFalse(source_matches(options, {**metadata, 'bitrate': 20_000_000}))
+        self.assertFalse(source_matches(options, {**metadata, 'bitrate': None}))
+        self.assertFalse(source_matches(options, {**metadata, 'pix_fmt': 'yuv420p10le'}))
+        self.assertFalse(source_matches({'height': 480}, metadata))
+
+    @mock.patch('videos.tasks.subprocess.run', side_effect=subprocess.CalledProcessError(1, ['ffprobe']))
+    def test_unreadable_source(self, mock_run):
+        """Test that a file ffprobe cannot read gives no metadata"""
+        self.assertEqual(probe_media('/media/videos/a.mp4'), {})
+
+    def test_upscales_left_out(self):
+        """Test that renditions above the source are dropped, the smallest is kept at source height"""
+        self.assertEqual(list(fit_renditions(RENDITIONS, 720)), ['480p', '720p'])
+        self.assertEqual(fit_renditions(RENDITIONS, 361), {'480p': {'height': 360}})
+        self.assertEqual(fit_renditions(RENDITIONS, None), RENDITIONS)
+
+    def test_matching_rendition_remuxed(self):
+        """Test that renditions marked copy are stream copied outside of the filter graph"""
+        renditions = {'480p': {'height': 480}, '720p': {'height': 720, 'copy': True}}
+        cmd = build_renditions_command('/media/videos/a.mp4', renditions)
+
+        self.assertTrue(cmd[cmd.index('-filter_complex') + 1].startswith('[0:v]split=1[v0]'))
+        self.assertEqual(cmd[-9:], [
+            '-map', '0:v:0', '-map', '0:a?', '-c', 'copy', '-movflags', '+faststart', '/media/videos/a_mp4_720p.mp4',
+        ])
+
+        cmd = build_renditions_command('/media/videos/a.mp4', {'720p': renditions['720p']})
+        self.assertNotIn('-filter_complex', cmd)
+
+@override_settings(VIDEO_SPRITE=SPRITE)
+class PreviewImagesTest(SimpleTestCase):
+    def setUp(self):
+        self.source = '/media/videos/test_video.mp4'
+        self.preview_dir = previews_dir(self.source)
+
+    def test_previews_from_the_rendition_decode(self):
+        """Test that poster and sprite sheets are extra outputs of the single rendition decode"""
+        cmd = build_renditions_command(self.source, RENDITIONS, self.preview_dir, poster_second=3)
+
+        self.assertEqual(cmd.count('-i'), 1)
+        filter_graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith(f'[0:v]split={len(RENDITIONS) + 2}'))
+        self.assertIn("[v3]select='gte(t\\,3)'[poster]", filter_graph)
+        self.assertIn('[v4]fps=1/5,', filter_graph)
+        self.assertIn('tile=2x2[sprite]', filter_graph)
+        self.assertEqual(cmd[-1], f'{self.preview_dir}/sprite_%03d.jpg')
+        self.assertIn(f'{self.preview_dir}/poster.jpg', cmd)
+
+    def test_no_previews_by_default(self):
+        """Test that chunk and ladder conversions do not produce preview images"""
+        cmd = build_renditions_command(self.source, RENDITIONS)
+
+        self.assertNotIn('[poster]', cmd)
+        self.assertTrue(cmd[cmd.index('-filter_complex') + 1].startswith(f'[0:v]split={len(RENDITIONS)}['))
+
+    def test_sprite_vtt_points_to_tiles(self):
+        """Test that every interval has a cue pointing at its tile, continuing on the next sheet"""
+        vtt = build_sprite_vtt(22)
+
+        self.assertTrue(vtt.startswith('WEBVTT\n'))
+        self.assertIn('00:00:00.000 --> 00:00:05.000\nsprite_001.jpg#xywh=0,0,160,90', vtt)
+        self.assertIn('00:00:15.000 --> 00:00:20.000\nsprite_001.jpg#xywh=160,90,160,90', vtt)
+        self.assertIn('00:00:20.000 --> 00:00:22.000\nsprite_002.jpg#xywh=0,0,160,90', vtt)
+        self.assertEqual(vtt.count('-->'), 5)
+
+class ThumbnailVariantsTest(SimpleTestCase):
+    def test_one_decode_every_width_and_format(self):
+        """Test that the thumbnail is decoded once and written in every width and format"""
+        cmd = build_thumbnail_command('/media/thumbnails/a.jpg', '/media/videos/a_previews', [320, 640])
+
+        self.assertEqual(cmd.count('-i'), 1)
+        filter_graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith('[0:v]split=2[t0][t1]'))
+        self.assertIn('[t1]scale=640:-2,split=2[t1avif][t1webp]', filter_graph)
+        outputs = [arg for arg in cmd if arg.startswith('/media/videos/')]
+        self.assertEqual(outputs, [
+            '/media/videos/a_previews/thumbnail_320.avif',
+            '/media/videos/a_previews/thumbnail_320.webp',
+            '/media/videos/a_previews/thumbnail_640.avif',
+            '/media/videos/a_previews/thumbnail_640.webp',
+        ])
+
+class JobTimeoutTest(SimpleTestCase):
+    @override_settings(VIDEO_TIMEOUT_FACTOR=2)
+    def test_timeout_derived_from_duration(self):
+        """Test that long sources get a timeout proportional to their duration"""
+        self.assertEqual(job_timeout('transcode', 7200), 14400)
+
+    def test_queue_default_is_the_minimum(self):
+        """Test that short or unknown durations fall back to the queue timeout"""
+        default = settings.RQ_QUEUES['transcode']['DEFAULT_TIMEOUT']
+
+        self.assertEqual(job_timeout('transcode', 1), default)
+        self.assertEqual(job_timeout('transcode'), default)
+        self.assertEqual(job_timeout('mail'), settings.RQ_QUEUES['mail']['DEFAULT_TIMEOUT'])
+
+class RunFfmpegTest(SimpleTestCase):
+    @mock.patch('videos.tasks.subprocess.Popen')
+    def test_progress_parsed_from_progress_output(self, mock_popen):
+        """Test that out_time_us is reported as a percentage of the duration"""
+        process = mock_popen.return_value
+        process.stdout = iter(['frame=10\n', 'out_time_us=2500000\n', 'out_time_us=N/A\n', 'out_time_us=10000000\n'])
+        process.wait.return_value = 0
+        progress = []
+
+        run_ffmpeg(['ffmpeg', '-i', 'in.mp4', 'out.mp4'], duration=10, on_progress=progress.append)
+
+        self.assertEqual(progress, [25, 100])
+        self.assertEqual(mock_popen.call_args[0][0][:4], ['ffmpeg', '-progress', 'pipe:1', '-nostats'])
+
+    @mock.patch('videos.tasks.subprocess.Popen')
+    def test_non_zero_exit_code_raises(self, mock_popen):
+        """Test that a failing ffmpeg run is not silently ignored"""
+        process = mock_popen.return_value
+        process.stdout = iter([])
+        process.wait.return_value = 1
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            run_ffmpeg(['ffmpeg', '-i', 'missing.mp4', 'out.mp4'])
+
+    @mock.patch('videos.tasks.subprocess.Popen')
+    def test_interrupted_run_kills_ffmpeg(self, mock_popen):
+        """Test that ffmpeg does not outlive a job interrupted while it runs"""
+        process = mock_popen.return_value
+        process.stdout = iter(['out_time_us=2500000\n'])
+        on_progress = mock.Mock(side_effect=KeyboardInterrupt)
+
+        with self.assertRaises(KeyboardInterrupt):
+            run_ffmpeg(['ffmpeg', '-i', 'in.mp4', 'out.mp4'], duration=10, on_progress=on_progress)
+
+        process.kill.assert_called_once()
+        process.wait.assert_called_once()
+
+@override_settings(VIDEO_RENDITIONS=RENDITIONS, VIDEO_CHUNK_SECONDS=60)
+class ConvertVideoChunkedTest(SimpleTestCase):
+    def setUp(self):
+        self.source = 'videos/test_video.mp4'
+        self.chunks = [f'{chunk_dir(self.source)}/chunk_{index:04d}.mp4' for index in range(3)]
+
+    @mock.patch('videos.tasks.django_rq.get_queue')
+    @mock.patch('videos.tasks.split_video')
+    def test_chunks_fan_out_to_separate_jobs(self, mock_split, mock_get_queue):
+        """Test that every chunk becomes its own job and the stitch job waits for all"""
+        mock_split.return_value = self.chunks
+        mock_queue = mock.MagicMock()
+        mock_get_queue.return_value = mock_queue
+
+        convert_video_chunked(self.source)
+
+        mock_split.assert_called_once_with(self.source, 60)
+        self.assertEqual(mock_queue.enqueue.call_count, len(self.chunks) + 1)
+        chunk_calls = mock_queue.enqueue.call_args_list[:-1]
+        self.assertEqual([call[0][1] for call in chunk_calls], self.chunks)
+        for call in chunk_calls:
+            self.assertEqual(call[0][0], transcode_chunk)
+            self.assertEqual(call[1]['job_timeout'], job_timeout('transcode', 60))
+
+        stitch_call = mock_queue.enqueue.call_args_list[-1]
+        self.assertEqual(stitch_call[0][:3], (stitch_renditions, self.source, self.chunks))
+        self.assertEqual(len(stitch_call[1]['depends_on']), len(self.chunks))
+
+    @mock.patch('videos.tasks.delete_tree')
+    @mock.patch('videos.tasks.convert_video_renditions')
+    @mock.patch('videos.tasks.django_rq.get_queue')
+    @mock.patch('videos.tasks.split_video')
+    def test_short_source_converted_directly(self, mock_split, mock_get_queue, mock_convert, mock_delete_tree):
+        """Test that a source fitting into one chunk is not fanned out"""
+        mock_split.return_value = self.chunks[:1]
+
+        convert_video_chunked(self.source)
+
+        mock_get_queue.assert_not_called()
+        mock_convert.assert_called_once_with(self.source, RENDITIONS, None)
+        mock_delete_tree.assert_called_once_with(chunk_dir(self.source))
+
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_split_output_captured(self, mock_run):
+        """Test that splitting runs through run_ffmpeg, which keeps the ffmpeg log out of the worker log"""
+        split_video(self.source, 60)
+
+        cmd = mock_run.call_args[0][0]
+        self.assertEqual(cmd[cmd.index('-f') + 1], 'segment')
+        self.assertEqual(cmd[cmd.index('-segment_time') + 1], '60')
+
+    @mock.patch('videos.tasks.delete_tree')
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_stitch_concatenates_without_reencoding(self, mock_run, mock_delete_tree):
+        """Test that chunks are joined per rendition with stream copy"""
+        with mock.patch('builtins.open', mock.mock_open()) as mock_file:
+            stitch_renditions(self.source, self.chunks)
+
+        self.assertEqual(mock_run.call_count, len(RENDITIONS))
+        for call, suffix in zip(mock_run.call_args_list, RENDITIONS):
+            cmd = call[0][0]
+            self.assertEqual(cmd[cmd.index('-f') + 1], 'concat')
+            self.assertEqual(cmd[cmd.index('-c') + 1], 'copy')
+            self.assertEqual(workspace_name(cmd[-1]), rendition_path(self.source, suffix))
+        written = ''.join(call[0][0] for call in mock_file().write.call_args_list)
+        self.assertIn(os.path.join(settings.MEDIA_ROOT, rendition_path(self.chunks[2], '1080p')), written)
+        mock_delete_tree.assert_called_once_with(chunk_dir(self.source))
+
+@override_settings(VIDEO_HLS_RENDITIONS=HLS_RENDITIONS, VIDEO_ENCODER_PROFILES=PROFILES)
+class ConvertVideoHlsTest(SimpleTestCase):
+    def setUp(self):
+        self.source = '/media/videos/test_video.mp4'
+        self.output_dir = hls_output_dir(self.source)
+
+    def test_output_dir_next_to_source(self):
+        """Test that the HLS ladder is written next to the source file"""
+        self.assertEqual(self.output_dir, '/media/videos/test_video_mp4_hls')
+
+    def test_single_decode_for_all_renditions(self):
+        """Test that the source is read once and split into every rendition"""
+        cmd = build_hls_command(self.source, self.output_dir)
+
+        self.assertEqual(cmd.count('-i'), 1)
+        filter_graph = cmd[cmd.index('-filter_complex') + 1]
+        self.assertTrue(filter_graph.startswith(f'[0:v]split={len(HLS_RENDITIONS)}'))
+        for index, options in enumerate(HLS_RENDITIONS.values()):
+            self.assertIn(f'scale=-2:{options["height"]}[v{index}out]', filter_graph)
+
+    def test_variant_profiles_and_aligned_keyframes(self):
+        """Test that every variant uses its own profile and keyframes follow the segments"""
+        cmd = build_hls_command(self.source, self.output_dir, segment_seconds=4)
+
+        self.assertEqual(cmd[cmd.index('-b:v:0') + 1], '800k')
+        self.assertEqual(cmd[cmd.index('-b:v:1') + 1], '2000k')
+        self.assertEqual(cmd[cmd.index('-force_key_frames:v:1') + 1], 'expr:gte(t,n_forced*4)')
+
+    def test_master_playlist_and_stream_map(self):
+        """Test that a master playlist references every rendition by name"""
+        cmd = build_hls_command(self.source, self.output_dir)
+
+        self.assertEqual(cmd[cmd.index('-f') + 1], 'hls')
+        self.assertEqual(cmd[cmd.index('-master_pl_name') + 1], 'master.m3u8')
+        stream_map = cmd[cmd.index('-var_stream_map') + 1]
+        for name in HLS_RENDITIONS:
+            self.assertIn(f'name:{name}', stream_map)
+        self.assertEqual(cmd[-1], f'{self.output_dir}/%v/index.m3u8')
+
+    def test_optional_audio_mapped(self):
+        """Test that the audio track is mapped optionally and left out of silent sources"""
+        cmd = build_hls_command(self.source, self.output_dir)
+        self.assertIn('0:a:0?', cmd)
+        self.assertNotIn('a:0', cmd)
+
+        cmd = build_hls_command(self.source, self.output_dir, audio=False)
+        self.assertNotIn('0:a:0?', cmd)
+        self.assertNotIn('-c:a:0', cmd)
+        self.assertEqual(cmd[cmd.index('-var_stream_map') + 1], ' '.join(f'v:{index},name:{name}' for index, name in enumerate(HLS_RENDITIONS)))
+
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_convert_video_hls_runs_ffmpeg_once(self, mock_run):
+        """Test that the whole ladder is produced by a single ffmpeg run"""
+        directories = []
+        mock_run.side_effect = lambda cmd, *args: directories.extend(
+            workspace_name(path) for path in glob.glob(os.path.join(settings.MEDIA_ROOT, WORKSPACE_DIR, '*', 'videos/test_video_mp4_hls/*'))
+        )
+
+        convert_video_hls('videos/test_video.mp4')
+
+        mock_run.assert_called_once()
+        self.assertEqual(mock_run.call_args[0][0][0], 'ffmpeg')
+        self.assertEqual(sorted(directories), [f'videos/test_video_mp4_hls/{name}' for name in sorted(HLS_RENDITIONS)])
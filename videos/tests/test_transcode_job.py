@@ -0,0 +1,259 @@
+from django.contrib import admin
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from videos.admin import VideoAdmin
+from videos.models import Video, TranscodeJob
+from videos.tasks import (
+    convert_thumbnail, convert_video_chunked, convert_video_hls, convert_video_renditions, schedule_conversion, transcode_chunk,
+    update_transcode_jobs, HLS_RENDITION,
+)
+from django.core.files.uploadedfile import SimpleUploadedFile
+import mock
+import subprocess
+
+RENDITIONS = {
+    '480p': {'height': 480},
+    '720p': {'height': 720},
+}
+
+@override_settings(VIDEO_RENDITIONS=RENDITIONS)
+class TranscodeJobTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        self.mock_queue = mock.MagicMock()
+        mock_get_queue.return_value = self.mock_queue
+
+        self.client = APIClient()
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video = Video.objects.create(
+                title="Test Video",
+                description="This is a test video",
+                file=SimpleUploadedFile('test_video.mp4', b'file_content', content_type='video/mp4'),
+                thumbnail=SimpleUploadedFile('test_thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg'),
+                genre="Action"
+            )
+        self.source = self.video.file.name
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    def job(self, rendition):
+        return TranscodeJob.objects.get(video=self.video, rendition=rendition)
+
+    def test_jobs_queued_on_upload(self):
+        """Test that a queued job is created for every rendition and the HLS ladder"""
+        renditions = set(self.video.transcode_jobs.values_list('rendition', flat=True))
+
+        self.assertEqual(renditions, {'preview', '480p', '720p', HLS_RENDITION})
+        self.assertFalse(self.video.transcode_jobs.exclude(status=TranscodeJob.Status.QUEUED).exists())
+        for call in self.mock_queue.enqueue.call_args_list:
+            self.assertEqual(call[1]['video_id'], self.video.pk)
+
+    def test_conversion_scheduled_on_preview_queue(self):
+        """Test that the upload only queues the scheduling job on the high priority queue"""
+        call = self.mock_queue.enqueue.call_args_list[0]
+
+        self.assertEqual(call[0], (schedule_conversion, self.source))
+
+    @override_settings(VIDEO_TIMEOUT_FACTOR=3)
+    @mock.patch('videos.tasks.probe_media', return_value={'duration': 7200})
+    @mock.patch('videos.tasks.django_rq.get_queue')
+    def test_preview_queued_before_ladder(self, mock_get_queue, mock_probe):
+        """Test that the preview goes to the high priority queue and the ladder to the bulk queue"""
+        queues = {'preview': mock.MagicMock(), 'transcode': mock.MagicMock()}
+        mock_get_queue.side_effect = lambda name, **kwargs: queues[name]
+
+        schedule_conversion(self.source, self.video.pk)
+
+        preview_call = queues['preview'].enqueue.call_args
+        self.assertEqual(preview_call[0][0], convert_video_renditions)
+        self.assertEqual(preview_call[0][2], {'preview': {'height': 360, 'profile': 'fast'}})
+        self.assertTrue(preview_call[1]['previews'])
+        self.assertEqual(preview_call[1]['job_timeout'], 7200 * 3)
+        ladder_calls = queues['transcode'].enqueue.call_args_list
+        self.assertEqual([call[0][0] for call in ladder_calls], [convert_video_chunked, convert_video_hls])
+        self.assertEqual([call[1]['job_timeout'] for call in ladder_calls], [7200 * 3, 7200 * 3])
+
+    @override_settings(VIDEO_RENDITIONS={**RENDITIONS, '480p': {'height': 480, 'copy_maxrate': '2000k'}})
+    @mock.patch('videos.tasks.django_rq.get_queue')
+    def test_probed_source_decides_renditions(self, mock_get_queue):
+        """Test that the metadata is stored, upscales are skipped and a matching source is remuxed"""
+        metadata = {
+            'duration': 42.0, 'width': 854, 'height': 480, 'bitrate': 1200000,
+            'video_codec': 'h264', 'audio_codec': 'aac', 'pix_fmt': 'yuv420p', 'keyframe_interval': 2.0,
+        }
+        with mock.patch('videos.tasks.probe_media', return_value=metadata):
+            schedule_conversion(self.source, self.video.pk)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.height, 480)
+        self.assertEqual(self.video.video_codec, 'h264')
+        self.assertEqual(self.video.keyframe_interval, 2.0)
+        renditions = set(self.video.transcode_jobs.values_list('rendition', flat=True))
+        self.assertEqual(renditions, {'preview', '480p', HLS_RENDITION})
+        calls = {call[0][0]: call for call in mock_get_queue.return_value.enqueue.call_args_list}
+        self.assertEqual(calls[convert_video_chunked][0][2], {'480p': {'height': 480, 'copy_maxrate': '2000k', 'copy': True}})
+        self.assertEqual(list(calls[convert_video_hls][0][3]), ['480p'])
+        self.assertTrue(calls[convert_video_hls][1]['audio'])
+        self.assertNotIn('copy', calls[convert_video_renditions][0][2]['preview'])
+
+    @mock.patch('videos.tasks.probe_duration', return_value=10)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_successful_conversion_marked_done(self, mock_run, mock_probe):
+        """Test that progress is stored while running and the job ends up done"""
+        def fake_run(cmd, duration, on_progress):
+            on_progress(42.5)
+            self.assertEqual(self.job('480p').status, TranscodeJob.Status.RUNNING)
+            self.assertEqual(self.job('480p').progress, 42)
+        mock_run.side_effect = fake_run
+
+        convert_video_renditions(self.source, RENDITIONS, self.video.pk)
+
+        for rendition in RENDITIONS:
+            job = self.job(rendition)
+            self.assertEqual(job.status, TranscodeJob.Status.DONE)
+            self.assertEqual(job.progress, 100)
+            self.assertIsNotNone(job.duration)
+        self.assertEqual(self.job(HLS_RENDITION).status, TranscodeJob.Status.QUEUED)
+
+    @mock.patch('videos.tasks.django_rq.get_queue')
+    @mock.patch('videos.tasks.probe_duration', return_value=10)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_preview_images_attached_to_video(self, mock_run, mock_probe, mock_get_queue):
+        """Test that the poster replaces a missing thumbnail and the seek preview index is stored"""
+        Video.objects.filter(pk=self.video.pk).update(thumbnail='')
+
+        convert_video_renditions(self.source, RENDITIONS, self.video.pk, previews=True)
+
+        self.video.refresh_from_db()
+        self.assertTrue(self.video.thumbnail.name.endswith('_previews/poster.jpg'))
+        self.assertTrue(self.video.seek_previews.name.endswith('_previews/thumbnails.vtt'))
+        with open(self.video.seek_previews.path) as file:
+            self.assertTrue(file.read().startswith('WEBVTT'))
+        self.assertIn('[poster]', mock_run.call_args[0][0])
+        mock_get_queue.assert_called_once_with('thumbnails')
+        mock_get_queue.return_value.enqueue.assert_called_once_with(convert_thumbnail, video_id=self.video.pk)
+
+    @mock.patch('videos.tasks.probe_width', return_value=800)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_thumbnail_srcset_stored(self, mock_run, mock_probe):
+        """Test that the thumbnail variants are stored without widths above the thumbnail width"""
+        convert_thumbnail(video_id=self.video.pk)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.thumbnail_srcset['source'], self.video.thumbnail.name)
+        webp = self.video.thumbnail_srcset['variants']['image/webp']
+        self.assertEqual([width for width, name in webp], [320, 640])
+        self.assertTrue(webp[0][1].endswith('_previews/thumbnail_320.webp'))
+        self.assertIn('image/avif', self.video.thumbnail_srcset['variants'])
+
+        response = self.client.get(reverse('video-detail', kwargs={'pk': self.video.pk}))
+        self.assertRegex(response.data['thumbnail_srcset']['image/webp'], r'^/media/\S+_320\.webp 320w, /media/\S+_640\.webp 640w$')
+
+    @mock.patch('videos.tasks.probe_width', return_value=800)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_replaced_thumbnail_srcset_not_stored(self, mock_run, mock_probe):
+        """Test that variants of a thumbnail replaced during the conversion are discarded"""
+        mock_run.side_effect = lambda cmd: Video.objects.filter(pk=self.video.pk).update(thumbnail='thumbnails/new.jpg')
+
+        convert_thumbnail(video_id=self.video.pk)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.thumbnail_srcset, {})
+
+    @mock.patch('videos.admin.queue_thumbnail_conversion')
+    def test_admin_drops_srcset_of_replaced_thumbnail(self, mock_queue_conversion):
+        """Test that the variants of a thumbnail replaced or cleared in the admin are not served anymore"""
+        video_admin = VideoAdmin(Video, admin.site)
+        for thumbnail in ('thumbnails/new.jpg', ''):
+            Video.objects.filter(pk=self.video.pk).update(thumbnail_srcset={'source': self.video.thumbnail.name, 'variants': {}})
+            self.video.refresh_from_db()
+            self.video.thumbnail = thumbnail
+
+            with self.captureOnCommitCallbacks(execute=True):
+                video_admin.save_model(None, self.video, mock.Mock(changed_data=['thumbnail']), change=True)
+
+            self.video.refresh_from_db()
+            self.assertEqual(self.video.thumbnail_srcset, {})
+        mock_queue_conversion.assert_called_once_with(self.video)
+
+    @mock.patch('django_rq.get_queue')
+    def test_conversion_queued_after_commit(self, mock_get_queue):
+        """Test that no worker can pick up the conversion of a video before the video is committed"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Video.objects.create(
+                title="Uncommitted", file=SimpleUploadedFile('other.mp4', b'other_content', content_type='video/mp4'),
+                thumbnail=SimpleUploadedFile('other.jpg', b'thumbnail_content', content_type='image/jpeg'),
+            )
+            mock_get_queue.return_value.enqueue.assert_not_called()
+
+        for callback in callbacks:
+            callback()
+        queued = [call[0][0] for call in mock_get_queue.return_value.enqueue.call_args_list]
+        self.assertEqual(queued, [schedule_conversion, convert_thumbnail])
+
+    def test_thumbnail_conversion_queued_on_upload(self):
+        """Test that an uploaded thumbnail is queued for conversion to its variants"""
+        self.mock_queue.enqueue.assert_any_call(convert_thumbnail, video_id=self.video.pk)
+
+    @mock.patch('videos.tasks.probe_duration', return_value=10)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_uploaded_thumbnail_kept(self, mock_run, mock_probe):
+        """Test that a manually uploaded thumbnail is not replaced by the poster"""
+        thumbnail = self.video.thumbnail.name
+
+        convert_video_renditions(self.source, RENDITIONS, self.video.pk, previews=True)
+
+        self.video.refresh_from_db()
+        self.assertEqual(self.video.thumbnail.name, thumbnail)
+
+    @mock.patch('videos.tasks.probe_duration', return_value=10)
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_failed_conversion_marked_failed(self, mock_run, mock_probe):
+        """Test that a non-zero ffmpeg exit code marks the jobs as failed"""
+        mock_run.side_effect = subprocess.CalledProcessError(1, ['ffmpeg'], stderr='Invalid data found')
+
+        with self.assertRaises(subprocess.CalledProcessError):
+            convert_video_renditions(self.source, RENDITIONS, self.video.pk)
+
+        job = self.job('720p')
+        self.assertEqual(job.status, TranscodeJob.Status.FAILED)
+        self.assertEqual(job.error, 'Invalid data found')
+        self.assertIsNotNone(job.finished_at)
+
+    @mock.patch('videos.tasks.run_ffmpeg')
+    def test_chunk_progress(self, mock_run):
+        """Test that chunked conversions report the share of finished chunks"""
+        self.video.transcode_jobs.update(chunks_total=4)
+
+        transcode_chunk(self.source, RENDITIONS, self.video.pk)
+
+        job = self.job('480p')
+        self.assertEqual(job.status, TranscodeJob.Status.RUNNING)
+        self.assertEqual(job.chunks_done, 1)
+        self.assertEqual(job.progress, 25)
+
+    def test_readiness_exposed_in_video_list(self):
+        """Test that the list endpoint reports rendition status and readiness"""
+        url = reverse('video-list') + '?fields=id,renditions,playable,ready'
+        response = self.client.get(url)
+        self.assertFalse(response.data['results'][0]['playable'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_transcode_jobs(self.video.transcode_jobs.filter(rendition='480p'), status=TranscodeJob.Status.DONE, progress=100)
+
+        response = self.client.get(url)
+
+        video = response.data['results'][0]
+        self.assertTrue(video['playable'])
+        self.assertFalse(video['ready'])
+        self.assertEqual(video['renditions']['480p'], {'status': 'done', 'progress': 100})
+        self.assertEqual(video['renditions']['720p'], {'status': 'queued', 'progress': 0})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            update_transcode_jobs(self.video.transcode_jobs.all(), status=TranscodeJob.Status.DONE)
+        response = self.client.get(url)
+        self.assertTrue(response.data['results'][0]['ready'])
@@ -0,0 +1,144 @@
+from django.core.cache import cache
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from videos.models import Video, TranscodeJob
+from videos.cache import CATALOG_VERSION_KEY, catalog_cache_key, get_catalog_version
+from videos.tasks import track_transcode, update_transcode_jobs
+from django.core.files.uploadedfile import SimpleUploadedFile
+import mock
+
+class VideoCatalogCacheTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        mock_get_queue.return_value = mock.MagicMock()
+
+        self.client = APIClient()
+        self.video = self.create_video("Test Video")
+        self.video_list_url = reverse('video-list')
+        self.video_detail_url = reverse('video-detail', kwargs={'pk': self.video.pk})
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    @mock.patch('django_rq.get_queue')
+    def create_video(self, title, mock_get_queue):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Video.objects.create(
+                title=title,
+                description="This is a test video",
+                file=SimpleUploadedFile('test_video.mp4', b'file_content', content_type='video/mp4'),
+                thumbnail=SimpleUploadedFile('test_thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg'),
+                genre="Action"
+            )
+
+    def test_repeated_list_request_served_from_cache(self):
+        """Test that a second list request does not hit the database"""
+        first = self.client.get(self.video_list_url)
+
+        with self.assertNumQueries(0):
+            second = self.client.get(self.video_list_url)
+
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual(second.data, first.data)
+
+    def test_repeated_detail_request_served_from_cache(self):
+        """Test that a second detail request does not hit the database"""
+        self.client.get(self.video_detail_url)
+
+        with self.assertNumQueries(0):
+            response = self.client.get(self.video_detail_url)
+
+        self.assertEqual(response.data['title'], "Test Video")
+
+    def test_query_parameters_cached_separately(self):
+        """Test that different pages of the list do not share a cache entry"""
+        self.create_video("Second Video")
+
+        first_page = self.client.get(self.video_list_url, {'page_size': 1})
+        full_page = self.client.get(self.video_list_url)
+
+        self.assertEqual(len(first_page.data['results']), 1)
+        self.assertEqual(len(full_page.data['results']), 2)
+
+    def test_missing_video_not_cached(self):
+        """Test that a 404 is not cached and the video shows up once it exists"""
+        url = reverse('video-detail', kwargs={'pk': self.video.pk + 1})
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+        self.create_video("Second Video")
+
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+    def test_created_video_invalidates_list(self):
+        """Test that a new video appears in the list right after it was created"""
+        self.client.get(self.video_list_url)
+
+        self.create_video("Second Video")
+        response = self.client.get(self.video_list_url)
+
+        self.assertEqual([video['title'] for video in response.data['results']], ["Second Video", "Test Video"])
+
+    def test_updated_video_invalidates_detail(self):
+        """Test that a changed video is not served from a stale cache entry"""
+        self.client.get(self.video_detail_url)
+
+        self.video.title = "Renamed Video"
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video.save()
+        response = self.client.get(self.video_detail_url)
+
+        self.assertEqual(response.data['title'], "Renamed Video")
+
+    def test_deleted_video_invalidates_list(self):
+        """Test that a deleted video disappears from the list"""
+        self.client.get(self.video_list_url)
+
+        with mock.patch('videos.cleanup.django_rq'), self.captureOnCommitCallbacks(execute=True):
+            self.video.delete()
+        response = self.client.get(self.video_list_url)
+
+        self.assertEqual(response.data['results'], [])
+
+    def test_conversion_progress_invalidates_detail(self):
+        """Test that a finished conversion is reported although the detail was cached"""
+        self.client.get(self.video_detail_url)
+        renditions = list(self.video.transcode_jobs.values_list('rendition', flat=True))
+
+        with self.captureOnCommitCallbacks(execute=True), track_transcode(self.video.id, renditions):
+            pass
+        response = self.client.get(self.video_detail_url)
+
+        self.assertTrue(response.data['ready'])
+        self.assertTrue(all(job['status'] == TranscodeJob.Status.DONE for job in response.data['renditions'].values()))
+
+    def test_uncommitted_change_keeps_version(self):
+        """Test that the version only moves once a change is committed"""
+        version = get_catalog_version()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.video.title = "Renamed Video"
+            self.video.save()
+            self.assertEqual(get_catalog_version(), version)
+
+        callbacks[-1]()
+        self.assertGreater(get_catalog_version(), version)
+
+    def test_progress_ticks_keep_version(self):
+        """Test that progress updates alone do not invalidate the cached catalog"""
+        jobs = self.video.transcode_jobs.all()
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            update_transcode_jobs(jobs, progress=42)
+
+        self.assertEqual(callbacks, [])
+
+    def test_evicted_version_does_not_revive_old_entries(self):
+        """Test that a lost catalog version starts over with a version that was never used"""
+        old_key = catalog_cache_key('list')
+
+        cache.delete(CATALOG_VERSION_KEY)
+
+        self.assertGreater(get_catalog_version(), 0)
+        self.assertNotEqual(catalog_cache_key('list'), old_key)
@@ -0,0 +1,64 @@
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from videos.models import Video
+from django.core.files.uploadedfile import SimpleUploadedFile
+import mock
+
+@override_settings(VIDEO_GENRE_LIMIT=2)
+class VideoGenreListViewTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        mock_get_queue.return_value = mock.MagicMock()
+
+        self.client = APIClient()
+        self.video_genres_url = reverse('video-genres')
+        self.videos = {
+            genre: [self.create_video(f'{genre} {index}', genre) for index in range(3)]
+            for genre in ('Drama', 'Action')
+        }
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    def create_video(self, title, genre):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Video.objects.create(
+                title=title,
+                file=SimpleUploadedFile('test_video.mp4', b'file_content', content_type='video/mp4'),
+                thumbnail=SimpleUploadedFile('test_thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg'),
+                genre=genre
+            )
+
+    def test_newest_videos_grouped_per_genre(self):
+        """Test that every genre holds its newest videos up to the configured limit"""
+        response = self.client.get(self.video_genres_url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([group['genre'] for group in response.data['results']], ['Action', 'Drama'])
+        for group in response.data['results']:
+            expected = [video.id for video in reversed(self.videos[group['genre']])][:2]
+            self.assertEqual([video['id'] for video in group['videos']], expected)
+
+    def test_limit_parameter(self):
+        """Test that clients can ask for a different number of videos per genre"""
+        response = self.client.get(self.video_genres_url, {'limit': 1, 'fields': 'id,title'})
+
+        for group in response.data['results']:
+            self.assertEqual(len(group['videos']), 1)
+            self.assertEqual(set(group['videos'][0]), {'id', 'title'})
+
+    def test_single_query(self):
+        """Test that the groups are read with one query besides Last-Modified"""
+        with self.assertNumQueries(2):
+            self.client.get(self.video_genres_url)
+
+    def test_conditional_get(self):
+        """Test that an unchanged genre overview is answered with 304"""
+        etag = self.client.get(self.video_genres_url)['ETag']
+
+        response = self.client.get(self.video_genres_url, HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
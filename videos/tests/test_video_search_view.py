@@ -0,0 +1,78 @@
+from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from videos.models import Video
+from django.core.files.uploadedfile import SimpleUploadedFile
+import mock
+
+class VideoSearchViewTest(TestCase):
+    @mock.patch('django_rq.get_queue')
+    def setUp(self, mock_get_queue):
+        mock_get_queue.return_value = mock.MagicMock()
+
+        self.client = APIClient()
+        self.video_search_url = reverse('video-search')
+
+        self.description_match = self.create_video("Ocean Life", "A documentary about sharks and whales", "Documentary")
+        self.title_match = self.create_video("Shark Attack", "A summer at the beach goes wrong", "Horror")
+        self.other = self.create_video("Mountain Trip", "Climbing the highest peaks", "Documentary")
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    def create_video(self, title, description, genre):
+        return Video.objects.create(
+            title=title,
+            description=description,
+            file=SimpleUploadedFile('test_video.mp4', b'file_content', content_type='video/mp4'),
+            thumbnail=SimpleUploadedFile('test_thumbnail.jpg', b'thumbnail_content', content_type='image/jpeg'),
+            genre=genre
+        )
+
+    def search(self, text, **params):
+        return self.client.get(self.video_search_url, {'q': text, **params})
+
+    def test_title_matches_rank_first(self):
+        """Test that a match in the title ranks above a match in the description"""
+        response = self.search('sharks')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([video['id'] for video in response.data['results']], [self.title_match.id, self.description_match.id])
+
+    def test_genre_and_stemming(self):
+        """Test that genres are searched and words match their other forms"""
+        response = self.search('documentaries climb')
+
+        self.assertEqual([video['id'] for video in response.data['results']], [self.other.id])
+
+    def test_search_vector_follows_changes(self):
+        """Test that an edited video is found by its new title"""
+        self.other.title = "Glacier Expedition"
+        self.other.save()
+
+        self.assertEqual([video['id'] for video in self.search('glacier').data['results']], [self.other.id])
+        self.assertEqual(self.search('mountain').data['results'], [])
+
+    def test_pagination_follows_rank(self):
+        """Test that the next links walk through all matches in rank order"""
+        first_page = self.search('shark', page_size=1)
+        second_page = self.client.get(first_page.data['next'])
+
+        self.assertEqual(first_page.data['results'][0]['id'], self.title_match.id)
+        self.assertEqual(second_page.data['results'][0]['id'], self.description_match.id)
+        self.assertIsNone(second_page.data['next'])
+
+    def test_missing_query_rejected(self):
+        """Test that a search without q returns 400"""
+        response = self.client.get(self.video_search_url)
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('q', response.data)
+
+    def test_search_not_in_catalog_representation(self):
+        """Test that the search index is never serialized"""
+        detail = self.client.get(reverse('video-detail', kwargs={'pk': self.other.pk}))
+
+        self.assertNotIn('search_vector', detail.data)
+        self.assertEqual(self.search('shark', fields='search_vector').status_code, status.HTTP_400_BAD_REQUEST)
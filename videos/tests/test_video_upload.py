@@ -0,0 +1,180 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+from django.test.utils import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from user_auth.models import User
+from videos.models import Video, VideoUpload
+from videos.uploads import finish_upload, merge_range, staging_path
+import hashlib
+import mock
+import os
+import shutil
+import tempfile
+
+class VideoUploadTest(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.admin = User.objects.create_user(username='admin', email='admin@example.com', password='secret', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(self.admin)
+        self.content = os.urandom(3000)
+
+    def tearDown(self):
+        Video.objects.all().delete()
+
+    def create_upload(self, **data):
+        data = {
+            'filename': 'Big Movie.mp4',
+            'length': len(self.content),
+            'title': 'Big Movie',
+            'genre': 'Action',
+            'thumbnail': SimpleUploadedFile('poster.jpg', b'thumbnail_content', content_type='image/jpeg'),
+            **data,
+        }
+        return self.client.post(reverse('video-upload-list'), data, format='multipart')
+
+    def send_chunk(self, upload_id, offset, chunk):
+        return self.client.patch(
+            reverse('video-upload', kwargs={'pk': upload_id}), chunk,
+            content_type='application/offset+octet-stream', HTTP_UPLOAD_OFFSET=str(offset),
+        )
+
+    def test_create_upload(self):
+        """Test that creating an upload returns its location and an empty offset"""
+        response = self.create_upload()
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response['Upload-Offset'], '0')
+        self.assertTrue(response['Location'].endswith(f'/uploads/{response.data["id"]}/'))
+        upload = VideoUpload.objects.get(pk=response.data['id'])
+        self.assertEqual(os.path.getsize(staging_path(upload)), len(self.content))
+
+    def test_chunks_in_any_order_then_finish(self):
+        """Test that chunks sent out of order are assembled and finished into a Video"""
+        upload_id = self.create_upload().data['id']
+
+        self.assertEqual(self.send_chunk(upload_id, 2000, self.content[2000:])['Upload-Offset'], '0')
+        self.assertEqual(self.send_chunk(upload_id, 0, self.content[:1000])['Upload-Offset'], '1000')
+        response = self.send_chunk(upload_id, 1000, self.content[1000:2000])
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(response['Upload-Offset'], str(len(self.content)))
+
+        with mock.patch('django_rq.get_queue') as mock_get_queue:
+            response = self.client.post(reverse('video-upload-finish', kwargs={'pk': upload_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertTrue(response['Location'].endswith(f'/uploads/{upload_id}/'))
+        self.assertIsNone(response.data['video'])
+        mock_get_queue.assert_called_once_with('preview', autocommit=True)
+        mock_get_queue.return_value.enqueue.assert_called_once_with(finish_upload, VideoUpload.objects.get().pk)
+        self.assertFalse(Video.objects.exists())
+
+        with mock.patch('django_rq.get_queue') as mock_get_queue, self.captureOnCommitCallbacks(execute=True):
+            finish_upload(upload_id)
+
+        video_id = self.client.get(reverse('video-upload', kwargs={'pk': upload_id})).data['video']
+        video = Video.objects.get(pk=video_id)
+        sha256 = hashlib.sha256(self.content).hexdigest()
+        self.assertEqual(video.file.name, f'videos/{sha256[:2]}/{sha256}/Big_Movie.mp4')
+        self.assertEqual(video.source_sha256, sha256)
+        self.assertEqual(video.title, 'Big Movie')
+        with open(video.file.path, 'rb') as file:
+            self.assertEqual(file.read(), self.content)
+        queued = [call[0][0].__name__ for call in mock_get_queue.return_value.enqueue.call_args_list]
+        self.assertEqual(queued, ['schedule_conversion', 'convert_thumbnail'])
+
+        with mock.patch('django_rq.get_queue') as mock_get_queue:
+            self.assertEqual(finish_upload(upload_id), video)
+            response = self.client.post(reverse('video-upload-finish', kwargs={'pk': upload_id}))
+        self.assertEqual(response.data['video'], video.pk)
+        mock_get_queue.return_value.enqueue.assert_not_called()
+
+    def test_abort_finished_upload_keeps_thumbnail(self):
+        """Test that deleting a finished upload leaves the thumbnail to its video"""
+        upload_id = self.create_upload().data['id']
+        self.send_chunk(upload_id, 0, self.content)
+        with mock.patch('django_rq.get_queue'), self.captureOnCommitCallbacks(execute=True):
+            video = finish_upload(upload_id)
+
+        response = self.client.delete(reverse('video-upload', kwargs={'pk': upload_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(VideoUpload.objects.exists())
+        video.refresh_from_db()
+        self.assertTrue(video.thumbnail.storage.exists(video.thumbnail.name))
+
+    def test_resume_reports_missing_ranges(self):
+        """Test that the state of an interrupted upload shows where to continue"""
+        upload_id = self.create_upload().data['id']
+        self.send_chunk(upload_id, 0, self.content[:500])
+        self.send_chunk(upload_id, 1000, self.content[1000:1500])
+
+        response = self.client.head(reverse('video-upload', kwargs={'pk': upload_id}))
+        self.assertEqual(response['Upload-Offset'], '500')
+        self.assertEqual(response['Upload-Length'], str(len(self.content)))
+
+        response = self.client.get(reverse('video-upload', kwargs={'pk': upload_id}))
+        self.assertEqual(response.data['received'], [[0, 500], [1000, 1500]])
+
+    def test_finish_incomplete_upload_conflicts(self):
+        """Test that an upload with missing bytes cannot be finished"""
+        upload_id = self.create_upload().data['id']
+        self.send_chunk(upload_id, 0, self.content[:100])
+
+        response = self.client.post(reverse('video-upload-finish', kwargs={'pk': upload_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response['Upload-Offset'], '100')
+        self.assertFalse(Video.objects.exists())
+
+    def test_invalid_chunks_rejected(self):
+        """Test that chunks outside the upload, without offset or with another type are rejected"""
+        upload_id = self.create_upload().data['id']
+
+        self.assertEqual(self.send_chunk(upload_id, 2999, b'xx').status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.send_chunk(upload_id, 'start', b'xx').status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.patch(reverse('video-upload', kwargs={'pk': upload_id}), {'chunk': 'xx'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    @override_settings(VIDEO_UPLOAD_MAX_SIZE=1000)
+    def test_upload_size_limited(self):
+        """Test that uploads larger than VIDEO_UPLOAD_MAX_SIZE are refused up front"""
+        response = self.create_upload()
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('length', response.data)
+
+    def test_abort_removes_staging_file(self):
+        """Test that deleting an upload removes the received data"""
+        upload_id = self.create_upload().data['id']
+        path = staging_path(VideoUpload.objects.get(pk=upload_id))
+
+        response = self.client.delete(reverse('video-upload', kwargs={'pk': upload_id}))
+
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(os.path.exists(path))
+        self.assertFalse(VideoUpload.objects.exists())
+
+    def test_only_staff_and_owner(self):
+        """Test that regular users cannot upload and staff users only see their own uploads"""
+        upload_id = self.create_upload().data['id']
+        user = User.objects.create_user(username='user', email='user@example.com', password='secret')
+        other_admin = User.objects.create_user(username='other', email='other@example.com', password='secret', is_staff=True)
+
+        self.client.force_authenticate(user)
+        self.assertEqual(self.create_upload().status_code, status.HTTP_403_FORBIDDEN)
+        self.client.force_authenticate(other_admin)
+        self.assertEqual(self.send_chunk(upload_id, 0, b'xx').status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_merge_range(self):
+        """Test that overlapping and adjacent ranges are merged"""
+        self.assertEqual(merge_range([[0, 10], [20, 30]], 10, 20), [[0, 30]])
+        self.assertEqual(merge_range([[0, 10]], 5, 8), [[0, 10]])
+        self.assertEqual(merge_range([[20, 30]], 0, 5), [[0, 5], [20, 30]])
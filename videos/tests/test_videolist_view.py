@@ -3,7 +3,7 @@ from django.urls import reverse
 from rest_framework.test import APIClient
 from rest_framework import status
 from videos.models import Video
-from videos.api.serializers import VideoListSerializer
+from videos.api.serializers import VideoCatalogSerializer, VideoListSerializer
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.dispatch import Signal
 from django.test.utils import override_settings
@@ -30,30 +30,31 @@ class VideoListViewTest(TestCase):
             content_type='image/jpeg'
         )
         
-        self.video1 = Video.objects.create(
-            title="Test Video 1",
-            description="Description 1",
-            file=self.video_file,
-            thumbnail=self.thumbnail_file,
-            genre="Action"
-        )
-        
-        self.video2 = Video.objects.create(
-            title="Test Video 2",
-            description="Description 2",
-            file=self.video_file,
-            thumbnail=self.thumbnail_file,
-            genre="Comedy"
-        )
-        
-        self.video3 = Video.objects.create(
-            title="Test Video 3",
-            description="Description 3",
-            file=self.video_file,
-            thumbnail=self.thumbnail_file,
-            genre="Drama"
-        )
-        
+        with self.captureOnCommitCallbacks(execute=True):
+            self.video1 = Video.objects.create(
+                title="Test Video 1",
+                description="Description 1",
+                file=self.video_file,
+                thumbnail=self.thumbnail_file,
+                genre="Action"
+            )
+
+            self.video2 = Video.objects.create(
+                title="Test Video 2",
+                description="Description 2",
+                file=self.video_file,
+                thumbnail=self.thumbnail_file,
+                genre="Comedy"
+            )
+
+            self.video3 = Video.objects.create(
+                title="Test Video 3",
+                description="Description 3",
+                file=self.video_file,
+                thumbnail=self.thumbnail_file,
+                genre="Drama"
+            )
+
         self.videos = [self.video1, self.video2, self.video3]
 
     def tearDown(self):
@@ -65,27 +66,28 @@ class VideoListViewTest(TestCase):
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
-        self.assertEqual(len(response.data), 3)
+        self.assertEqual(len(response.data['results']), 3)
+        self.assertIsNone(response.data['next'])
         
         expected_titles = set(video.title for video in self.videos)
-        response_titles = set(video['title'] for video in response.data)
+        response_titles = set(video['title'] for video in response.data['results'])
         self.assertEqual(expected_titles, response_titles)
     
     def test_video_list_structure(self):
         """Test the structure of the returned video list"""
         response = self.client.get(self.video_list_url)
         
-        self.assertIsInstance(response.data, list)
+        self.assertIsInstance(response.data['results'], list)
         
-        first_video = response.data[0]
+        first_video = response.data['results'][0]
         self.assertIn('id', first_video)
         self.assertIn('title', first_video)
-        self.assertIn('description', first_video)
-        self.assertIn('file', first_video)
         self.assertIn('thumbnail', first_video)
         self.assertIn('genre', first_video)
         self.assertIn('uploaded_at', first_video)
-        self.assertIn('updated_at', first_video)
+        self.assertIn('playable', first_video)
+        self.assertNotIn('description', first_video)
+        self.assertNotIn('file', first_video)
         
     def test_serializer_fields(self):
         """Test that the serializer includes all expected fields"""
@@ -109,11 +111,86 @@ class VideoListViewTest(TestCase):
         mock_queue = mock.MagicMock()
         mock_get_queue.return_value = mock_queue
         
-        Video.objects.all().delete()
+        with mock.patch('videos.cleanup.django_rq'), self.captureOnCommitCallbacks(execute=True):
+            Video.objects.all().delete()
         
         response = self.client.get(self.video_list_url)
         
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         
-        self.assertEqual(len(response.data), 0)
-        self.assertEqual(response.data, [])
\ No newline at end of file
+        self.assertEqual(len(response.data['results']), 0)
+        self.assertEqual(response.data['results'], [])
+
+    def test_newest_videos_first(self):
+        """Test that the catalog is ordered by upload time, newest first"""
+        response = self.client.get(self.video_list_url)
+
+        response_ids = [video['id'] for video in response.data['results']]
+        self.assertEqual(response_ids, [self.video3.id, self.video2.id, self.video1.id])
+
+    @override_settings(VIDEO_MAX_PAGE_SIZE=2)
+    def test_page_size_is_capped(self):
+        """Test that clients cannot request pages larger than the maximum"""
+        response = self.client.get(self.video_list_url, {'page_size': 50})
+
+        self.assertEqual(len(response.data['results']), 2)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_cursor_walks_whole_catalog(self):
+        """Test that following the next links visits every video exactly once"""
+        Video.objects.update(uploaded_at=self.video1.uploaded_at)  # ties are broken by id
+        url = f'{self.video_list_url}?page_size=2'
+        seen = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen += [video['id'] for video in response.data['results']]
+            url = response.data['next']
+
+        self.assertEqual(seen, [self.video3.id, self.video2.id, self.video1.id])
+
+    def test_cursor_stable_when_videos_added(self):
+        """Test that new uploads do not shift the following pages"""
+        response = self.client.get(self.video_list_url, {'page_size': 1})
+        next_url = response.data['next']
+
+        with mock.patch('django_rq.get_queue'), self.captureOnCommitCallbacks(execute=True):
+            Video.objects.create(title="Newest Video", file=self.video_file, thumbnail=self.thumbnail_file)
+        response = self.client.get(next_url)
+
+        self.assertEqual(response.data['results'][0]['id'], self.video2.id)
+
+    def test_invalid_cursor(self):
+        """Test that a malformed cursor returns 404"""
+        response = self.client.get(self.video_list_url, {'cursor': 'not-a-cursor'})
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_fields_parameter_limits_serialized_fields(self):
+        """Test that ?fields= returns exactly the requested fields"""
+        response = self.client.get(self.video_list_url, {'fields': 'id,title,description'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for video in response.data['results']:
+            self.assertEqual(set(video), {'id', 'title', 'description'})
+
+    def test_fields_parameter_limits_loaded_columns(self):
+        """Test that only the columns of the requested fields are selected"""
+        queryset = VideoCatalogSerializer.select_columns(Video.objects.all(), ('title',))
+
+        self.assertEqual(queryset.query.deferred_loading, ({'id', 'uploaded_at', 'title'}, False))
+        self.assertEqual(queryset._prefetch_related_lookups, ())
+
+    def test_conversion_fields_prefetch_jobs(self):
+        """Test that the conversion state is loaded in one extra query for the whole page"""
+        with self.assertNumQueries(3):  # Last-Modified, the page and its conversion jobs
+            response = self.client.get(self.video_list_url, {'fields': 'id,renditions'})
+
+        self.assertEqual(len(response.data['results']), 3)
+
+    def test_unknown_field_rejected(self):
+        """Test that an unknown field name returns 400"""
+        response = self.client.get(self.video_list_url, {'fields': 'id,password'})
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('fields', response.data)
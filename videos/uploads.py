@@ -0,0 +1,115 @@
+import hashlib
+import os
+from django.conf import settings
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils.text import get_valid_filename
+from .models import Video, VideoUpload
+from .storage import content_addressed_name, store_file
+
+UPLOAD_DIR = os.path.join('videos', 'uploads')
+COPY_BUFFER_SIZE = 1024 * 1024
+
+def staging_path(upload):
+    """Path of the file an upload is written to until it is finished."""
+    return os.path.join(settings.MEDIA_ROOT, UPLOAD_DIR, f'{upload.pk}.part')
+
+def create_staging_file(upload):
+    """
+    Create the staging file of a new upload with its final size.
+
+    The file is sparse, so chunks can be written at any offset in any order
+    without allocating the disk space of the parts still missing.
+    """
+    os.makedirs(os.path.dirname(staging_path(upload)), exist_ok=True)
+    with open(staging_path(upload), 'wb') as file:
+        file.truncate(upload.length)
+
+def file_sha256(file):
+    """Hex SHA-256 of an uploaded or stored file, read in COPY_BUFFER_SIZE chunks."""
+    digest = hashlib.sha256()
+    for chunk in file.chunks(COPY_BUFFER_SIZE):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def merge_range(ranges, start, end):
+    """Add the byte range [start, end) to a list of ranges, merging overlapping and adjacent ones."""
+    merged = []
+    for first, last in sorted([*ranges, [start, end]]):
+        if merged and first <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+def write_chunk(upload, offset, stream, length):
+    """
+    Copy length bytes from stream into the staging file at offset.
+
+    The chunk is copied in small buffers straight from the request to disk and
+    whatever arrived is recorded, so a dropped connection only loses the rest
+    of the chunk. Returns the upload with the updated received ranges.
+    """
+    written = 0
+    with open(staging_path(upload), 'r+b') as file:
+        file.seek(offset)
+        while written < length:
+            data = stream.read(min(COPY_BUFFER_SIZE, length - written))
+            if not data:
+                break
+            file.write(data)
+            written += len(data)
+
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().get(pk=upload.pk)
+        if written:
+            upload.received = merge_range(upload.received, offset, offset + written)
+            upload.save(update_fields=['received', 'updated_at'])
+    return upload
+
+def finish_upload(upload_id):
+    """
+    Turn a complete upload into a Video, run in the preview queue.
+
+    The staging file is hashed and renamed into its content addressed directory below
+    MEDIA_ROOT/videos without copying it, or uploaded when media is kept on an object
+    store. Both take long for big files, so they run before the upload row is locked
+    and only creating the Video happens in the transaction. Creating the Video triggers
+    the conversion through video_post_save like an upload in the admin, the upload
+    keeps a reference to it so clients polling the upload find their video.
+    A file that was uploaded before is replaced by the existing one in deduplicate_source.
+    """
+    upload = VideoUpload.objects.get(pk=upload_id)
+    if upload.video_id:
+        return upload.video
+
+    with File(open(staging_path(upload), 'rb')) as file:
+        sha256 = file_sha256(file)
+    name = default_storage.get_available_name(content_addressed_name(sha256, get_valid_filename(upload.filename)))
+    store_file(staging_path(upload), name)
+
+    with transaction.atomic():
+        upload = VideoUpload.objects.select_for_update().get(pk=upload.pk)
+        upload.video = Video.objects.create(
+            title=upload.title,
+            description=upload.description,
+            genre=upload.genre,
+            file=name,
+            source_sha256=sha256,
+            thumbnail=upload.thumbnail.name,
+        )
+        upload.save(update_fields=['video', 'updated_at'])
+    return upload.video
+
+def abort_upload(upload):
+    """
+    Delete an upload together with its staging file and thumbnail.
+
+    The thumbnail of a finished upload belongs to its Video and is kept.
+    """
+    if os.path.isfile(staging_path(upload)):
+        os.remove(staging_path(upload))
+    if upload.thumbnail and not upload.video_id:
+        upload.thumbnail.delete(save=False)
+    upload.delete()
@@ -1,3 +1,141 @@
-from django.shortcuts import render
+import mimetypes
+import os
+import re
+import time
+from urllib.parse import quote
+from django.conf import settings
+from django.core.exceptions import PermissionDenied, SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.http import Http404, HttpResponse, HttpResponseNotModified, HttpResponseRedirect, StreamingHttpResponse
+from django.utils._os import safe_join
+from django.utils.http import http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+from .storage import is_content_addressed, is_local, valid_signature
 
-# Create your views here.
+RANGE_PATTERN = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+# Types of the HLS ladder that mimetypes does not know on every system
+mimetypes.add_type('application/vnd.apple.mpegurl', '.m3u8')
+mimetypes.add_type('video/mp2t', '.ts')
+
+def parse_range(header, size):
+    """
+    Return the (start, end) byte positions, both inclusive, requested by a Range header.
+
+    Returns None if the whole file should be sent (no header, several ranges or a
+    malformed header, which RFC 9110 allows to ignore) and raises ValueError if the
+    range lies outside of the file.
+    """
+    match = RANGE_PATTERN.match(header.strip()) if header else None
+    if not match or match.groups() == ('', ''):
+        return None
+    first, last = match.groups()
+    if not first:
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start, end = int(first), min(int(last), size - 1) if last else size - 1
+    if start > end or start >= size:
+        raise ValueError(f'Range {header} not satisfiable for {size} bytes')
+    return start, end
+
+def read_range(path, start, length, chunk_size):
+    """Yield length bytes of a file from start on, without reading what lies before"""
+    with open(path, 'rb') as file:
+        file.seek(start)
+        while length > 0:
+            data = file.read(min(chunk_size, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+def sendfile_response(path, name):
+    """
+    Let the front proxy transfer the file, if settings.MEDIA_SENDFILE names one.
+
+    'x-accel-redirect' hands nginx the internal location MEDIA_ACCEL_REDIRECT_PREFIX
+    plus the URL quoted file name, nginx decodes it again. 'x-sendfile' hands
+    Apache or lighttpd the absolute path.
+    The proxy answers Range requests itself, no Python worker stays busy.
+    """
+    backend = settings.MEDIA_SENDFILE
+    if not backend:
+        return None
+    response = HttpResponse()
+    if backend == 'x-accel-redirect':
+        response['X-Accel-Redirect'] = settings.MEDIA_ACCEL_REDIRECT_PREFIX + quote(name)
+    elif backend == 'x-sendfile':
+        response['X-Sendfile'] = path
+    else:
+        raise ValueError(f'Unknown MEDIA_SENDFILE backend "{backend}"')
+    return response
+
+def cache_headers(response, path, expires=None):
+    """
+    Let browsers and CDNs keep content addressed files, their bytes never change.
+
+    A signed URL is only cached until its signature expires, caches must not
+    keep serving it afterwards.
+    """
+    if is_content_addressed(path):
+        max_age = settings.MEDIA_CACHE_MAX_AGE
+        if settings.MEDIA_URL_TTL:
+            max_age = min(max_age, max(expires - int(time.time()), 0))
+        response['Cache-Control'] = f'public, max-age={max_age}, immutable'
+    return response
+
+@require_safe
+def stream_media(request, path, expires=None, signature=None):
+    """
+    Serve an uploaded or converted media file with support for byte ranges.
+
+    Players seek in a video with Range requests, which are answered with 206 and
+    only the requested bytes. With MEDIA_SENDFILE set, the transfer is offloaded to
+    the front proxy instead. Paths outside of MEDIA_ROOT and directories return 404.
+    Media on an object store is not proxied, the request is redirected to it.
+    Unless MEDIA_URL_TTL is 0, the URL has to carry a valid signature, checked
+    without touching the database.
+    """
+    if settings.MEDIA_URL_TTL and not valid_signature(path, expires, signature):
+        raise PermissionDenied('Media URL is not signed or has expired')
+    if not is_local():
+        return HttpResponseRedirect(default_storage.url(path))
+    try:
+        full_path = safe_join(settings.MEDIA_ROOT, path)
+    except SuspiciousFileOperation:
+        raise Http404('Media file not found')
+    if not os.path.isfile(full_path):
+        raise Http404('Media file not found')
+
+    content_type = mimetypes.guess_type(full_path)[0] or 'application/octet-stream'
+    response = sendfile_response(full_path, path)
+    if response is not None:
+        response['Content-Type'] = content_type
+        return cache_headers(response, path, expires)
+
+    stat = os.stat(full_path)
+    if not was_modified_since(request.META.get('HTTP_IF_MODIFIED_SINCE'), stat.st_mtime):
+        return cache_headers(HttpResponseNotModified(), path, expires)
+
+    size = stat.st_size
+    try:
+        byte_range = parse_range(request.headers.get('Range'), size)
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{size}'
+        return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1
+    response = StreamingHttpResponse(
+        read_range(full_path, start, length, settings.MEDIA_STREAM_CHUNK_SIZE),
+        status=206 if byte_range else 200,
+        content_type=content_type,
+    )
+    response['Content-Length'] = str(length)
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = http_date(stat.st_mtime)
+    if byte_range:
+        response['Content-Range'] = f'bytes {start}-{end}/{size}'
+    return cache_headers(response, path, expires)